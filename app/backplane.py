@@ -0,0 +1,221 @@
+"""
+Reparto de los mensajes de websocket entre los workers del servidor.
+
+Cada worker solo tiene las conexiones que se abrieron contra el. Cuando
+`ConnectionManager` envia un mensaje a una partida, a un jugador o al lobby,
+lo encola en sus conexiones y lo publica en el backplane; los demas workers
+lo reciben y lo encolan en las suyas.
+
+Hay dos implementaciones, elegidas con config.WS_BACKPLANE:
+    - 'memory': un unico worker, publicar no hace nada.
+    - 'sqlite': un archivo SQLite compartido por los workers de la misma
+      maquina. Cada worker consulta los eventos nuevos cada
+      WS_BACKPLANE_POLL_INTERVAL segundos.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from app import config
+from app.logger import logging
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BACKPLANE = "memory"
+SQLITE_BACKPLANE = "sqlite"
+
+# Tipos de evento
+GAME_EVENT = "game"
+PLAYER_EVENT = "player"
+LOBBY_EVENT = "lobby"
+CREATE_GAME_EVENT = "create_game"
+REFRESH_LOBBY_EVENT = "refresh_lobby"
+
+EventHandler = Callable[[Dict[str, Any]], None]
+T = TypeVar("T")
+
+
+class Backplane:
+    """Canal de eventos entre los workers.
+
+    Attributes:
+        shared: si hay otros workers escuchando. Con un backplane compartido un
+            worker no sabe si una partida o un jugador estan conectados en otro.
+    """
+
+    shared = False
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Publica un evento para los demas workers."""
+        raise NotImplementedError
+
+    def start(self, handler: EventHandler) -> None:
+        """Empieza a entregar a handler los eventos de los demas workers."""
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        """Deja de recibir eventos."""
+        raise NotImplementedError
+
+
+class InProcessBackplane(Backplane):
+    """Backplane de un unico worker: no hay a quien publicar."""
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        pass
+
+    def start(self, handler: EventHandler) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class SQLiteBackplane(Backplane):
+    """Relay de eventos sobre un archivo SQLite.
+
+    Publicar es un INSERT. Cada worker tiene una tarea que lee los eventos con
+    id mayor al ultimo que leyo y descarta los que publico el mismo. Los
+    eventos de mas de `retention` segundos se borran al publicar.
+
+    Las consultas se hacen en un thread propio para no bloquear el event loop,
+    que solo entrega los eventos leidos. Al ser un unico thread los eventos
+    se insertan en el orden en que se publican.
+
+    Attributes:
+        path: archivo de la base de datos.
+        poll_interval: segundos entre lecturas.
+        retention: segundos que se guarda cada evento.
+        origin: identificador de este worker.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention: float = 60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.origin = uuid.uuid4().hex
+        self.received = 0
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_id = 0
+        self._last_prune = 0.0
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS backplane_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, origin TEXT NOT NULL, "
+                "created REAL NOT NULL, event TEXT NOT NULL)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            # Los eventos no sobreviven a un reinicio, no hace falta fsync
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+        return connection
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="backplane")
+        return self._executor
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Encola el evento para insertarlo en el thread del backplane."""
+        self._get_executor().submit(self._insert, json.dumps(event, separators=(",", ":")))
+
+    def _insert(self, event: str):
+        now = time.time()
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    "INSERT INTO backplane_events (origin, created, event) VALUES (?, ?, ?)",
+                    (self.origin, now, event),
+                )
+                if now - self._last_prune > self.retention:
+                    self._last_prune = now
+                    connection.execute(
+                        "DELETE FROM backplane_events WHERE created < ?", (now - self.retention,)
+                    )
+        except sqlite3.Error as e:
+            logger.error("Error publishing backplane event: %s", e)
+
+    def start(self, handler: EventHandler) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        # Solo interesan los eventos publicados desde ahora. Se consulta una
+        # sola vez al iniciar el worker
+        self._last_id = self._last_event_id()
+        self._task = asyncio.get_running_loop().create_task(self._run(handler))
+
+    def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.get_loop().is_closed():
+            task.cancel()
+        # Los eventos ya encolados se terminan de publicar
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    async def _call(self, fn: Callable[..., T], *args) -> T:
+        """Ejecuta una consulta en el thread del backplane."""
+        return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+
+    def _last_event_id(self) -> int:
+        return self._connection().execute(
+            "SELECT coalesce(max(id), 0) FROM backplane_events"
+        ).fetchone()[0]
+
+    def _fetch(self, last_id: int) -> List[Tuple[int, str, str]]:
+        return self._connection().execute(
+            "SELECT id, origin, event FROM backplane_events WHERE id > ? ORDER BY id",
+            (last_id,),
+        ).fetchall()
+
+    async def poll(self, handler: EventHandler) -> int:
+        """Entrega a handler los eventos nuevos de los demas workers.
+
+        Returns:
+            int: cantidad de eventos entregados.
+        """
+        rows = await self._call(self._fetch, self._last_id)
+        delivered = 0
+        for event_id, origin, event in rows:
+            self._last_id = event_id
+            if origin == self.origin:
+                continue
+            try:
+                handler(json.loads(event))
+                delivered += 1
+            except Exception:
+                logger.exception("Error delivering backplane event %s", event_id)
+        self.received += delivered
+        return delivered
+
+    async def _run(self, handler: EventHandler):
+        while True:
+            try:
+                await self.poll(handler)
+            except sqlite3.Error as e:
+                logger.error("Error reading backplane events: %s", e)
+            await asyncio.sleep(self.poll_interval)
+
+
+def create_backplane(kind: str = config.WS_BACKPLANE) -> Backplane:
+    """Crea el backplane configurado en config.WS_BACKPLANE."""
+    if kind == SQLITE_BACKPLANE:
+        return SQLiteBackplane(config.WS_BACKPLANE_PATH, config.WS_BACKPLANE_POLL_INTERVAL)
+    if kind != MEMORY_BACKPLANE:
+        raise ValueError(f"Unknown websocket backplane {kind!r}")
+    return InProcessBackplane()
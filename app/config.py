@@ -6,3 +6,45 @@ DEV = 'development'
 ENVIRONMENT = os.getenv('ENVIRONMENT', TEST)
 
 DATABASE_FILENAME = f"database_{ENVIRONMENT}.sqlite"
+
+# Forma de guardar los tableros: una fila de Tiles por ficha o todos los
+# colores empaquetados en una sola columna de Boards
+TILES_STORAGE = 'tiles'
+PACKED_STORAGE = 'packed'
+BOARD_STORAGE = os.getenv('BOARD_STORAGE', TILES_STORAGE)
+
+# Pool de threads para el trabajo sincronico de la base de datos
+DB_WORKERS = int(os.getenv('DB_WORKERS', 4))
+DB_QUEUE_LIMIT = int(os.getenv('DB_QUEUE_LIMIT', 64))
+
+# Segundos que puede tardar un envio por websocket antes de descartar la conexion
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', 2))
+
+# Mensajes sin enviar por conexion y que hacer cuando se llena la cola:
+# 'disconnect' descarta la conexion, 'drop_oldest' el mensaje mas viejo
+WS_QUEUE_SIZE = int(os.getenv('WS_QUEUE_SIZE', 64))
+WS_OVERFLOW_POLICY = os.getenv('WS_OVERFLOW_POLICY', 'disconnect')
+
+# Donde se guardan los movimientos parciales: 'memory' en el proceso, solo
+# sirve con un unico worker; 'sqlite' en un archivo compartido por los workers
+MOVEMENT_JOURNAL = os.getenv('MOVEMENT_JOURNAL', 'memory')
+MOVEMENT_JOURNAL_PATH = os.getenv('MOVEMENT_JOURNAL_PATH', f"journal_{ENVIRONMENT}.sqlite")
+
+# Reparto de los mensajes de websocket entre workers: 'memory' si hay un unico
+# worker; 'sqlite' en un archivo compartido por los workers de la maquina
+WS_BACKPLANE = os.getenv('WS_BACKPLANE', 'memory')
+WS_BACKPLANE_PATH = os.getenv('WS_BACKPLANE_PATH', f"backplane_{ENVIRONMENT}.sqlite")
+WS_BACKPLANE_POLL_INTERVAL = float(os.getenv('WS_BACKPLANE_POLL_INTERVAL', 0.05))
+
+# Afinidad de partidas: con SHARD_COUNT > 1 cada partida la atiende solo el
+# worker SHARD_INDEX == match_id % SHARD_COUNT, cuya URL es la de la posicion
+# SHARD_INDEX en SHARD_URLS (separadas por comas)
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 1))
+SHARD_INDEX = int(os.getenv('SHARD_INDEX', 0))
+SHARD_URLS = [url.rstrip('/') for url in os.getenv('SHARD_URLS', '').split(',') if url]
+
+# Si varios workers atienden la misma base de datos. Por defecto se supone que
+# si cuando el historial de movimientos o el backplane son compartidos
+SHARED_DATABASE = os.getenv(
+    'SHARED_DATABASE', str(MOVEMENT_JOURNAL == 'sqlite' or WS_BACKPLANE == 'sqlite' or SHARD_COUNT > 1)
+).lower() == 'true'
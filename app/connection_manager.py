@@ -1,27 +1,265 @@
 from fastapi import WebSocket, WebSocketDisconnect, WebSocketException
-from typing import Any, Callable, Dict, List, Union
-
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from app.backplane import (
+    CREATE_GAME_EVENT,
+    GAME_EVENT,
+    LOBBY_EVENT,
+    PLAYER_EVENT,
+    Backplane,
+    create_backplane,
+)
+from app.config import WS_OVERFLOW_POLICY, WS_QUEUE_SIZE, WS_SEND_TIMEOUT
+from app.connection_writer import ConnectionWriter
 from app.exceptions import *
-from app.schemas import MatchOut
+from app.utils.lobby_index import snapshot_message
 
 import asyncio
+import json
+from itertools import count
 from app.logger import logging
 
 logger = logging.getLogger(__name__)
 
+
+def encode_message(msg: Any) -> str:
+    """Codifica un mensaje como el texto de un frame de websocket.
+
+    Usa el mismo formato que `WebSocket.send_json`. Los mensajes que ya son
+    texto se devuelven sin cambios, para poder codificar una vez y enviar el
+    mismo frame a varias conexiones.
+
+    Args:
+        msg: mensaje a codificar, o texto ya codificado.
+
+    Returns:
+        str: texto del frame.
+    """
+    if isinstance(msg, str):
+        return msg
+    return json.dumps(msg, separators=(",", ":"), ensure_ascii=False)
+
+
+def message_key(msg: Any) -> Optional[str]:
+    """Tipo de un mensaje, None si ya esta codificado."""
+    return msg.get("key") if isinstance(msg, dict) else None
+
+
 class ConnectionManager:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        queue_size: int = WS_QUEUE_SIZE,
+        overflow_policy: str = WS_OVERFLOW_POLICY,
+        backplane: Optional[Backplane] = None,
+    ) -> None:
         self._games: Dict[int, Dict[int, WebSocket]] = {}
-        self._connections: List[Dict[str, Union[str, int, WebSocket]]] = []
+        # Conexiones del lobby por id de conexion, y id de conexion por websocket
+        self._connections: Dict[int, Dict[str, Union[str, int, WebSocket]]] = {}
+        self._connection_ids: Dict[int, int] = {}
+        self._next_connection_id = count(1)
+        self._writers: Dict[int, ConnectionWriter] = {}
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        # Los mensajes se publican en el backplane para las conexiones de los
+        # demas workers
+        self.backplane = backplane if backplane is not None else create_backplane()
+        self._handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reinicia los contadores acumulados de envios."""
+        self._stats = {
+            "broadcasts": 0, "queued": 0, "coalesced": 0, "dropped": 0,
+            "overflowed": 0, "sent": 0, "failed": 0, "timed_out": 0, "evicted": 0,
+            "published": 0, "relayed": 0,
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores acumulados de los envios."""
+        stats = dict(self._stats)
+        stats["pending"] = sum(writer.pending for writer in list(self._writers.values()))
+        return stats
+
+    def _start_writer(self, websocket: WebSocket) -> Optional[ConnectionWriter]:
+        """Crea la cola de salida de una conexion.
+
+        La tarea de envio se crea en el event loop que registra la conexion.
+        Si no hay un loop corriendo, se crea con el primer mensaje.
+        """
+        writer = self._writers.get(id(websocket))
+        if writer is None:
+            writer = ConnectionWriter(
+                websocket,
+                self._evict,
+                self._stats,
+                send_timeout=self.send_timeout,
+                max_size=self.queue_size,
+                overflow_policy=self.overflow_policy,
+            )
+            self._writers[id(websocket)] = writer
+
+        if not writer.started:
+            try:
+                writer.start()
+            except RuntimeError:
+                return None
+        return writer
+
+    def _stop_writer(self, websocket: WebSocket):
+        """Cierra la cola de una conexion despues de enviar lo encolado."""
+        writer = self._writers.pop(id(websocket), None)
+        if writer is not None:
+            writer.close()
+
+    def _evict(self, writer: ConnectionWriter):
+        """Descarta una conexion cuyo envio fallo o cuya cola se lleno."""
+        websocket = writer.websocket
+        if self._writers.get(id(websocket)) is writer:
+            del self._writers[id(websocket)]
+
+        for game_id, game in self._games.items():
+            for player_id, conn in list(game.items()):
+                if conn is websocket:
+                    del game[player_id]
+                    logger.warning("Player %s evicted from game %s", player_id, game_id)
+        connection_id = self._connection_ids.pop(id(websocket), None)
+        if connection_id is not None:
+            self._connections.pop(connection_id, None)
+
+        self._stats["evicted"] += 1
+        writer.abort()
+
+    def start_backplane(self):
+        """Empieza a recibir los mensajes publicados por los demas workers."""
+        self.backplane.start(self.deliver)
+
+    def subscribe(self, kind: str, handler: Callable[[Dict[str, Any]], None]):
+        """Registra la funcion que recibe los eventos de tipo kind de otros workers."""
+        self._handlers[kind] = handler
+
+    def publish(self, kind: str, **data: Any):
+        """Publica un evento propio, sin mensaje para los websockets."""
+        self._publish({"type": kind, **data})
+
+    def _publish(self, event: Dict[str, Any], frame: Optional[str] = None, key: Optional[str] = None):
+        """Publica un evento para los demas workers.
+
+        Args:
+            event: tipo y destino del evento.
+            frame: mensaje ya codificado.
+            key: tipo del mensaje.
+        """
+        if not self.backplane.shared:
+            return
+        if frame is not None:
+            event["frame"] = frame
+            event["key"] = key
+        self.backplane.publish(event)
+        self._stats["published"] += 1
+
+    def deliver(self, event: Dict[str, Any]):
+        """Encola en las conexiones de este worker un evento de otro worker.
 
-    def add_anonymous_connection(self, websocket: WebSocket):
+        Las partidas o jugadores que no estan conectados a este worker se
+        ignoran.
+
+        Args:
+            event: evento publicado con `_publish`.
+        """
+        kind = event["type"]
+        if kind == CREATE_GAME_EVENT:
+            self._games.setdefault(event["game_id"], {})
+            return
+
+        if kind == GAME_EVENT:
+            websockets = list(self._games.get(event["game_id"], {}).values())
+        elif kind == PLAYER_EVENT:
+            websocket = self._games.get(event["game_id"], {}).get(event["player_id"])
+            websockets = [] if websocket is None else [websocket]
+        elif kind == LOBBY_EVENT:
+            websockets = [conn["websocket"] for conn in self._connections.values()]
+        elif kind in self._handlers:
+            self._handlers[kind](event)
+            return
+        else:
+            logger.warning("Unknown backplane event %s", kind)
+            return
+
+        self._stats["relayed"] += 1
+        if websockets:
+            self._enqueue(websockets, event["frame"], event.get("key"))
+
+    def _enqueue(self, websockets: List[WebSocket], msg: Any, key: Optional[str] = None):
+        """Encola msg en la cola de cada conexion.
+
+        El mensaje se codifica una sola vez y se encola el mismo frame en todas.
+        No espera a que se envie: cada conexion tiene su propia tarea de envio.
+
+        Args:
+            websockets: conexiones destino.
+            msg: mensaje a enviar, o texto ya codificado.
+            key: tipo del mensaje; por defecto el campo "key" de msg.
+
+        Returns:
+            Dict[str, int]: mensajes encolados y conexiones descartadas.
+        """
+        if key is None:
+            key = message_key(msg)
+        frame = encode_message(msg)
+
+        stats = {"queued": 0, "evicted": 0}
+        for websocket in websockets:
+            writer = self._start_writer(websocket)
+            if writer is not None and writer.put(frame, key):
+                stats["queued"] += 1
+            elif writer is not None:
+                stats["evicted"] += 1
+                self._evict(writer)
+        return stats
+
+    async def flush(self):
+        """Espera a que se envien los mensajes encolados en el event loop actual."""
+        await asyncio.gather(*(writer.join() for writer in list(self._writers.values())))
+
+    def shutdown(self):
+        """Detiene todas las colas de salida sin enviar lo pendiente."""
+        self.backplane.stop()
+        for writer in list(self._writers.values()):
+            writer.close(drain=False)
+        self._writers.clear()
+
+    async def send_to_connection(self, websocket: WebSocket, msg: Any, key: Optional[str] = None):
+        """Encola un mensaje para una conexion, registrada o no en una partida.
+
+        Args:
+            websocket: conexion destino.
+            msg: mensaje a enviar, o texto ya codificado.
+            key: tipo del mensaje, necesario para reemplazar snapshots ya
+                codificados.
+        """
+        self._enqueue([websocket], msg, key)
+
+    def add_anonymous_connection(self, websocket: WebSocket, delta: bool = False):
         """Add anonymous websocket to connections
-        
+
         Args:
             websocket: connection to add.
+            delta: if True the connection receives a snapshot of the lobby and
+                then only the changes (MATCH_ADDED, MATCH_UPDATED, MATCH_REMOVED).
+
+        Returns:
+            int: connection id, stable until the connection is removed.
         """
-        self._connections.append({"match_name": None, "max_players": None, "websocket": websocket})
-        return len(self._connections) - 1
+        connection_id = next(self._next_connection_id)
+        self._connections[connection_id] = {
+            "match_name": None, "max_players": None, "websocket": websocket,
+            "delta": delta, "version": None,
+        }
+        self._connection_ids[id(websocket)] = connection_id
+        self._start_writer(websocket)
+        return connection_id
     
     def remove_anonymous_connection(self, websocket: WebSocket):
         """Remove anonymous websocket from connections'
@@ -29,18 +267,14 @@ class ConnectionManager:
         Args:
             websocket: connection to remove.
         """
-        try:
-            conn_to_delete = None
-            for i, conn in enumerate(self._connections):
-                if conn["websocket"] == websocket:
-                    conn_to_delete = i
-                    break
-            if conn_to_delete == None:
-                raise ValueError("Connection not found")
-            
-            del self._connections[conn_to_delete]
-        except ValueError:
-            pass
+        connection_id = self._connection_ids.get(id(websocket))
+        if connection_id is None or self._connections[connection_id]["websocket"] is not websocket:
+            # La conexion no existe o ya fue eliminada
+            return
+
+        del self._connection_ids[id(websocket)]
+        del self._connections[connection_id]
+        self._stop_writer(websocket)
 
 
     def create_game_connection(self, game_id):
@@ -50,11 +284,22 @@ class ConnectionManager:
             game_id: game's id to create.
         """
         self._games[game_id] = {}
+        self._publish({"type": CREATE_GAME_EVENT, "game_id": game_id})
 
 
-    async def broadcast(self, msg):
-        for websocket in self._connections:
-            await websocket.send_json(msg)
+    async def broadcast(self, msg) -> Dict[str, int]:
+        """Queues message for all anonymous connections.
+
+        Args:
+            msg: message to send, or an already encoded frame.
+
+        Returns:
+            Dict[str, int]: queued messages and evicted connections.
+        """
+        self._stats["broadcasts"] += 1
+        frame, key = encode_message(msg), message_key(msg)
+        self._publish({"type": LOBBY_EVENT}, frame, key)
+        return self._enqueue([conn["websocket"] for conn in self._connections.values()], frame, key)
 
 
     @staticmethod
@@ -80,43 +325,53 @@ class ConnectionManager:
         await self.broadcast_to_game(game_id, msg)
 
 
-    async def keep_alive_matches(self, index, on_filter_matches):
+    async def keep_alive_matches(self, connection_id, on_filter_matches, on_snapshot=None):
         """
         Mantiene viva la conexión del websocket y filtra las partidas.
+        Con FILTER_MATCHES actualiza el filtro y reenvía la lista; con RESYNC
+        solo la reenvía.
         Args:
-            index: índice de la conexión a mantener viva.
+            connection_id: id de la conexión a mantener viva.
             on_filter_matches: función para filtrar las partidas.
+            on_snapshot: función que devuelve la versión del lobby y las
+                partidas filtradas, para las conexiones en modo delta.
         """
         while True:
-            try:
-                response = await self._connections[index]["websocket"].receive_json()
-            except IndexError:
-                # La conexión ya no existe, salir del bucle
-                break
-        while True:
-            try:
-                response = await self._connections[index]["websocket"].receive_json()
-            except IndexError:
+            conn = self._connections.get(connection_id)
+            if conn is None:
                 # La conexión ya no existe, salir del bucle
                 break
 
+            response = await conn["websocket"].receive_json()
+
             if response["key"] == "FILTER_MATCHES":
                 if "match_name" in response["payload"]:
-                    self._connections[index]["match_name"] = response["payload"]["match_name"]
-                if "max_players" in response["payload"]:
-                    self._connections[index]["max_players"] = response["payload"]["max_players"]
-            if response["key"] == "FILTER_MATCHES":
-                if "match_name" in response["payload"]:
-                    self._connections[index]["match_name"] = response["payload"]["match_name"]
+                    conn["match_name"] = response["payload"]["match_name"]
                 if "max_players" in response["payload"]:
-                    self._connections[index]["max_players"] = response["payload"]["max_players"]
+                    conn["max_players"] = response["payload"]["max_players"]
 
-                filtered_matches = on_filter_matches(self._connections[index]["match_name"], 
-                                                    self._connections[index]["max_players"])
-                matches = [MatchOut.model_validate(match).model_dump() 
-                        for match in filtered_matches]
-                msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
-                await self._connections[index]["websocket"].send_json(msg) 
+            if response["key"] in ("FILTER_MATCHES", "RESYNC"):
+                await self.send_lobby_snapshot(conn, on_filter_matches, on_snapshot)
+
+    async def send_lobby_snapshot(self, conn, on_filter_matches, on_snapshot=None):
+        """
+        Envía a una conexión del lobby todas las partidas de su filtro.
+        Args:
+            conn: conexión del lobby.
+            on_filter_matches: función que devuelve las partidas filtradas,
+                ya serializadas.
+            on_snapshot: función que devuelve la versión del lobby y las
+                partidas filtradas, para las conexiones en modo delta.
+        """
+        if conn.get("delta") and on_snapshot is not None:
+            version, matches = on_snapshot(conn["match_name"], conn["max_players"])
+            conn["version"] = version
+            msg = snapshot_message(version, matches)
+        else:
+            # El índice del lobby ya devuelve las partidas serializadas
+            matches = on_filter_matches(conn["match_name"], conn["max_players"])
+            msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
+        await self.send_to_connection(conn["websocket"], msg)
 
 
     def connect_player_to_game(self, game_id: int, player_id: int, websocket: WebSocket):
@@ -128,12 +383,16 @@ class ConnectionManager:
             websocket: websocket connection to save.
         """
         if game_id not in self._games:
-            raise GameConnectionDoesNotExist(game_id)
+            if not self.backplane.shared:
+                raise GameConnectionDoesNotExist(game_id)
+            # La partida pudo crearse en otro worker
+            self._games[game_id] = {}
 
         if player_id in self._games[game_id]:
             raise PlayerAlreadyConnected(game_id, player_id)
 
         self._games[game_id][player_id] = websocket
+        self._start_writer(websocket)
 
     def disconnect_player_from_game(self, game_id: int, player_id: int):
         """Removes a player connection from game and the game's entry if no player left.
@@ -149,38 +408,59 @@ class ConnectionManager:
         if player_id not in self._games[game_id]:
             raise PlayerNotConnected(game_id, player_id)
         
-        del self._games[game_id][player_id]
+        websocket = self._games[game_id].pop(player_id)
+        if not any(websocket is conn for game in self._games.values() for conn in game.values()):
+            self._stop_writer(websocket)
 
         
-    async def broadcast_to_game(self, game_id: int, msg: Any):
-        """Sends message to all players in a game.
+    async def broadcast_to_game(self, game_id: int, msg: Any) -> Dict[str, int]:
+        """Queues message for all players in a game.
+
+        Returns as soon as the message is queued; each connection sends its
+        queue on its own task. Players whose queue overflows or whose send
+        fails are disconnected from the game and their websocket is closed.
+        With a shared backplane the message is also published for the players
+        connected to other workers.
 
         Args:
             game_id: id of the game.
-            msg: message to send.
+            msg: message to send, or an already encoded frame.
+
+        Returns:
+            Dict[str, int]: queued messages and evicted connections of this
+            worker.
         """
 
-        if game_id not in self._games:
+        if game_id not in self._games and not self.backplane.shared:
             raise GameConnectionDoesNotExist(game_id)
 
-        for conn in self._games[game_id].values():
-            await conn.send_json(msg)
-            
+        self._stats["broadcasts"] += 1
+        frame, key = encode_message(msg), message_key(msg)
+        self._publish({"type": GAME_EVENT, "game_id": game_id}, frame, key)
+        return self._enqueue(list(self._games.get(game_id, {}).values()), frame, key)
+
     async def send_to_player(self, game_id: int, player_id: int, msg: Any):
         """Sends message to a specific player in a game.
 
+        With a shared backplane, a player that is not connected to this worker
+        may be connected to another one: the message is published instead of
+        raising.
+
         Args:
             game_id: id of the game.
-            msg: message to send.
+            msg: message to send, or an already encoded frame.
         """
 
-        if game_id not in self._games:
-            raise GameConnectionDoesNotExist(game_id)
-
-        if player_id not in self._games[game_id]:
-            raise PlayerNotConnected(game_id, player_id)
-
-        conn: WebSocket = self._games[game_id][player_id]
-        await conn.send_json(msg)
+        conn: Optional[WebSocket] = self._games.get(game_id, {}).get(player_id)
+        if conn is None:
+            if not self.backplane.shared:
+                if game_id not in self._games:
+                    raise GameConnectionDoesNotExist(game_id)
+                raise PlayerNotConnected(game_id, player_id)
+            self._publish({"type": PLAYER_EVENT, "game_id": game_id, "player_id": player_id},
+                          encode_message(msg), message_key(msg))
+            return
+
+        self._enqueue([conn], msg)
 
 manager = ConnectionManager()
\ No newline at end of file
@@ -0,0 +1,216 @@
+"""
+Cola de salida de una conexion de websocket.
+
+Cada conexion tiene una cola acotada y una tarea que envia sus mensajes en
+orden. Quien envia un mensaje solo lo encola, por lo que un endpoint no espera
+a que cada cliente lo reciba y un cliente lento solo demora su propia cola.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import WebSocket
+
+from app.logger import logging
+
+logger = logging.getLogger(__name__)
+
+# Politicas para una cola llena
+DISCONNECT = "disconnect"
+DROP_OLDEST = "drop_oldest"
+
+# Mensajes que son una foto completa del estado: si hay uno sin enviar, el
+# nuevo lo reemplaza
+COALESCED_KEYS = frozenset({"ALLOW_FIGURES", "MATCHES_LIST"})
+
+
+class ConnectionWriter:
+    """Envia en orden los mensajes encolados para un websocket.
+
+    La cola se puede llenar desde otro event loop (por ejemplo en los tests,
+    donde cada request corre en su propio loop): los accesos a la cola usan un
+    lock y la tarea se despierta con `call_soon_threadsafe`.
+
+    Attributes:
+        websocket: conexion destino.
+        max_size: cantidad maxima de mensajes sin enviar.
+        overflow_policy: DISCONNECT descarta la conexion cuando la cola esta
+            llena; DROP_OLDEST descarta el mensaje mas viejo.
+        send_timeout: segundos que puede tardar cada envio.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_failure: Callable[["ConnectionWriter"], None],
+        stats: Dict[str, int],
+        send_timeout: float,
+        max_size: int,
+        overflow_policy: str = DISCONNECT,
+    ):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.closed = False
+        self._on_failure = on_failure
+        self._stats = stats
+        self._queue: Deque[Tuple[Optional[str], str]] = deque()
+        self._lock = threading.Lock()
+        self._closing = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        """Mensajes encolados sin enviar."""
+        return len(self._queue)
+
+    def start(self):
+        """Crea la tarea de envio en el event loop actual."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = self._loop.create_task(self._run())
+
+    def put(self, frame: str, key: Optional[str] = None) -> bool:
+        """Encola un frame ya codificado.
+
+        Args:
+            frame: texto a enviar.
+            key: tipo del mensaje, usado para reemplazar los mensajes de
+                COALESCED_KEYS que todavia no se enviaron.
+
+        Returns:
+            bool: False si la conexion esta cerrada o si la cola esta llena y
+            la politica es DISCONNECT.
+        """
+        with self._lock:
+            if self.closed or self._closing:
+                return False
+
+            if key in COALESCED_KEYS:
+                for i, (queued_key, _) in enumerate(self._queue):
+                    if queued_key == key:
+                        del self._queue[i]
+                        self._stats["coalesced"] += 1
+                        break
+
+            if len(self._queue) >= self.max_size:
+                if self.overflow_policy != DROP_OLDEST:
+                    self._stats["overflowed"] += 1
+                    return False
+                self._queue.popleft()
+                self._stats["dropped"] += 1
+
+            self._queue.append((key, frame))
+            self._stats["queued"] += 1
+
+        return self._call_in_loop(self._notify)
+
+    def close(self, drain: bool = True):
+        """Detiene la tarea de envio.
+
+        Args:
+            drain: si es True, la tarea termina despues de enviar lo encolado.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self._closing = True
+            if not drain:
+                self.closed = True
+                self._queue.clear()
+
+        if drain:
+            self._call_in_loop(self._notify)
+        else:
+            self._call_in_loop(self._cancel)
+
+    def abort(self):
+        """Descarta la cola y cierra el websocket."""
+        self.close(drain=False)
+        self._call_in_loop(self._close_websocket)
+
+    async def join(self):
+        """Espera a que se envie todo lo encolado."""
+        if self._task is not None and not self._task.done():
+            await self._idle.wait()
+
+    def _call_in_loop(self, callback: Callable[[], Any]) -> bool:
+        if self._loop is None:
+            return True
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                callback()
+                return True
+        except RuntimeError:
+            pass
+        try:
+            self._loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # El loop de la conexion ya no existe
+            return False
+        return True
+
+    def _notify(self):
+        self._idle.clear()
+        self._wakeup.set()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._idle.set()
+
+    def _close_websocket(self):
+        async def close():
+            try:
+                await asyncio.wait_for(self.websocket.close(), timeout=self.send_timeout)
+            except Exception:
+                pass
+
+        self._loop.create_task(close())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        break
+                    _, frame = self._queue.popleft()
+
+                try:
+                    await asyncio.wait_for(
+                        self.websocket.send_text(frame), timeout=self.send_timeout
+                    )
+                    self._stats["sent"] += 1
+                except asyncio.TimeoutError:
+                    self._stats["timed_out"] += 1
+                    self._fail()
+                    return
+                except Exception:
+                    self._stats["failed"] += 1
+                    self._fail()
+                    return
+
+            self._idle.set()
+            if self._closing:
+                self.closed = True
+                return
+
+    def _fail(self):
+        with self._lock:
+            self.closed = True
+            self._queue.clear()
+        self._idle.set()
+        self._on_failure(self)
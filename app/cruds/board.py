@@ -4,16 +4,27 @@ from sqlalchemy.orm.exc import NoResultFound
 from itertools import cycle
 from random import shuffle
 
-from app.cruds.tile import TileService
+from app.database import commit
+from app.cruds.tile import TileService, invalidate_board
 from app.models.enums import Colors
-from app.models.models import Boards, Tiles, TileMovement
+from app.models.models import Boards, Tiles
+from app.movement_journal import JournalEntry, movement_journal
+from app.sharding import shard_map
 from app.utils.board_shapes_algorithm import *
+from app.utils.figures_cache import figures_cache, pack_board_table, unpack_board_table
 from app.utils.utils import FIGURE_COORDINATES, validate_color, validate_turn, validate_board, ALL_FIGURES
 from app.logger import logging
 
 logger = logging.getLogger(__name__)
 
 
+def random_board_colors() -> List[str]:
+    """Devuelve los 36 colores de un tablero nuevo, 9 de cada color en orden aleatorio."""
+    table = [color.value for color in Colors] * 9
+    shuffle(table)
+    return table
+
+
 class BoardService:
     """
     Servicio para realizar operaciones CRUD sobre la tabla de Boards
@@ -39,7 +50,7 @@ class BoardService:
             new_board.ban_color = ban_color
 
         self.db.add(new_board)
-        self.db.commit()
+        commit(self.db)
         return new_board
 
     def init_board(self, board_id: int):
@@ -49,17 +60,23 @@ class BoardService:
             board_id (int): Id of the board in the db.
         """
 
-        table = [color.value for color in Colors] * 9
-        shuffle(table)
+        table = random_board_colors()
 
         tile_service = TileService(self.db)
+        if tile_service.is_packed():
+            board = self.db.query(Boards).filter(Boards.id == board_id).one()
+            board.packed_tiles = pack_board_table([table])
+            commit(self.db)
+            invalidate_board(self.db, board_id)
+            return
+
         table_iter = iter(table)
         for i in range(6):
             for j in range(6):
                 color = next(table_iter)
                 tile_service.create_tile(board_id, color, i, j)
 
-        self.db.commit()
+        commit(self.db)
 
     def get_board_table(self, board_id: int) -> List[List[str]]:
         """Obtiene la representacion del tablero en una matriz de colores.
@@ -70,18 +87,63 @@ class BoardService:
         Returns:
             List[List[str]]: matriz de colores del tablero.
         """
+        # El tablero cacheado solo es valido si ningun otro worker lo modifica
+        cache_board = shard_map.exclusive
+        fingerprint = figures_cache.get_fingerprint(board_id) if cache_board else None
+        if fingerprint is not None:
+            return unpack_board_table(fingerprint)
+
+        if TileService(self.db).is_packed():
+            packed_tiles = (
+                self.db.query(Boards.packed_tiles)
+                .filter(Boards.id == board_id)
+                .scalar()
+            )
+            if packed_tiles is None:
+                return [[] for _ in range(6)]
+            if cache_board:
+                figures_cache.set_fingerprint(board_id, packed_tiles)
+            return unpack_board_table(packed_tiles)
+
+        tiles = self._get_ordered_tiles(board_id)
+        board = [
+            [tile.color for tile in tiles[i * 6: (i + 1) * 6]]
+            for i in range(6)
+        ]
+
+        # Solo se cachean los tableros completos
+        if cache_board and len(tiles) == 36:
+            figures_cache.set_fingerprint(board_id, pack_board_table(board))
+        return board
 
-        tiles = (
+    def _get_ordered_tiles(self, board_id: int) -> List[Tiles]:
+        return (
             self.db.query(Tiles)
             .filter(Tiles.board_id == board_id)
             .order_by(Tiles.position_x, Tiles.position_y)
             .all()
         )
-        board = [
-            [tile.color for tile in tiles[i * 6: (i + 1) * 6]]
-            for i in range(6)
-        ]
-        return board
+
+    def pack_board(self, board_id: int) -> bool:
+        """Convierte un tablero guardado como filas de Tiles al modo empaquetado.
+        Las filas de Tiles se borran en la misma transaccion.
+
+        Args:
+            board_id (int): id del tablero a convertir.
+
+        Returns:
+            bool: True si el tablero se convirtio, False si no tenia sus 36 fichas.
+        """
+        tiles = self._get_ordered_tiles(board_id)
+        if len(tiles) != 36:
+            return False
+
+        board = self.db.query(Boards).filter(Boards.id == board_id).one()
+        board.packed_tiles = pack_board_table([[tile.color for tile in tiles]])
+        self.db.query(Tiles).filter(Tiles.board_id == board_id).delete()
+        commit(self.db)
+        invalidate_board(self.db, board_id)
+        return True
 
     def get_all_boards(self) -> List[Boards]:
         """
@@ -115,7 +177,7 @@ class BoardService:
 
         board = self.db.query(Boards).filter(Boards.id == board_id).one()
         board.ban_color = ban_color
-        self.db.commit()
+        commit(self.db)
 
     def delete_board(self, board_id: int):
         """
@@ -126,7 +188,8 @@ class BoardService:
         board = self.db.query(Boards).filter(Boards.id == board_id).one()
         validate_board(board.id)
         self.db.delete(board)
-        self.db.commit()
+        commit(self.db)
+        invalidate_board(self.db, board_id)
 
     def get_board_by_match_id(self, match_id: int) -> Boards:
         """
@@ -146,53 +209,72 @@ class BoardService:
 
     def update_list_of_parcial_movements(self, board_id: int, list_of_parcial_movements: List[Tiles], id_mov: int, create_figure: bool):
         """
-        Actualiza la lista de movimientos parciales de un tablero.
+        Agrega un movimiento parcial al historial del tablero.
         Args:
             board_id: Id del tablero.
-            list_of_parcial_movements: Lista de movimientos parciales.
+            list_of_parcial_movements: Fichas intercambiadas, con sus posiciones
+                despues del intercambio.
+            id_mov: Id de la carta de movimiento usada.
+            create_figure: Si el movimiento formo una figura.
         """
-        try:
-            board = self.db.query(Boards).filter(Boards.id == board_id).one()
-            board.add_temporary_movement(
-                list_of_parcial_movements[0], list_of_parcial_movements[1], id_mov, create_figure)
-            self.db.commit()
-
-        except NoResultFound:
-            raise NoResultFound("Board not found with id {board_id}")
+        tile1, tile2 = list_of_parcial_movements
+        movement_journal.append(board_id, JournalEntry(
+            Coordinate(tile1.position_x, tile1.position_y),
+            Coordinate(tile2.position_x, tile2.position_y),
+            id_mov,
+            create_figure,
+        ))
 
     def print_temporary_movements(self, board_id: int):
         """
-        Obtiene la lista de movimientos temporales de un tablero.
+        Muestra en el log la lista de movimientos temporales de un tablero.
+        Args:
+            board_id: Id del tablero.
+        """
+        movements = movement_journal.entries(board_id)
+        if not movements:
+            logger.info("no movements")
+        for movement in movements:
+            logger.info("Movement: %s -> %s, id_mov: %s, create: %s",
+                        movement.tile1, movement.tile2, movement.id_mov, movement.create_figure)
+
+    def get_temporary_movements(self, board_id: int) -> List[JournalEntry]:
+        """
+        Obtiene los movimientos temporales de un tablero, sin sacarlos.
         Args:
             board_id: Id del tablero.
         Returns:
-            list_of_parcial_movements: Lista de movimientos temporales.
+            movements: Movimientos del primero al ultimo.
         """
-        try:
-            board = self.db.query(Boards).filter(Boards.id == board_id).one()
-            board.print_temporary_movements()
-
-        except NoResultFound:
-            raise NoResultFound("Board not found with id {board_id}")
+        return movement_journal.entries(board_id)
 
-    def get_last_temporary_movements(self, board_id: int) -> (TileMovement | None):
+    def get_last_temporary_movements(self, board_id: int) -> (JournalEntry | None):
         """
-        Elimina la lista de movimientos temporales de un tablero.
+        Saca el ultimo movimiento temporal de un tablero.
         Args:
             board_id: Id del tablero.
+        Returns:
+            movement: Ultimo movimiento o None si no hay movimientos.
         """
-        try:
-            board = self.db.query(Boards).filter(Boards.id == board_id).one()
-            movement = board.get_last_movement()
-            return movement
-
-        except NoResultFound:
-            raise NoResultFound("Board not found with id {board_id}")
+        return movement_journal.pop(board_id)
 
     def get_formed_figures(self, board_id: int) -> List[Figure]:
-
+        """
+        Obtiene las figuras formadas en el tablero. Las figuras se cachean por
+        el estado del tablero, solo se buscan si el tablero cambio.
+        Args:
+            board_id: Id del tablero.
+        Returns:
+            board_figures: Lista de figuras formadas.
+        """
         board_table = self.get_board_table(board_id)
-        board_figures = find_board_figures(Board(board_table), ALL_FIGURES)
+        fingerprint = pack_board_table(board_table)
+        board_figures = figures_cache.get_figures(fingerprint)
+        if board_figures is not None:
+            return board_figures
+
+        board_figures = find_board_figures_bitboard(Board(board_table), ALL_FIGURES)
+        figures_cache.set_figures(fingerprint, board_figures)
 
         str_to_log = ""
         for i in board_table:
@@ -206,19 +288,26 @@ class BoardService:
 
         return board_figures
 
-    def delete_temporary_movement(self, tile_movement: TileMovement) -> None:
+    def get_figures_tracker(self, board_id: int) -> FiguresTracker:
         """
-        Elimina un movimiento temporal de la base de datos.
+        Obtiene un tracker de las figuras formadas en el tablero, para
+        actualizarlas de forma incremental al intercambiar fichas.
         Args:
-            tile_movement_id: Id del movimiento temporal.
+            board_id: Id del tablero.
+        Returns:
+            tracker: FiguresTracker con las figuras actuales del tablero.
+        """
+        board_table = self.get_board_table(board_id)
+        return FiguresTracker(Board(board_table), ALL_FIGURES)
+
+    def clear_temporary_movements(self, board_id: int) -> None:
+        """
+        Descarta los movimientos temporales de un tablero.
+        Args:
+            board_id: Id del tablero.
         """
-        self.db.delete(tile_movement)
-        self.db.commit()
+        movement_journal.drop(board_id)
 
-    def clear_temporary_movements(self, tile_movements: list[TileMovement]) -> None:
-        self.db.delete(tile_movements)
-        self.db.commit()
-        
     def get_ban_color(self, board_id: int) -> str:
         """
         Obtiene el color prohibido del tablero.
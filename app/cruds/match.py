@@ -1,14 +1,21 @@
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 from random import shuffle
 from sqlalchemy import DateTime
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import NoResultFound
 from typing import List
+from app.database import commit
 from app.models.models import Matches, Players
 from app.models.enums import MatchState
 import app.utils.utils as utils
 
 
+def turn_duration() -> int:
+    """Duracion de un turno en segundos, configurada en TURN_TIMER."""
+    return int(os.getenv("TURN_TIMER", 120))
+
+
 class MatchService:
     """
     Servicio para realizar operaciones CRUD sobre la tabla de Matches:
@@ -36,7 +43,7 @@ class MatchService:
             match = Matches(match_name=name, max_players=max_players, 
                             is_public=public, state = MatchState.WAITING.value, current_players=1, password=password)
             self.db.add(match)
-            self.db.commit()
+            commit(self.db)
             self.db.refresh(match)
             return match
         except Exception as e:
@@ -58,7 +65,7 @@ class MatchService:
 
         match.current_player_turn = 1
 
-        self.db.commit()
+        commit(self.db)
 
         return players
 
@@ -109,6 +116,15 @@ class MatchService:
             return matches
         except NoResultFound:
             raise NoResultFound("No matches found")
+
+    def get_started_matches(self) -> List[Matches]:
+        """
+            Obtiene los matches en curso.
+
+            Returns:
+                Matches: Lista de matches con estado STARTED.
+        """
+        return self.db.query(Matches).filter(Matches.state == MatchState.STARTED.value).all()
     
     
     def update_match(self, match_id: int, new_state: str = None, new_amount_players: int = None, new_started_turn_time: DateTime = None):
@@ -130,7 +146,7 @@ class MatchService:
                 match.current_players = new_amount_players
             if new_started_turn_time != None:
                 match.started_turn_time = new_started_turn_time
-            self.db.commit()
+            commit(self.db)
             self.db.refresh(match)
         except NoResultFound:
             raise NoResultFound(
@@ -149,7 +165,7 @@ class MatchService:
         try:
             match = self.db.query(Matches).filter(Matches.id == match_id).one()
             self.db.delete(match)
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise NoResultFound(
                 f"Match with id {match_id} not found, can't delete")
@@ -161,7 +177,8 @@ class MatchService:
             match = self.db.query(Matches).filter(Matches.id == match_id).one()
             match.current_player_turn = turn
             match.started_turn_time = datetime.now()
-            self.db.commit()
+            match.turn_deadline = match.started_turn_time + timedelta(seconds=turn_duration())
+            commit(self.db)
             self.db.refresh(match)
         except NoResultFound:
             raise NoResultFound(
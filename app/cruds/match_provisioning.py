@@ -0,0 +1,113 @@
+from random import shuffle
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from app.database import commit
+from app.cruds.board import random_board_colors
+from app.cruds.tile import TileService
+from app.models.enums import EasyShapes, HardShapes, IsBlocked, Movements
+from app.models.models import Boards, Matches, MovementCards, Players, ShapeCards, Tiles
+from app.utils.figures_cache import pack_board_table
+from app.utils.utils import MAX_SHAPE_CARDS
+
+HAND_SIZE = 3
+MOVEMENT_CARDS_PER_TYPE = 7
+
+
+class MatchProvisioningService:
+    """
+    Servicio para preparar una partida al iniciarla: tablero, mazos y manos
+    iniciales se crean en una sola transaccion.
+    """
+
+    def __init__(self, db: Session):
+        """ Constructor de la clase, guardamos en el atributo
+            db: La session de la base de datos."""
+        self.db = db
+
+    def provision_match(self, match: Matches, players: List[Players]) -> Boards:
+        """
+        Crea el tablero, el mazo de movimientos y los mazos de figuras de la
+        partida, sortea el orden de los jugadores y reparte las manos iniciales.
+        Todo se inserta en bloque y se confirma con un unico commit.
+
+        Args:
+            match: Partida a iniciar.
+            players: Jugadores de la partida.
+        Returns:
+            board: Tablero creado.
+        """
+        try:
+            board = self._add_board(match.id)
+            self._set_players_order(match, players)
+            self._add_movement_deck(match.id, players)
+            self._add_shape_decks(match, players)
+            commit(self.db)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        return board
+
+    def _add_board(self, match_id: int) -> Boards:
+        board = Boards(match_id=match_id)
+        self.db.add(board)
+        # El flush asigna el id del tablero sin confirmar la transaccion
+        self.db.flush()
+
+        colors = random_board_colors()
+        if TileService(self.db).is_packed():
+            board.packed_tiles = pack_board_table([colors])
+        else:
+            colors_iter = iter(colors)
+            self.db.add_all([
+                Tiles(board_id=board.id, color=next(colors_iter), position_x=i, position_y=j)
+                for i in range(6)
+                for j in range(6)
+            ])
+        return board
+
+    def _set_players_order(self, match: Matches, players: List[Players]):
+        order = list(players)
+        shuffle(order)
+        for i, player in enumerate(order, start=1):
+            player.turn_order = i
+        match.current_player_turn = 1
+
+    def _add_movement_deck(self, match_id: int, players: List[Players]):
+        deck = [
+            MovementCards(mov_type=mov.value, match_id=match_id)
+            for mov in Movements
+            for _ in range(MOVEMENT_CARDS_PER_TYPE)
+        ]
+        shuffle(deck)
+        for position, card in enumerate(deck):
+            card.deck_position = position
+
+        # Las primeras cartas del mazo mezclado son las manos iniciales
+        for i, player in enumerate(players):
+            for card in deck[i * HAND_SIZE: (i + 1) * HAND_SIZE]:
+                card.player_owner = player.id
+
+        self.db.add_all(deck)
+
+    def _add_shape_decks(self, match: Matches, players: List[Players]):
+        shapes = [(shape.value, True) for shape in HardShapes] * 2
+        shapes += [(shape.value, False) for shape in EasyShapes] * 2
+        shuffle(shapes)
+
+        cards = []
+        for player in players:
+            for i in range(int(MAX_SHAPE_CARDS / match.max_players)):
+                shape_type, is_hard = shapes.pop()
+                cards.append(ShapeCards(
+                    shape_type=shape_type,
+                    is_hard=is_hard,
+                    is_visible=i < HAND_SIZE,
+                    is_blocked=IsBlocked.NOT_BLOCKED.name,
+                    player_owner=player.id,
+                    deck_position=i,
+                ))
+
+        self.db.add_all(cards)
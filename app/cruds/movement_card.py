@@ -1,7 +1,10 @@
+from random import shuffle
 from typing import List
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import NoResultFound
 
+from app.database import commit
 from app.models.enums import Movements
 from app.models.models import Matches, MovementCards
 from app.utils.utils import validate_movement
@@ -36,7 +39,7 @@ class MovementCardService:
             movement_card = MovementCards(
                 mov_type=mov_type, player_owner=player_owner, match_id=match_id)
         self.db.add(movement_card)
-        self.db.commit()
+        commit(self.db)
         self.db.refresh(movement_card)
         return movement_card
 
@@ -96,7 +99,7 @@ class MovementCardService:
             movement_card = self.db.query(MovementCards).filter(
                 MovementCards.id == movement_card_id).one()
             self.db.delete(movement_card)
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise MovementCardNotFound(movement_card_id)
 
@@ -116,7 +119,7 @@ class MovementCardService:
                 f"No movement cards found for player owner {player_owner}")
         for movement_card in movement_cards:
             self.db.delete(movement_card)
-        self.db.commit()
+        commit(self.db)
 
     def get_movement_card_by_match(self, match_id: int) -> List[MovementCards]:
         """
@@ -145,7 +148,7 @@ class MovementCardService:
         """
         movement_card = self.get_movement_card_by_id(movement_card_id)
         movement_card.player_owner = player_id
-        self.db.commit()
+        commit(self.db)
         self.db.refresh(movement_card)
         return movement_card
 
@@ -165,20 +168,65 @@ class MovementCardService:
 
     def update_card_owner_to_none(self, movement_card_id: int) -> MovementCards:
         """
-        Actualiza el propietario de una carta de movimiento.
+        Quita el propietario de una carta de movimiento y la pone al fondo del
+        mazo. Si se deshace el movimiento parcial, la carta vuelve al jugador
+        con add_movement_card_to_player sin cambiar el orden del mazo.
 
         Args:
             movement_card_id : Id de la carta de movimiento.
-            player_id : Id del nuevo propietario.
         Returns:
             none.
         """
         movement_card = self.get_movement_card_by_id(movement_card_id)
         movement_card.player_owner = None
-        self.db.commit()
+        # La carta jugada vuelve al fondo del mazo
+        movement_card.deck_position = self.get_deck_bottom(movement_card.match_id) + 1
+        commit(self.db)
         self.db.refresh(movement_card)
         return movement_card
 
+    def get_deck_bottom(self, match_id: int) -> int:
+        """
+        Obtiene la posicion de la ultima carta del mazo de un match.
+
+        Args:
+            match_id : Id del match.
+        Returns:
+            int: posicion de la ultima carta, -1 si el mazo esta vacio.
+        """
+        bottom = self.db.query(func.max(MovementCards.deck_position)).filter(
+            MovementCards.match_id == match_id).scalar()
+        return -1 if bottom is None else bottom
+
+    def draw_movement_cards(self, match_id: int, player_id: int, amount: int) -> List[MovementCards]:
+        """
+        Roba cartas del tope del mazo de un match y se las da a un jugador,
+        con una consulta y una actualizacion en bloque.
+
+        Args:
+            match_id : Id del match.
+            player_id : Id del jugador.
+            amount : cantidad de cartas a robar.
+        Returns:
+            MovementCards: Lista de cartas robadas, puede tener menos de amount
+            si el mazo se acaba.
+        """
+        if amount <= 0:
+            return []
+
+        movement_cards = self.db.query(MovementCards).filter(
+            MovementCards.match_id == match_id,
+            MovementCards.player_owner == None).order_by(
+            MovementCards.deck_position, MovementCards.id).limit(amount).all()
+        if not movement_cards:
+            return []
+
+        self.db.query(MovementCards).filter(
+            MovementCards.id.in_([card.id for card in movement_cards])).update(
+            {MovementCards.player_owner: player_id}, synchronize_session="fetch")
+        commit(self.db)
+        return movement_cards
+
     def create_movement_deck(self, match_id: int):
         match = self.db.get(Matches, match_id)
         if match is None:
@@ -189,5 +237,8 @@ class MovementCardService:
             for _ in range(7):
                 movement_card = MovementCards(mov_type=mov.value, match_id=match_id)
                 deck.append(movement_card)
+        shuffle(deck)
+        for position, movement_card in enumerate(deck):
+            movement_card.deck_position = position
         self.db.add_all(deck)
-        self.db.commit()
\ No newline at end of file
+        commit(self.db)
@@ -2,6 +2,7 @@ from typing import List
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import NoResultFound
 
+from app.database import commit
 from app.models.models import Players
 from app.utils.utils import validate_player_name
 
@@ -32,7 +33,7 @@ class PlayerService:
         player = Players(player_name=name, match_id=match_to_link,
                          is_owner=owner, session_token=token)
         self.db.add(player)
-        self.db.commit()
+        commit(self.db)
         self.db.refresh(player)
         return player
 
@@ -93,7 +94,7 @@ class PlayerService:
             if player is None:
                 raise NoResultFound
             self.db.delete(player)
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise ValueError("No player with that id")
 
@@ -113,7 +114,7 @@ class PlayerService:
             if player is None:
                 raise NoResultFound
             player.match_id = match_id
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise ValueError("No player with that id")
 
@@ -132,7 +133,7 @@ class PlayerService:
             if player is None:
                 raise NoResultFound
             player.turn_order = turn_order
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise ValueError("No player with that id")
 
@@ -2,6 +2,7 @@ from typing import List
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import NoResultFound
 
+from app.database import commit
 from app.models.models import Players, ShapeCards
 from app.models.enums import IsBlocked
 from app.utils.utils import validate_shape, validate_add_shape_card_to_hand
@@ -36,7 +37,7 @@ class ShapeCardService():
         shape_card = ShapeCards(shape_type=shape, is_hard=is_hard, is_visible=is_visible,
                                 is_blocked=IsBlocked.NOT_BLOCKED.name, player_owner=player_owner)
         self.db.add(shape_card)
-        self.db.commit()
+        commit(self.db)
         self.db.refresh(shape_card)
         return shape_card
 
@@ -105,7 +106,7 @@ class ShapeCardService():
             shape_card = self.db.query(ShapeCards).filter(
                 ShapeCards.id == shape_card_id).one()
             self.db.delete(shape_card)
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise NoResultFound(
                 f"ShapeCard with id {shape_card_id} not found, can't delete")
@@ -125,7 +126,7 @@ class ShapeCardService():
             shape_card = self.db.query(ShapeCards).filter(
                 ShapeCards.id == shape_card_id).one()
             shape_card.player_owner = player_id
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise NoResultFound(
                 f"ShapeCard with id {shape_card_id} not found, can't add")
@@ -144,7 +145,7 @@ class ShapeCardService():
                 ShapeCards.id == shape_card_id).one()
             shape_card.is_visible = is_visible
             shape_card.is_blocked = is_blocked
-            self.db.commit()
+            commit(self.db)
         except NoResultFound:
             raise NoResultFound(
                 f"ShapeCard with id {shape_card_id} not found, can't update")
@@ -158,7 +159,7 @@ class ShapeCardService():
         """
         try:
             cards = self.db.query(ShapeCards).filter(ShapeCards.player_owner == player_id).filter(
-                ShapeCards.is_visible == is_visible).all()
+                ShapeCards.is_visible == is_visible).order_by(ShapeCards.deck_position, ShapeCards.id).all()
             return cards
 
         # REVISAR CUANDO SEA 0
@@ -166,6 +167,35 @@ class ShapeCardService():
             raise NoResultFound(
                 f"Player with id {player_id} has not visible cards")
 
+    def draw_shape_cards(self, player_id: int, hand_size: int = 3) -> List[ShapeCards]:
+        """
+            Da vuelta cartas del mazo de un jugador, en el orden del mazo, hasta
+            tener hand_size cartas visibles. Usa una consulta y una
+            actualizacion en bloque.
+            Args:
+                - player_id : id del jugador.
+                - hand_size : cantidad de cartas visibles de una mano completa.
+            Returns:
+                ShapeCards: Lista de cartas dadas vuelta, puede estar vacia.
+        """
+        # Las visibles primero y despues las del tope del mazo: alcanza con
+        # traer hand_size cartas de cada grupo
+        cards = self.db.query(ShapeCards).filter(
+            ShapeCards.player_owner == player_id).order_by(
+            ShapeCards.is_visible.desc(), ShapeCards.deck_position, ShapeCards.id).limit(
+            2 * hand_size).all()
+        visible = sum(1 for card in cards if card.is_visible)
+        drawn = [card for card in cards if not card.is_visible][:max(hand_size - visible, 0)]
+        if not drawn:
+            return []
+
+        self.db.query(ShapeCards).filter(
+            ShapeCards.id.in_([card.id for card in drawn])).update(
+            {ShapeCards.is_visible: True, ShapeCards.is_blocked: IsBlocked.NOT_BLOCKED.name},
+            synchronize_session="fetch")
+        commit(self.db)
+        return drawn
+
     def get_deck_size(self, player_id: int) -> int:
         """
             Obtiene el tamaÃ±o del mazo de un jugador.
@@ -1,14 +1,41 @@
 from typing import List
+from sqlalchemy import String, and_, func, or_, update
 from sqlalchemy.exc import NoResultFound
 
-from app.models.models import Tiles
+from app import config
+from app.database import after_transaction, commit
+from app.models.models import Boards, Tiles
 from app.utils.utils import validate_color, validate_position
 from app.exceptions import TileNotFound, NoTilesFound
+from app.utils.figures_cache import CODE_TO_COLOR, COLOR_TO_CODE, figures_cache
+
+BOARD_COLUMNS = 6
+
+
+def packed_index(position_x: int, position_y: int) -> int:
+    """Indice de la ficha dentro de la columna empaquetada del tablero."""
+    return position_x * BOARD_COLUMNS + position_y
+
+
+def invalidate_board(db, board_id: int):
+    """Olvida el tablero cacheado despues de modificarlo.
+
+    Se olvida en el momento, para que la misma sesion lea el tablero nuevo, y
+    otra vez al terminar la transaccion: el tablero que se leyo antes del
+    commit (o de un rollback) no es el que queda en la base de datos.
+    """
+    figures_cache.invalidate_board(board_id)
+    after_transaction(db, lambda: figures_cache.invalidate_board(board_id))
 
 
 class TileService:
     """
     Servicio para realizar operaciones CRUD sobre la tabla de Tiles
+
+    Si los tableros se guardan empaquetados (config.BOARD_STORAGE), las fichas
+    no tienen filas propias: get_tile_by_position y swap_tiles leen y escriben
+    la columna packed_tiles del tablero, y devuelven fichas que no pertenecen
+    a la sesion (sin id). El resto de los metodos solo operan sobre filas.
     """
 
     def __init__(self, db):
@@ -30,7 +57,8 @@ class TileService:
         new_tile = Tiles(board_id=board_id, color=color,
                          position_x=position_x, position_y=position_y)
         self.db.add(new_tile)
-        self.db.commit()
+        commit(self.db)
+        invalidate_board(self.db, board_id)
         return new_tile
 
     def get_all_tiles(self) -> List[Tiles]:
@@ -69,8 +97,9 @@ class TileService:
         tile = self.db.query(Tiles).filter(Tiles.id == tile_id).one()
         tile.position_x = position_x
         tile.position_y = position_y
-        self.db.commit()
+        commit(self.db)
         self.db.refresh(tile)
+        invalidate_board(self.db, tile.board_id)
 
     def delete_tile(self, tile_id: int):
         """
@@ -79,8 +108,10 @@ class TileService:
             tile_id: Id de la ficha.
         """
         tile = self.db.query(Tiles).filter(Tiles.id == tile_id).one()
+        board_id = tile.board_id
         self.db.delete(tile)
-        self.db.commit()
+        commit(self.db)
+        invalidate_board(self.db, board_id)
 
     def get_tile_by_position(self, position_x: int, position_y: int, board_id: int) -> Tiles:
         """
@@ -91,8 +122,147 @@ class TileService:
         Returns:
             tile: Ficha.
         """
+        if self.is_packed():
+            packed_tiles = self.db.query(Boards.packed_tiles).filter(Boards.id == board_id).scalar()
+            if packed_tiles is None:
+                raise NoResultFound(f"Tile not found with {position_x} and {position_y}")
+            validate_position(position_x, position_y)
+            color = CODE_TO_COLOR[packed_tiles[packed_index(position_x, position_y)]]
+            return Tiles(board_id=board_id, color=color,
+                         position_x=position_x, position_y=position_y)
+
         try:
             tile = self.db.query(Tiles).filter(Tiles.position_x == position_x, Tiles.position_y == position_y, Tiles.board_id == board_id).one()
             return tile
         except NoResultFound:
-            raise NoResultFound("Tile not found with {position_x} and {position_y}")
\ No newline at end of file
+            raise NoResultFound(f"Tile not found with {position_x} and {position_y}")
+
+    def swap_tiles(self, tile1: Tiles, tile2: Tiles):
+        """
+        Intercambia la posicion de dos fichas del mismo tablero en una sola
+        transaccion. Al terminar, tile1 y tile2 quedan con sus nuevas posiciones.
+        Args:
+            tile1: Primera ficha.
+            tile2: Segunda ficha.
+        """
+        board_id = tile1.board_id
+        first = (tile1.position_x, tile1.position_y)
+        second = (tile2.position_x, tile2.position_y)
+
+        if self.is_packed():
+            self._swap_packed_tiles(board_id, first, second)
+        else:
+            tiles = self.db.query(Tiles).filter(Tiles.id.in_([tile1.id, tile2.id])).all()
+            if len(tiles) != 2:
+                raise NoResultFound(f"Tiles not found with {tile1.id} and {tile2.id}")
+            for tile in tiles:
+                tile.position_x, tile.position_y = second if tile.id == tile1.id else first
+            commit(self.db)
+
+        tile1.position_x, tile1.position_y = second
+        tile2.position_x, tile2.position_y = first
+        invalidate_board(self.db, board_id)
+
+    def swap_positions(self, board_id: int, first: tuple, second: tuple):
+        """
+        Intercambia las fichas que estan en dos posiciones de un tablero, sin
+        tener que cargarlas antes.
+        Args:
+            board_id: Id del tablero.
+            first: Posicion (x, y) de la primera ficha.
+            second: Posicion (x, y) de la segunda ficha.
+        """
+        first, second = tuple(first), tuple(second)
+        if self.is_packed():
+            self._swap_packed_tiles(board_id, first, second)
+        else:
+            tiles = self.db.query(Tiles).filter(
+                Tiles.board_id == board_id,
+                or_(
+                    and_(Tiles.position_x == first[0], Tiles.position_y == first[1]),
+                    and_(Tiles.position_x == second[0], Tiles.position_y == second[1]),
+                ),
+            ).all()
+            if len(tiles) != 2:
+                raise NoResultFound(f"Tiles not found with {first} and {second}")
+            for tile in tiles:
+                tile.position_x, tile.position_y = (
+                    second if (tile.position_x, tile.position_y) == first else first
+                )
+            commit(self.db)
+
+        invalidate_board(self.db, board_id)
+
+    def update_colors(self, board_id: int, colors: dict):
+        """
+        Cambia el color de las fichas de varias posiciones de un tablero.
+        Args:
+            board_id: Id del tablero.
+            colors: Nuevo color de cada posicion (x, y).
+        """
+        for color in colors.values():
+            validate_color(color)
+
+        if self.is_packed():
+            packed_tiles = self.db.query(Boards.packed_tiles).filter(Boards.id == board_id).scalar()
+            if packed_tiles is None:
+                raise NoResultFound(f"Board not found with id {board_id}")
+            packed = list(packed_tiles)
+            for (position_x, position_y), color in colors.items():
+                validate_position(position_x, position_y)
+                packed[packed_index(position_x, position_y)] = COLOR_TO_CODE[color]
+            self.db.execute(
+                update(Boards)
+                .where(Boards.id == board_id)
+                .values(packed_tiles="".join(packed))
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            for (position_x, position_y), color in colors.items():
+                result = self.db.execute(
+                    update(Tiles)
+                    .where(Tiles.board_id == board_id,
+                           Tiles.position_x == position_x,
+                           Tiles.position_y == position_y)
+                    .values(color=color)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    raise NoResultFound(f"Tile not found with {position_x} and {position_y}")
+
+        commit(self.db)
+        invalidate_board(self.db, board_id)
+
+    def _swap_packed_tiles(self, board_id: int, first: tuple, second: tuple):
+        """
+        Intercambia dos caracteres de la columna packed_tiles con un unico
+        UPDATE, de forma que el intercambio es atomico en la base de datos.
+        """
+        low, high = sorted((packed_index(*first), packed_index(*second)))
+        if low == high:
+            return
+
+        # substr es 1-indexado: [0, low) + high + (low, high) + low + (high, 36)
+        def substr(*args):
+            return func.substr(Boards.packed_tiles, *args, type_=String)
+
+        swapped = (
+            substr(1, low)
+            + substr(high + 1, 1)
+            + substr(low + 2, high - low - 1)
+            + substr(low + 1, 1)
+            + substr(high + 2)
+        )
+        result = self.db.execute(
+            update(Boards)
+            .where(Boards.id == board_id, Boards.packed_tiles.is_not(None))
+            .values(packed_tiles=swapped)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise NoResultFound(f"Board not found with id {board_id}")
+        commit(self.db)
+
+    def is_packed(self) -> bool:
+        """Indica si los tableros se guardan empaquetados en una sola columna."""
+        return config.BOARD_STORAGE == config.PACKED_STORAGE
\ No newline at end of file
@@ -1,21 +1,38 @@
 import logging
+from contextlib import contextmanager
+from typing import Callable
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 
 from app.models.models import Base
-from app.config import DATABASE_FILENAME
+from app.config import DATABASE_FILENAME, SHARD_COUNT
+from app.migrations import add_missing_columns, create_missing_indexes
 
 # Configuración de la base de datos
 engine = create_engine(f'sqlite:///{DATABASE_FILENAME}')
 
+if SHARD_COUNT > 1:
+    # Varios procesos escriben el mismo archivo: con WAL las lecturas no
+    # esperan a las escrituras de los demas workers
+    @event.listens_for(engine, "connect")
+    def enable_wal(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+
 # Crea una sesión
 Init_Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 logger = logging.getLogger(__name__)
 
+# Clave en session.info que indica que la sesion esta dentro de un unit of work
+UNIT_OF_WORK = "unit_of_work"
+# Clave en session.info con las funciones a llamar cuando termina el unit of work
+AFTER_TRANSACTION = "after_transaction"
+
 def init_db():
     Base.metadata.create_all(bind=engine, checkfirst=True)
+    add_missing_columns(engine)
+    create_missing_indexes(engine)
     logger.info("Database initialized")
 
 
@@ -30,3 +47,64 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def in_unit_of_work(db: Session) -> bool:
+    """Indica si la sesion esta agrupando sus cambios en un unit of work."""
+    return db.info.get(UNIT_OF_WORK) is True
+
+
+def commit(db: Session):
+    """Confirma los cambios de la sesion.
+
+    Dentro de un unit of work solo hace flush, el commit lo hace el unit of
+    work al terminar. Los servicios usan esta funcion en lugar de db.commit()
+    para seguir confirmando cada operacion cuando se usan por separado.
+    """
+    if in_unit_of_work(db):
+        db.flush()
+    else:
+        db.commit()
+
+
+@contextmanager
+def unit_of_work(db: Session):
+    """Agrupa todas las operaciones de los servicios en una sola transaccion.
+
+    Se hace un unico commit al salir del bloque, o rollback si se lanza una
+    excepcion. Un unit of work anidado se suma a la transaccion del exterior.
+
+    Ejemplo:
+        with unit_of_work(db):
+            PlayerService(db).update_turn_order(...)
+            MatchService(db).update_match(...)
+    """
+    if in_unit_of_work(db):
+        yield db
+        return
+
+    db.info[UNIT_OF_WORK] = True
+    try:
+        yield db
+        db.info.pop(UNIT_OF_WORK)
+        db.commit()
+    except BaseException:
+        db.info.pop(UNIT_OF_WORK, None)
+        db.rollback()
+        raise
+    finally:
+        for callback in db.info.pop(AFTER_TRANSACTION, []):
+            callback()
+
+
+def after_transaction(db: Session, callback: Callable[[], None]):
+    """Llama a callback cuando termina la transaccion de la sesion.
+
+    Dentro de un unit of work se llama al salir del bloque, despues del commit
+    o del rollback. Fuera de uno se llama en el momento, porque los servicios
+    ya hicieron commit.
+    """
+    if in_unit_of_work(db):
+        db.info.setdefault(AFTER_TRANSACTION, []).append(callback)
+    else:
+        callback()
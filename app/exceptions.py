@@ -262,3 +262,11 @@ class NoMovementCardsFound(SwitcherException):
     def __init__(self, player_owner: int):
         message: str = f"No movement cards found with player id {player_owner}"
         super().__init__(message)
+
+# ========================= Workers Exceptions ========================
+
+
+class WorkerPoolFull(SwitcherException):
+    def __init__(self):
+        message: str = "Database worker pool is full, try again later"
+        super().__init__(message)
@@ -0,0 +1,349 @@
+"""
+Estado en memoria de las partidas en curso.
+
+Durante un turno el jugador hace y deshace movimientos parciales, que casi
+siempre se deshacen al terminar el turno. Cada partida en curso tiene un
+`GameState` con su tablero, las cartas de movimiento de cada jugador, el turno,
+el color prohibido y el historial de movimientos parciales. Los movimientos
+parciales solo cambian este estado, sin consultar ni escribir la base de datos.
+
+La base de datos se actualiza en checkpoints, con los cambios acumulados desde
+el checkpoint anterior en una sola transaccion:
+    - al terminar un turno (por el jugador o por vencimiento), despues de
+      deshacer en memoria los movimientos parciales;
+    - antes de las acciones que modifican la partida en la base de datos:
+      usar o bloquear una figura y abandonar la partida.
+La informacion de la partida que se pide por HTTP se arma con el estado en
+memoria, si hay uno, sin guardarlo.
+Entre dos checkpoints la base de datos tiene el estado del ultimo checkpoint
+completo. El historial de movimientos parciales esta en otro almacenamiento
+(app.movement_journal), asi que no se puede guardar en la misma transaccion
+que el tablero: se escribe de forma que cada movimiento del historial este
+siempre hecho en el tablero guardado. Si el servidor se cae, al volver la
+partida sigue desde el ultimo checkpoint: se pierden solo los movimientos
+parciales hechos despues, que de todas formas se deshacen al terminar el turno,
+y a lo sumo algunos movimientos quedan hechos sin poder deshacerse.
+
+El estado de una partida solo se puede usar desde su actor (app.match_actors)
+y en el worker duenio de la partida (app.sharding). Si otros workers atienden
+la misma partida (varios workers sin afinidad, ShardMap.exclusive falso), el
+estado no se conserva entre requests: cada accion lo carga de la base de datos
+y lo guarda al terminar, con `GameStates.save`.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.cruds.board import BoardService
+from app.cruds.match import MatchService
+from app.cruds.movement_card import MovementCardService
+from app.cruds.player import PlayerService
+from app.cruds.tile import TileService
+from app.database import unit_of_work
+from app.exceptions import NoMovementCardsFound
+from app.logger import logging
+from app.movement_journal import JournalEntry, movement_journal
+from app.sharding import ShardMap, shard_map
+from app.utils.board_shapes_algorithm import Board, Coordinate, FiguresDiff, FiguresTracker
+from app.utils.utils import ALL_FIGURES
+from app.workers import run_in_db_worker
+
+logger = logging.getLogger(__name__)
+
+
+def common_prefix(first: List[JournalEntry], second: List[JournalEntry]) -> List[JournalEntry]:
+    """Movimientos con los que empiezan los dos historiales."""
+    length = 0
+    for entry1, entry2 in zip(first, second):
+        if entry1 != entry2:
+            break
+        length += 1
+    return first[:length]
+
+
+class PlayerState(NamedTuple):
+    """Jugador de una partida en curso."""
+
+    player_name: str
+    turn_order: int
+
+
+class GameState:
+    """Estado de una partida en curso.
+
+    Attributes:
+        match_id: id de la partida.
+        board_id: id del tablero.
+        current_player_turn: turno actual.
+        ban_color: color prohibido del tablero.
+        players: jugadores de la partida por id.
+        board: matriz de colores del tablero.
+        figures_tracker: figuras formadas en el tablero.
+        card_types: tipo de cada carta de movimiento de la partida por id.
+        card_owners: duenio de cada carta de movimiento, None si esta en el mazo.
+        journal: movimientos parciales del turno, del primero al ultimo.
+    """
+
+    def __init__(
+        self,
+        match_id: int,
+        board_id: int,
+        current_player_turn: int,
+        ban_color: Optional[str],
+        players: Dict[int, PlayerState],
+        board: List[List[str]],
+        card_types: Dict[int, str],
+        card_owners: Dict[int, Optional[int]],
+        journal: List[JournalEntry],
+    ):
+        self.match_id = match_id
+        self.board_id = board_id
+        self.current_player_turn = current_player_turn
+        self.ban_color = ban_color
+        self.players = players
+        self.board = [list(row) for row in board]
+        self.figures_tracker = FiguresTracker(Board(self.board), ALL_FIGURES)
+        self.card_types = card_types
+        self.card_owners = dict(card_owners)
+        self.journal = list(journal)
+        self._mark_persisted()
+
+    @classmethod
+    def load(cls, match_id: int, db: Session) -> "GameState":
+        """Carga el estado de una partida de la base de datos. Es sincronica,
+        se ejecuta en el pool de workers.
+
+        Raises:
+            NoResultFound: si no se encuentra la partida o su tablero.
+        """
+        match = MatchService(db).get_match_by_id(match_id)
+        board_service = BoardService(db)
+        board = board_service.get_board_by_match_id(match_id)
+        players = {
+            player.id: PlayerState(player.player_name, player.turn_order)
+            for player in PlayerService(db).get_players_by_match(match_id)
+        }
+        try:
+            cards = MovementCardService(db).get_movement_card_by_match(match_id)
+        except NoMovementCardsFound:
+            cards = []
+
+        return cls(
+            match_id,
+            board.id,
+            match.current_player_turn,
+            board.ban_color,
+            players,
+            board_service.get_board_table(board.id),
+            {card.id: card.mov_type for card in cards},
+            {card.id: card.player_owner for card in cards},
+            board_service.get_temporary_movements(board.id),
+        )
+
+    def hand(self, player_id: int) -> List[Tuple[int, str]]:
+        """Cartas de movimiento de un jugador, como tuplas (id, tipo)."""
+        return [
+            (card_id, self.card_types[card_id])
+            for card_id, owner in self.card_owners.items()
+            if owner == player_id
+        ]
+
+    def move(self, first: Coordinate, second: Coordinate, card_id: int) -> Tuple[JournalEntry, FiguresDiff]:
+        """Intercambia dos fichas con una carta de movimiento, que vuelve al mazo.
+
+        Returns:
+            El movimiento agregado al historial y las figuras que cambiaron.
+        """
+        figures_diff = self.figures_tracker.swap(first, second)
+        self._swap(first, second)
+        self.card_owners[card_id] = None
+        if card_id in self._discarded:
+            self._discarded.remove(card_id)
+        self._discarded.append(card_id)
+
+        # Como en el historial, las posiciones de las fichas despues del intercambio
+        entry = JournalEntry(Coordinate(*second), Coordinate(*first), card_id, bool(figures_diff.added))
+        self.journal.append(entry)
+        return entry, figures_diff
+
+    def undo(self, player_id: int) -> Optional[Tuple[JournalEntry, FiguresDiff]]:
+        """Deshace el ultimo movimiento parcial y devuelve la carta al jugador.
+
+        Returns:
+            El movimiento deshecho y las figuras que cambiaron, o None si no
+            hay movimientos.
+        """
+        if not self.journal:
+            return None
+        entry = self.journal.pop()
+        figures_diff = self.figures_tracker.swap(entry.tile1, entry.tile2)
+        self._swap(entry.tile1, entry.tile2)
+        self.card_owners[entry.id_mov] = player_id
+        if entry.id_mov in self._discarded:
+            self._discarded.remove(entry.id_mov)
+        return entry, figures_diff
+
+    def _swap(self, first: Coordinate, second: Coordinate):
+        (x1, y1), (x2, y2) = first, second
+        self.board[x1][y1], self.board[x2][y2] = self.board[x2][y2], self.board[x1][y1]
+
+    @property
+    def dirty(self) -> bool:
+        """Si hay cambios sin guardar desde el ultimo checkpoint."""
+        return (
+            self.board != self._persisted_board
+            or self.card_owners != self._persisted_owners
+            or self.journal != self._persisted_journal
+        )
+
+    def changes(self) -> Tuple[Dict[Tuple[int, int], str], Dict[int, Optional[int]]]:
+        """Cambios desde el ultimo checkpoint.
+
+        Un movimiento deshecho antes del checkpoint no deja cambios.
+
+        Returns:
+            - Nuevo color de las fichas que cambiaron, por posicion (x, y).
+            - Nuevo duenio de las cartas que cambiaron, por id.
+        """
+        tiles = {
+            (x, y): color
+            for x, row in enumerate(self.board)
+            for y, color in enumerate(row)
+            if color != self._persisted_board[x][y]
+        }
+        owners = {
+            card_id: owner
+            for card_id, owner in self.card_owners.items()
+            if owner != self._persisted_owners.get(card_id)
+        }
+        return tiles, owners
+
+    def persist(self, db: Session):
+        """Guarda los cambios desde el ultimo checkpoint en una sola
+        transaccion, y el historial antes y despues de ella. Es sincronica, se
+        ejecuta en el pool de workers.
+        """
+        tiles, owners = self.changes()
+        movement_service = MovementCardService(db)
+
+        # Antes del tablero el historial se reduce a los movimientos que estan
+        # en el guardado y en el nuevo, que estan hechos en los dos tableros:
+        # si el servidor se cae, nunca queda en el historial un movimiento que
+        # no este en el tablero, que al deshacerlo lo romperia
+        kept = common_prefix(self._persisted_journal, self.journal)
+        if kept != self._persisted_journal:
+            movement_journal.replace(self.board_id, kept)
+
+        with unit_of_work(db):
+            if tiles:
+                TileService(db).update_colors(self.board_id, tiles)
+            # Las cartas jugadas van al fondo del mazo en el orden en que se jugaron
+            discarded = [card_id for card_id in self._discarded if card_id in owners]
+            discarded += [card_id for card_id, owner in owners.items()
+                          if owner is None and card_id not in discarded]
+            for card_id in discarded:
+                movement_service.update_card_owner_to_none(card_id)
+            for card_id, owner in owners.items():
+                if owner is not None:
+                    movement_service.add_movement_card_to_player(owner, card_id)
+
+        # Si el servidor se cae antes de esto, los movimientos nuevos quedan
+        # hechos pero no se pueden deshacer
+        if self.journal != kept:
+            movement_journal.replace(self.board_id, self.journal)
+
+        logger.info("Match %s checkpoint: %s tiles, %s cards, %s partial movements",
+                    self.match_id, len(tiles), len(owners), len(self.journal))
+        self._mark_persisted()
+
+    def _mark_persisted(self):
+        self._persisted_board = [list(row) for row in self.board]
+        self._persisted_owners = dict(self.card_owners)
+        self._persisted_journal = list(self.journal)
+        # Cartas jugadas desde el ultimo checkpoint, en orden
+        self._discarded: List[int] = []
+
+
+class GameStates:
+    """Estados de las partidas en curso del proceso.
+
+    Todos los metodos de una partida se tienen que llamar desde su actor.
+
+    Attributes:
+        shards: reparto de las partidas; sin afinidad y con otros workers
+            sobre la misma base de datos los estados no se conservan.
+    """
+
+    def __init__(self, shards: ShardMap = shard_map) -> None:
+        self.shards = shards
+        self._states: Dict[int, GameState] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {"loads": 0, "checkpoints": 0}
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["active"] = len(self._states)
+        stats["dirty"] = sum(state.dirty for state in list(self._states.values()))
+        return stats
+
+    def get(self, match_id: int) -> Optional[GameState]:
+        """Estado de la partida si esta cargado. Si otros workers atienden la
+        partida, la base de datos es la unica fuente y devuelve None."""
+        if not self.shards.exclusive:
+            return None
+        return self._states.get(match_id)
+
+    async def load(self, match_id: int, db: Session) -> GameState:
+        """Devuelve el estado de la partida, cargandolo de la base de datos si
+        no esta en memoria. Si otros workers pueden haber cambiado la partida
+        se carga siempre.
+
+        Raises:
+            NoResultFound: si no se encuentra la partida o su tablero.
+        """
+        state = self._states.get(match_id)
+        if state is None or not self.shards.exclusive:
+            state = await run_in_db_worker(GameState.load, match_id, db)
+            self._states[match_id] = state
+            self._stats["loads"] += 1
+        return state
+
+    async def checkpoint(self, match_id: int, db: Session, release: bool = False):
+        """Guarda en la base de datos los cambios del estado de la partida.
+
+        Args:
+            match_id: id de la partida.
+            db: Session de la base de datos.
+            release: si se descarta el estado despues de guardarlo, porque la
+                accion que sigue modifica la partida en la base de datos.
+        """
+        state = self._states.get(match_id)
+        if state is None:
+            return
+        if state.dirty:
+            # Si falla se conserva el estado, con los cambios sin guardar
+            await run_in_db_worker(state.persist, db)
+            self._stats["checkpoints"] += 1
+        if release and self._states.get(match_id) is state:
+            del self._states[match_id]
+
+    async def save(self, match_id: int, db: Session):
+        """Se llama despues de cambiar el estado de la partida. Si otros workers
+        atienden la partida, el cambio se guarda en el momento y el estado se
+        descarta; si no, queda en memoria hasta el proximo checkpoint.
+        """
+        if not self.shards.exclusive:
+            await self.checkpoint(match_id, db, release=True)
+
+    def discard(self, match_id: int):
+        """Descarta el estado de la partida sin guardarlo."""
+        self._states.pop(match_id, None)
+
+    def clear(self):
+        self._states.clear()
+
+
+game_states = GameStates()
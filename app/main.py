@@ -1,9 +1,18 @@
 import os
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import JSONResponse
 from app.routers import matches, players
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import init_db
+from app.backplane import REFRESH_LOBBY_EVENT
+from app.connection_manager import manager
+from app.database import Init_Session, init_db
+from app.exceptions import WorkerPoolFull
+from app.game_state import game_states
+from app.match_actors import match_actors
+from app.sharding import ShardRoutingMiddleware
+from app.turn_scheduler import turn_scheduler
+from app.workers import db_worker_pool, event_loop_monitor
 
 os.environ["TURN_TIMER"] = "120"
 
@@ -11,6 +20,10 @@ init_db()
 
 app = FastAPI()
 
+# Con afinidad de partidas los requests de partidas de otro worker se
+# redirigen a su duenio. CORS se agrega despues para envolver las redirecciones
+app.add_middleware(ShardRoutingMiddleware)
+
 origins = ["*"]
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +37,50 @@ app.include_router(matches.router)
 app.include_router(players.router)
 
 
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    event_loop_monitor.start()
+
+
+@app.on_event("startup")
+async def start_backplane():
+    manager.subscribe(REFRESH_LOBBY_EVENT, players.refresh_lobby)
+    manager.start_backplane()
+
+
+@app.on_event("startup")
+async def recover_turn_timeouts():
+    # Los vencimientos de turno viven en memoria: al reiniciar se reprograman
+    # a partir de los guardados en la base de datos
+    with Init_Session() as db:
+        players.recover_turn_timeouts(db)
+
+
+@app.on_event("shutdown")
+async def stop_workers():
+    event_loop_monitor.stop()
+    db_worker_pool.shutdown()
+    manager.shutdown()
+    turn_scheduler.stop()
+
+
+@app.exception_handler(WorkerPoolFull)
+async def worker_pool_full_handler(request: Request, exc: WorkerPoolFull):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 @app.get("/")
 def hello_world():
     return {"Hello": "World"}
+
+
+@app.get("/metrics")
+def get_metrics():
+    return {
+        "event_loop": event_loop_monitor.stats(),
+        "db_workers": db_worker_pool.stats(),
+        "websockets": manager.stats(),
+        "turn_scheduler": turn_scheduler.stats(),
+        "match_actors": match_actors.stats(),
+        "game_states": game_states.stats(),
+    }
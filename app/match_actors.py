@@ -0,0 +1,153 @@
+"""
+Ejecucion en orden de las acciones de juego de cada partida.
+
+Un endpoint async puede ceder el event loop en cada `await` (una consulta en
+el pool de workers, un `sleep`, un envio por websocket) y mientras tanto otra
+accion de la misma partida puede leer o modificar el mismo turno o los mismos
+movimientos parciales. Cada partida activa tiene un actor: una tarea que
+ejecuta de a una las acciones que recibe en su buzon. Los endpoints y los
+vencimientos de turno solo encolan la accion y esperan su resultado; las
+acciones de partidas distintas siguen corriendo en paralelo.
+
+La tarea del actor termina cuando el buzon queda vacio y se vuelve a crear con
+la siguiente accion, por lo que una partida sin actividad no ocupa nada.
+Una accion que encola otra accion de su misma partida la ejecuta directamente,
+ya que esperarla en el buzon la bloquearia para siempre.
+"""
+
+import asyncio
+import contextvars
+import functools
+import inspect
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.logger import logging
+
+logger = logging.getLogger(__name__)
+
+Command = Callable[[], Awaitable[Any]]
+
+# Partida cuyo actor esta ejecutando la accion actual
+_current_match: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "current_match", default=None
+)
+
+
+class MatchActor:
+    """Buzon y tarea de una partida.
+
+    Attributes:
+        match_id: id de la partida.
+        loop: event loop en el que corre la tarea.
+    """
+
+    def __init__(self, match_id: int, loop: asyncio.AbstractEventLoop, on_idle: Callable[["MatchActor"], None]):
+        self.match_id = match_id
+        self.loop = loop
+        self.processed = 0
+        self._mailbox: Deque[Tuple[Command, asyncio.Future]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._on_idle = on_idle
+
+    @property
+    def pending(self) -> int:
+        """Acciones en el buzon, sin contar la que se esta ejecutando."""
+        return len(self._mailbox)
+
+    def submit(self, command: Command) -> asyncio.Future:
+        """Encola una accion y devuelve el future con su resultado."""
+        future = self.loop.create_future()
+        self._mailbox.append((command, future))
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+        return future
+
+    async def _run(self):
+        _current_match.set(self.match_id)
+        try:
+            while self._mailbox:
+                command, future = self._mailbox.popleft()
+                if future.cancelled():
+                    # Quien la encolo ya no espera el resultado y no empezo
+                    continue
+                try:
+                    result = await command()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+                self.processed += 1
+        finally:
+            self._task = None
+            self._on_idle(self)
+
+
+class MatchActors:
+    """Actores de las partidas activas del proceso."""
+
+    def __init__(self) -> None:
+        self._actors: Dict[int, MatchActor] = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self._stats = {"submitted": 0, "inline": 0, "max_pending": 0}
+
+    def stats(self) -> Dict[str, int]:
+        stats = dict(self._stats)
+        stats["active"] = len(self._actors)
+        stats["pending"] = sum(actor.pending for actor in list(self._actors.values()))
+        return stats
+
+    async def submit(self, match_id: int, function: Callable[..., Awaitable[Any]], /, *args, **kwargs) -> Any:
+        """Ejecuta function(*args, **kwargs) en el actor de la partida.
+
+        Espera a que terminen las acciones encoladas antes en la misma
+        partida, y devuelve el resultado o lanza la excepcion de la accion.
+        """
+        if _current_match.get() == match_id:
+            self._stats["inline"] += 1
+            return await function(*args, **kwargs)
+
+        actor = self._actor(match_id)
+        future = actor.submit(functools.partial(function, *args, **kwargs))
+        self._stats["submitted"] += 1
+        self._stats["max_pending"] = max(self._stats["max_pending"], actor.pending)
+        return await future
+
+    def _actor(self, match_id: int) -> MatchActor:
+        loop = asyncio.get_running_loop()
+        actor = self._actors.get(match_id)
+        if actor is None or actor.loop is not loop:
+            # En los tests cada request corre en su propio event loop
+            actor = MatchActor(match_id, loop, self._discard)
+            self._actors[match_id] = actor
+        return actor
+
+    def _discard(self, actor: MatchActor):
+        if self._actors.get(actor.match_id) is actor and not actor.pending:
+            del self._actors[actor.match_id]
+
+    def clear(self):
+        self._actors.clear()
+
+
+match_actors = MatchActors()
+
+
+def serialized_by_match(function: Callable[..., Awaitable[Any]]):
+    """Hace que una accion async corra en el actor de su partida.
+
+    La partida se toma del argumento match_id. La funcion decorada conserva su
+    firma, por lo que se puede usar como endpoint de FastAPI.
+    """
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        match_id = signature.bind(*args, **kwargs).arguments["match_id"]
+        return await match_actors.submit(match_id, function, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,123 @@
+"""
+Migraciones de la base de datos.
+
+`create_all` solo crea las tablas que no existen, por lo que las columnas y los
+indices agregados a los modelos no aparecen en una base de datos ya creada.
+Este modulo agrega esas columnas e indices y convierte los tableros al modo
+empaquetado.
+
+Uso:
+    python -m app.migrations            agrega las columnas e indices faltantes
+    python -m app.migrations --pack     ademas empaqueta los tableros existentes
+"""
+
+import logging
+import sys
+from typing import List
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.orm import Session
+
+from app.models.models import Base, Boards
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine: Engine) -> List[str]:
+    """Agrega a las tablas existentes las columnas de los modelos que les faltan.
+
+    Args:
+        engine: engine de la base de datos.
+
+    Returns:
+        List[str]: columnas agregadas, como "tabla.columna".
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    added = []
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(
+                    text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}')
+                )
+                added.append(f"{table.name}.{column.name}")
+
+    for column in added:
+        logger.info("Column %s added", column)
+    return added
+
+
+def create_missing_indexes(engine: Engine) -> List[str]:
+    """Crea en las tablas existentes los indices de los modelos que les faltan.
+
+    Args:
+        engine: engine de la base de datos.
+
+    Returns:
+        List[str]: nombres de los indices creados.
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    created = []
+
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                index.create(connection)
+                created.append(index.name)
+
+    for index in created:
+        logger.info("Index %s created", index)
+    return created
+
+
+def pack_boards(db: Session) -> int:
+    """Convierte los tableros guardados como filas de Tiles al modo empaquetado.
+
+    Args:
+        db: sesion de la base de datos.
+
+    Returns:
+        int: cantidad de tableros convertidos.
+    """
+    # Import local para evitar el import circular con los cruds
+    from app.cruds.board import BoardService
+
+    board_service = BoardService(db)
+    board_ids = db.query(Boards.id).filter(Boards.packed_tiles.is_(None)).all()
+
+    packed = 0
+    for (board_id,) in board_ids:
+        if board_service.pack_board(board_id):
+            packed += 1
+
+    logger.info("%s boards packed", packed)
+    return packed
+
+
+if __name__ == "__main__":
+    from app.database import Init_Session, engine
+
+    add_missing_columns(engine)
+    create_missing_indexes(engine)
+    if "--pack" in sys.argv:
+        with Init_Session() as db:
+            pack_boards(db)
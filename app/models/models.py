@@ -1,6 +1,6 @@
 from typing import List
 from sqlalchemy.orm import Mapped, mapped_column, relationship, validates, DeclarativeBase
-from sqlalchemy import DateTime, String, Integer, Boolean, ForeignKey
+from sqlalchemy import DateTime, String, Integer, Boolean, ForeignKey, Index
 
 from typing import Dict, List
 
@@ -39,6 +39,7 @@ class Matches(Base):
     max_players: Mapped[int] = mapped_column(Integer)
     current_player_turn: Mapped[int] = mapped_column(Integer, default=0)
     started_turn_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    turn_deadline: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
 
     # --------------------------------- RELATIONSHIPS -----------------------#
     players: Mapped[List["Players"]] = relationship(
@@ -101,7 +102,10 @@ class Players(Base):
     """
 
     __tablename__ = "players"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_players_match_turn", "match_id", "turn_order"),
+        {"extend_existing": True},
+    )
     # --------------------------------- ATTRIBUTES -------------------------#
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     player_name: Mapped[str] = mapped_column(String(50))
@@ -151,21 +155,13 @@ class Players(Base):
 # ================================================ BOARDS MODELS =================================#
 
 
-class TileMovement:
-    def __init__(
-        self, tile1: "Tiles", tile2: "Tiles", id_mov: int, create_figure=False
-    ):
-        self.id_mov = id_mov
-        self.tile1 = tile1
-        self.tile2 = tile2
-        self.create_figure = create_figure
-
-
 class Boards(Base):
     """Model of the Boards table in the database.
     Attributes:
         id: int, primary key.
         ban_color: str, color banned in the match.
+        packed_tiles: str, colors of the board packed one character per tile,
+            only used when the boards are stored in packed mode.
         match_id: int, foreign key to the match.
         current_player_turn: int, foreign key to the current player's turn.
         next_player_turn: int, foreign key to the next player's turn.
@@ -173,6 +169,8 @@ class Boards(Base):
     Relationships:
         match: Matches, relationship to the match the board is in.
         tiles: List[Tiles], relationship to the tiles in the board.
+
+    The partial movements of the board are kept in app.movement_journal.
     """
 
     __tablename__ = "boards"
@@ -180,6 +178,7 @@ class Boards(Base):
     # --------------------------------- ATTRIBUTES -------------------------#
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     ban_color: Mapped[str] = mapped_column(String(50), nullable=True)
+    packed_tiles: Mapped[str] = mapped_column(String(36), nullable=True)
     match_id: Mapped[int] = mapped_column(
         Integer, ForeignKey("matches.id", ondelete="CASCADE")
     )
@@ -192,47 +191,6 @@ class Boards(Base):
         "Tiles", back_populates="board", post_update=True, passive_deletes=True
     )
 
-    # --------------------------------- TEMPORARY MOVEMENTS -----------------#
-    temporary_movements: Mapped[Dict[int, "TileMovement"]] = {}
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # self.temporary_movements = {}
-
-    def add_temporary_movement(
-        self, tile1: "Tiles", tile2: "Tiles", id_mov: int, create_figure: bool
-    ):
-        movement = TileMovement(tile1, tile2, id_mov, create_figure)
-
-        if self.id not in self.temporary_movements:
-            self.temporary_movements[self.id] = []
-
-        self.temporary_movements[self.id].append(movement)
-
-    def get_last_movement(self):
-        if (
-            self.id in self.temporary_movements
-            and len(self.temporary_movements[self.id]) > 0
-        ):
-            last_movement = self.temporary_movements[self.id].pop()
-            return last_movement
-
-    def get_movs(self):
-        """
-        Devuelve la lista de movs sin borrarlas
-        """
-        return self.temporary_movements.get(self.id, [])
-
-    def print_temporary_movements(self):
-        if self.id not in self.temporary_movements:
-            print("no movements")
-            return
-
-        for movement in self.temporary_movements[self.id]:
-            print(
-                f"Movement: {movement.tile1} -> {movement.tile2}, id_mov: {movement.id_mov}, create: {movement.create_figure}"
-            )
-
 
 # ================================================ TILES MODELS ===================================#
 
@@ -251,7 +209,10 @@ class Tiles(Base):
     """
 
     __tablename__ = "tiles"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_tiles_board_position", "board_id", "position_x", "position_y"),
+        {"extend_existing": True},
+    )
     # --------------------------------- ATTRIBUTES -------------------------#
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     color: Mapped[Colors] = mapped_column(String)
@@ -298,13 +259,19 @@ class ShapeCards(Base):
         is_visible: bool, if the card is visible.
         is_blocked: bool, if the card is blocked.
         player_owner: int, foreign key to the player that owns the card.
+        deck_position: int, position of the card in the shuffled deck of its
+            owner. Hidden cards are turned over in this order.
 
     Relationships:
         owner: Players, relationship to the player that owns the card.
     """
 
     __tablename__ = "shapeCards"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_shapeCards_owner_visible", "player_owner", "is_visible", "deck_position"),
+        Index("ix_shapeCards_owner_blocked", "player_owner", "is_blocked"),
+        {"extend_existing": True},
+    )
     # --------------------------------- ATTRIBUTES -------------------------#
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     shape_type: Mapped[int]  # mapeamos int para identificar las cartas
@@ -314,6 +281,7 @@ class ShapeCards(Base):
     player_owner: Mapped[int] = mapped_column(
         Integer, ForeignKey("players.id", ondelete="CASCADE"), nullable=True
     )
+    deck_position: Mapped[int] = mapped_column(Integer, nullable=True)
 
     # --------------------------------- RELATIONSHIPS -----------------------#
     owner: Mapped["Players"] = relationship(
@@ -341,7 +309,11 @@ class ShapeCards(Base):
 
 class MovementCards(Base):
     __tablename__ = "movementCards"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_movementCards_match_owner", "match_id", "player_owner", "deck_position"),
+        Index("ix_movementCards_owner", "player_owner"),
+        {"extend_existing": True},
+    )
     # --------------------------------- ATTRIBUTES -------------------------#
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     mov_type: Mapped[str]
@@ -351,6 +323,9 @@ class MovementCards(Base):
     player_owner: Mapped[int] = mapped_column(
         Integer, ForeignKey("players.id", ondelete="CASCADE"), nullable=True
     )
+    # Posicion en el mazo mezclado: se roban primero las cartas sin dueño de
+    # menor posicion
+    deck_position: Mapped[int] = mapped_column(Integer, nullable=True)
 
     # --------------------------------- RELATIONSHIPS -----------------------#
     owner: Mapped["Players"] = relationship(
@@ -0,0 +1,200 @@
+"""
+Historial de los movimientos parciales de cada tablero.
+
+Un movimiento parcial se puede deshacer hasta que termina el turno, por lo que
+cada tablero tiene una pila de movimientos. Cada entrada guarda solo las
+coordenadas de las dos fichas, despues del intercambio, y el id de la carta
+usada.
+
+Hay dos implementaciones, elegidas con config.MOVEMENT_JOURNAL:
+    - 'memory': en la memoria del proceso. Solo sirve con un unico worker.
+    - 'sqlite': en una base de datos SQLite aparte, compartida por todos los
+      workers del servidor.
+"""
+
+import sqlite3
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from app import config
+from app.utils.board_shapes_algorithm import Coordinate
+
+MEMORY_JOURNAL = "memory"
+SQLITE_JOURNAL = "sqlite"
+
+
+class JournalEntry(NamedTuple):
+    """Movimiento parcial de un tablero.
+
+    Attributes:
+        tile1: posicion de la primera ficha despues del intercambio.
+        tile2: posicion de la segunda ficha despues del intercambio.
+        id_mov: id de la carta de movimiento usada.
+        create_figure: si el movimiento formo una figura.
+    """
+
+    tile1: Coordinate
+    tile2: Coordinate
+    id_mov: int
+    create_figure: bool = False
+
+
+class MovementJournal:
+    """Pilas de movimientos parciales, una por tablero."""
+
+    def append(self, board_id: int, entry: JournalEntry) -> None:
+        """Agrega un movimiento al final de la pila del tablero."""
+        raise NotImplementedError
+
+    def pop(self, board_id: int) -> Optional[JournalEntry]:
+        """Saca el ultimo movimiento del tablero, None si no hay movimientos."""
+        raise NotImplementedError
+
+    def entries(self, board_id: int) -> List[JournalEntry]:
+        """Devuelve los movimientos del tablero, del primero al ultimo, sin sacarlos."""
+        raise NotImplementedError
+
+    def drop(self, board_id: int) -> None:
+        """Descarta todos los movimientos del tablero."""
+        raise NotImplementedError
+
+    def replace(self, board_id: int, entries: List[JournalEntry]) -> None:
+        """Reemplaza los movimientos del tablero por entries."""
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        """Descarta los movimientos de todos los tableros."""
+        raise NotImplementedError
+
+
+class InMemoryMovementJournal(MovementJournal):
+    def __init__(self) -> None:
+        self._entries: Dict[int, List[JournalEntry]] = {}
+        self._lock = threading.Lock()
+
+    def append(self, board_id: int, entry: JournalEntry) -> None:
+        with self._lock:
+            self._entries.setdefault(board_id, []).append(entry)
+
+    def pop(self, board_id: int) -> Optional[JournalEntry]:
+        with self._lock:
+            entries = self._entries.get(board_id)
+            if not entries:
+                return None
+            entry = entries.pop()
+            if not entries:
+                del self._entries[board_id]
+            return entry
+
+    def entries(self, board_id: int) -> List[JournalEntry]:
+        with self._lock:
+            return list(self._entries.get(board_id, []))
+
+    def drop(self, board_id: int) -> None:
+        with self._lock:
+            self._entries.pop(board_id, None)
+
+    def replace(self, board_id: int, entries: List[JournalEntry]) -> None:
+        with self._lock:
+            if entries:
+                self._entries[board_id] = list(entries)
+            else:
+                self._entries.pop(board_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteMovementJournal(MovementJournal):
+    """Historial guardado en un archivo SQLite.
+
+    Cada thread usa su propia conexion. Sacar un movimiento es un unico DELETE
+    ... RETURNING, por lo que dos workers no pueden sacar el mismo movimiento.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS movement_journal ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, board_id INTEGER NOT NULL, "
+                "x1 INTEGER NOT NULL, y1 INTEGER NOT NULL, x2 INTEGER NOT NULL, "
+                "y2 INTEGER NOT NULL, id_mov INTEGER NOT NULL, create_figure INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_movement_journal_board "
+                "ON movement_journal (board_id, id)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _entry(row) -> JournalEntry:
+        x1, y1, x2, y2, id_mov, create_figure = row
+        return JournalEntry(Coordinate(x1, y1), Coordinate(x2, y2), id_mov, bool(create_figure))
+
+    def append(self, board_id: int, entry: JournalEntry) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO movement_journal "
+                "(board_id, x1, y1, x2, y2, id_mov, create_figure) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (board_id, entry.tile1.x, entry.tile1.y, entry.tile2.x, entry.tile2.y,
+                 entry.id_mov, int(entry.create_figure)),
+            )
+
+    def pop(self, board_id: int) -> Optional[JournalEntry]:
+        with self._connection() as connection:
+            row = connection.execute(
+                "DELETE FROM movement_journal WHERE id = "
+                "(SELECT max(id) FROM movement_journal WHERE board_id = ?) "
+                "RETURNING x1, y1, x2, y2, id_mov, create_figure",
+                (board_id,),
+            ).fetchone()
+        return None if row is None else self._entry(row)
+
+    def entries(self, board_id: int) -> List[JournalEntry]:
+        rows = self._connection().execute(
+            "SELECT x1, y1, x2, y2, id_mov, create_figure FROM movement_journal "
+            "WHERE board_id = ? ORDER BY id",
+            (board_id,),
+        ).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def drop(self, board_id: int) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM movement_journal WHERE board_id = ?", (board_id,))
+
+    def replace(self, board_id: int, entries: List[JournalEntry]) -> None:
+        # Una sola transaccion: los demas workers ven el historial viejo o el nuevo
+        with self._connection() as connection:
+            connection.execute("DELETE FROM movement_journal WHERE board_id = ?", (board_id,))
+            connection.executemany(
+                "INSERT INTO movement_journal "
+                "(board_id, x1, y1, x2, y2, id_mov, create_figure) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(board_id, entry.tile1.x, entry.tile1.y, entry.tile2.x, entry.tile2.y,
+                  entry.id_mov, int(entry.create_figure)) for entry in entries],
+            )
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM movement_journal")
+
+
+def create_movement_journal(kind: str = config.MOVEMENT_JOURNAL) -> MovementJournal:
+    """Crea el historial configurado en config.MOVEMENT_JOURNAL."""
+    if kind == SQLITE_JOURNAL:
+        return SQLiteMovementJournal(config.MOVEMENT_JOURNAL_PATH)
+    if kind != MEMORY_JOURNAL:
+        raise ValueError(f"Unknown movement journal {kind!r}")
+    return InMemoryMovementJournal()
+
+
+movement_journal = create_movement_journal()
@@ -1,7 +1,7 @@
-from datetime import datetime
-from fastapi import (APIRouter, BackgroundTasks, WebSocket, WebSocketDisconnect, Depends, HTTPException)
+from datetime import datetime, timedelta
+from fastapi import (APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException)
 from fastapi.responses import JSONResponse
-from random import randint, shuffle
+from random import shuffle
 from typing import Annotated, Optional, Tuple
 from uuid import uuid4
 
@@ -20,31 +20,37 @@ from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm import Session
 from random import shuffle
 
-from app.routers.players import (give_movement_card_to_player,
+from app.routers.players import (allowed_figures_event,
+                                 filter_allowed_figures,
+                                 give_movement_card_to_player,
                                  give_shape_card_to_player,
+                                 lobby_snapshot,
                                  notify_movement_card_to_player, 
                                  on_filter_matches,
-                                 turn_timeout,
+                                 schedule_turn_timeout,
                                  notify_matches_list)
 from app.cruds.board import BoardService
 from app.connection_manager import manager
 from app.cruds.board import BoardService
-from app.cruds.match import MatchService
+from app.cruds.match import MatchService, turn_duration
+from app.cruds.match_provisioning import MatchProvisioningService
 from app.cruds.movement_card import MovementCardService
 from app.cruds.player import PlayerService
 from app.cruds.shape_card import ShapeCardService
-from app.cruds.tile import TileService
-from app.database import get_db
+from app.database import get_db, unit_of_work
 from app.exceptions import (
     GameConnectionDoesNotExist,
     PlayerAlreadyConnected,
     PlayerNotConnected,
 )
+from app.game_state import game_states
 from app.logger import logging
+from app.match_actors import serialized_by_match
 from app.models.enums import *
-from app.models.models import Matches, Players, TileMovement
+from app.models.models import Matches, Players
 from app.schemas import *
-from app.utils.utils import MAX_SHAPE_CARDS
+from app.utils.lobby_index import lobby_index
+from app.workers import run_in_db_worker
 
 logger = logging.getLogger(__name__)
 
@@ -53,23 +59,28 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
 @router.websocket("/ws")
-async def create_websocket(websocket: WebSocket, db: Session = Depends(get_db)):
-    match_service = MatchService(db)
+async def create_websocket(websocket: WebSocket, mode: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Conexion del lobby. Con mode=delta el cliente recibe un MATCHES_SNAPSHOT
+    con la version del lobby y despues solo los cambios que coinciden con su
+    filtro; puede pedir un snapshot nuevo enviando RESYNC.
+    """
     await websocket.accept()
     try:
-        index = manager.add_anonymous_connection(websocket)  ##
-        matches = match_service.get_all_matches(True)
-        matches = [MatchOut.model_validate(match).model_dump() for match in matches]
-        msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
-        await websocket.send_json(msg)
-        await manager.keep_alive_matches(
-            index, lambda x, y: on_filter_matches(x, y, db)
+        connection_id = manager.add_anonymous_connection(websocket, mode == "delta")
+        await run_in_db_worker(lobby_index.ensure_loaded, db)
+        filter_matches = lambda x, y: on_filter_matches(x, y, db)
+        snapshot = lambda x, y: lobby_snapshot(x, y, db)
+        await manager.send_lobby_snapshot(
+            manager._connections[connection_id], filter_matches, snapshot
         )
+        await manager.keep_alive_matches(connection_id, filter_matches, snapshot)
     except WebSocketDisconnect:
-        manager.remove_anonymous_connection(websocket)
+        pass
     except Exception as e:
         logger.error("Error al enviar mensaje: %s", e)
-
+    finally:
+        manager.remove_anonymous_connection(websocket)
 
 
 @router.websocket("/{game_id}/ws/{player_id}")
@@ -110,56 +121,6 @@ async def create_websocket_connection(
             pass
 
 
-async def notify_matches_list(db):
-    try:
-        for conn in manager._connections:
-            filtered_matches = on_filter_matches(
-                conn["match_name"], conn["max_players"], db
-            )
-            matches = [
-                MatchOut.model_validate(match).model_dump()
-                for match in filtered_matches
-            ]
-            msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
-            await conn["websocket"].send_json(msg)
-
-    except Exception as e:
-        logger.error("Error al enviar mensaje: %s", e)
-
-
-def on_filter_matches(
-    match_name: Optional[str], max_players: Optional[int], db: Session
-):
-    """
-    Obtiene todas las partidas que coincidan con los filtros, si no tiene
-    filtros devuelve todas las partidas disponibles.
-    Args:
-        - s : string a buscar en el nombre de la partida.
-        - max_players : cantidad máxima de jugadores en la partida.
-        - db : Session de la base de datos.
-    Returns:
-        - Lista de partidas en esquema MatchOut.
-    """
-    matches = MatchService(db).get_all_matches(True)
-
-    if not match_name and not max_players:
-        return matches
-
-    filtered_matches = matches
-    if match_name:
-        filtered_matches = [
-            match
-            for match in filtered_matches
-            if match_name.lower() in match.match_name.lower()
-        ]
-    if max_players:
-        filtered_matches = [
-            match for match in filtered_matches if match.max_players == max_players
-        ]
-
-    return filtered_matches
-
-
 @router.get("/{match_id}", response_model=MatchOut)
 def get_match_by_id(match_id: int, db: Session = Depends(get_db)):
     try:
@@ -170,56 +131,6 @@ def get_match_by_id(match_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Match not found")
 
 
-async def notify_matches_list(db):
-    try:
-        for conn in manager._connections:
-            filtered_matches = on_filter_matches(
-                conn["match_name"], conn["max_players"], db
-            )
-            matches = [
-                MatchOut.model_validate(match).model_dump()
-                for match in filtered_matches
-            ]
-            msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
-            await conn["websocket"].send_json(msg)
-
-    except Exception as e:
-        logger.error("Error al enviar mensaje: %s", e)
-
-
-def on_filter_matches(
-    match_name: Optional[str], max_players: Optional[int], db: Session
-):
-    """
-    Obtiene todas las partidas que coincidan con los filtros, si no tiene
-    filtros devuelve todas las partidas disponibles.
-    Args:
-        - s : string a buscar en el nombre de la partida.
-        - max_players : cantidad máxima de jugadores en la partida.
-        - db : Session de la base de datos.
-    Returns:
-        - Lista de partidas en esquema MatchOut.
-    """
-    matches = MatchService(db).get_all_matches(True)
-
-    if not match_name and not max_players:
-        return matches
-
-    filtered_matches = matches
-    if match_name:
-        filtered_matches = [
-            match
-            for match in filtered_matches
-            if match_name.lower() in match.match_name.lower()
-        ]
-    if max_players:
-        filtered_matches = [
-            match for match in filtered_matches if match.max_players == max_players
-        ]
-
-    return filtered_matches
-
-
 @router.get("/{match_id}", response_model=MatchOut)
 def get_match_by_id(match_id: int, db: Session = Depends(get_db)):
     try:
@@ -235,14 +146,16 @@ async def create_match(match: MatchCreateIn, db: Session = Depends(get_db)):
     match_service = MatchService(db)
     player_service = PlayerService(db)
     logger.info(match)
-    match1 = match_service.create_match(
-        match.lobby_name, match.max_players, match.is_public, match.password
-    )
     token = str(uuid4())
-    new_player = player_service.create_player(match.player_name, match1.id, True, token)
+    with unit_of_work(db):
+        match1 = match_service.create_match(
+            match.lobby_name, match.max_players, match.is_public, match.password
+        )
+        new_player = player_service.create_player(match.player_name, match1.id, True, token)
+    await run_in_db_worker(lobby_index.update_match, match1)
     manager.create_game_connection(match1.id)
 
-    await notify_matches_list(db)
+    await notify_matches_list(db, match1.id)
 
     return {"player_id": new_player.id, "match_id": match1.id, "token": token}
 
@@ -274,19 +187,20 @@ async def join_player_to_match(match_id: int, playerJoinIn: PlayerJoinIn, db: Se
         raise HTTPException(status_code=401, detail="password is incorrect")
 
     player_token = str(uuid4())
-    player = player_service.create_player(
-        playerJoinIn.player_name, match_id, False, player_token
-    )
-    match.current_players = match.current_players + 1
+    with unit_of_work(db):
+        player = player_service.create_player(
+            playerJoinIn.player_name, match_id, False, player_token
+        )
+        match.current_players = match.current_players + 1
+    await run_in_db_worker(lobby_index.update_match, match)
     players = [player.player_name for player in match.players]
-    db.commit()
     msg = {"key": "PLAYER_JOIN", "payload": {"name": player.player_name}}
     try:
         await manager.broadcast_to_game(match_id, msg)
     except Exception as e:
         logger.error("Error al enviar mensaje: %s", e)
 
-    await notify_matches_list(db)
+    await notify_matches_list(db, match_id)
 
     return {"player_id": player.id, "players": players, "token": player_token}
 
@@ -295,41 +209,7 @@ async def join_player_to_match(match_id: int, playerJoinIn: PlayerJoinIn, db: Se
 
 
 def create_movement_deck(db: Session, match_id: int):
-    movement_service = MovementCardService(db)
-
-    for mov in Movements:  # Por cada tipo de enum
-        for _ in range(7):
-            movement_service.create_movement_card(mov.value, match_id)
-
-
-def give_movement_card_to_player(player_id: int, db: Session) -> list[tuple[int, str]]:
-    """
-    Da hasta 3 cartas de movimiento al jugador.
-    Args:
-        - player_id : id del jugador.
-        - db : Session de la base de datos.
-    Returns:
-        Lista de cartas dadas al jugador.
-    """
-    player_service = PlayerService(db)
-    movement_service = MovementCardService(db)
-
-    player = player_service.get_player_by_id(player_id)
-    match_id = player.match_id
-    list_movs = player.movement_cards
-    movs_to_give = 3 - len(list_movs)
-    movements_given = []
-
-    while movs_to_give > 0:
-        movements = movement_service.get_movement_cards_without_owner(match_id)
-        if not movements:
-            break  # No hay más cartas en el mazo
-        movement = movements[randint(0, len(movements) - 1)]
-        movement_service.add_movement_card_to_player(player_id, movement.id)
-        movements_given.append((movement.id, movement.mov_type))
-        movs_to_give -= 1
-
-    return movements_given
+    MovementCardService(db).create_movement_deck(match_id)
 
 
 async def notify_movement_card_to_player(
@@ -366,52 +246,15 @@ async def notify_all_players_movements_received(player: Players, match: Matches)
             await manager.send_to_player(match.id, player_i.id, msg_all)
 
 
-async def give_shape_card_to_player(player_id: int, db: Session, is_init: bool):
-    """
-    Da hasta 3 cartas de figuras al jugador.
-
-    Args:
-        - player_id : id del jugador.
-        - db : Session de la base de datos.
-        - is_init : booleano que indica si es el inicio de la partida.
-    """
-    player = PlayerService(db).get_player_by_id(player_id)
-    visible_cards = ShapeCardService(db).get_visible_cards(player_id, True)
-    ShapeDeck = ShapeCardService(db).get_visible_cards(player_id, False)
-    CardsToGive = 3 - len(visible_cards)
-    ShapesGiven = []
-
-    for i in range(CardsToGive):
-        if not ShapeDeck:
-            break  # No hay más cartas en el mazo
-        shape = ShapeDeck.pop(randint(0, len(ShapeDeck) - 1))
-        ShapeCardService(db).update_shape_card(shape.id, True, "NOT_BLOCKED")
-        ShapesGiven.append((shape.id, shape.shape_type))
-
-    if not is_init:
-        msg_all = {
-            "key": "PLAYER_RECEIVE_SHAPE_CARD",
-            "payload": [
-                {
-                    "player": player.player_name,
-                    "turn_order": player.turn_order,
-                    "shape_cards": ShapesGiven,
-                }
-            ],
-        }
-        await manager.broadcast_to_game(player.match_id, msg_all)
-
-
 # =============================================================================================================
 
 
 @router.patch("/{match_id}/start/{player_id}", status_code=200)
-async def start_match(match_id: int, player_id: int, db: Session = Depends(get_db), background_tasks = BackgroundTasks()):
+@serialized_by_match
+async def start_match(match_id: int, player_id: int, db: Session = Depends(get_db)):
     try:
         match_service = MatchService(db)
-        match = match_service.get_match_by_id(match_id)
-        movement_service = MovementCardService(db)
-        shape_service = ShapeCardService(db)
+        match = await run_in_db_worker(match_service.get_match_by_id, match_id)
 
         if (
             match.current_players < match.max_players
@@ -420,44 +263,30 @@ async def start_match(match_id: int, player_id: int, db: Session = Depends(get_d
             raise HTTPException(status_code=404, detail="Not enough players")
 
         player_service = PlayerService(db)
-        player = player_service.get_player_by_id(player_id)
+        player = await run_in_db_worker(player_service.get_player_by_id, player_id)
 
         if player.is_owner and player.match_id == match_id:
             match.state = MatchState.STARTED.value
             match.started_turn_time = datetime.now()
-            movement_service.create_movement_deck(match_id)
-
-            # ===================== Configuro los mazos ==================================
-            shapes = [(shape.value, True) for shape in HardShapes] * 2
-            shapes += [(shape.value, False) for shape in EasyShapes] * 2
-            shuffle(shapes)
-
-            players_in_match = player_service.get_players_by_match(match_id)
-            # Crea el mazo de figuras para cada jugador
-            for player in players_in_match:
-                print(player.id)
-                for _ in range(int(MAX_SHAPE_CARDS / match.max_players)):
-                    shape = shapes.pop()
-                    shape_service.create_shape_card(
-                        shape[0], shape[1], False, player.id
-                    )
-
-            # ============== Creo el tablero y lo configuro ================
-            board_service = BoardService(db)
-            board = board_service.create_board(match_id)
-            board_service.init_board(board.id)
-            _ = match_service.set_players_order(match)
+            match.turn_deadline = match.started_turn_time + timedelta(seconds=turn_duration())
+
+            # Tablero, mazos y manos iniciales se crean en una sola transaccion
+            players_in_match = await run_in_db_worker(
+                player_service.get_players_by_match, match_id
+            )
+            await run_in_db_worker(
+                MatchProvisioningService(db).provision_match, match, players_in_match
+            )
+            lobby_index.remove_match(match_id)
+            await notify_matches_list(db, match_id)
 
             for player_i in players_in_match:
                 msg = {"key": "START_MATCH",
                        "payload": {}}
                 await manager.send_to_player(match_id, player_i.id, msg)
 
-                give_movement_card_to_player(player_i.id, db)
-                await give_shape_card_to_player(player_i.id, db, True)
-            
-            background_tasks.add_task(turn_timeout, match_id, db, match.current_player_turn, background_tasks)
-            return JSONResponse({"message": "Match started successfully"}, background=background_tasks)
+            schedule_turn_timeout(match_id, match.current_player_turn, match.turn_deadline)
+            return JSONResponse({"message": "Match started successfully"})
 
         raise HTTPException(status_code=404, detail="Match not found")
     except NoResultFound:
@@ -498,8 +327,7 @@ def get_last_movs_by_player(
     Returns:
         movements: Lista de ultimos movimientos.
     """
-    board = b_service.get_board_by_id(board_id)
-    movements = board.get_movs()
+    movements = b_service.get_temporary_movements(board_id)
     logger.info(f"Last movements: {movements}")
 
     if player_order == current_turn:
@@ -537,26 +365,11 @@ async def send_movement_cards_info(
 async def send_figures_info(match_id: int, player_id: int, db: Session):
     try:
         board_service = BoardService(db)
-        tile_service = TileService(db)
         match = MatchService(db).get_match_by_id(match_id)
-        board_figures = BoardService(db).get_formed_figures(match.board.id)
+        board_figures = board_service.get_formed_figures(match.board.id)
     except Exception:
         raise HTTPException(status_code=500, detail="Error with formed figures")
-    ban_color = board_service.get_ban_color(match_id)
-    filtered_figures = []
-    for figure in board_figures:
-        print(f"Figure coordinates: {figure}")
-        try:
-            tile = tile_service.get_tile_by_position(figure[0].x, figure[0].y, match_id)
-        except NoResultFound:
-            raise HTTPException(
-                status_code=404, detail="Tile with coordinates not found"
-            )
-        if tile.color != ban_color:
-            print(f"Tile color: {tile.color}")
-            filtered_figures.append(figure)
-
-    allow_figures_event = {"key": "ALLOW_FIGURES", "payload": filtered_figures}
+    allow_figures_event = filter_allowed_figures(match.board.id, board_service, board_figures)
 
     await manager.send_to_player(match_id, player_id, allow_figures_event)
 
@@ -581,6 +394,12 @@ async def send_waiting_match_info(match_id: int, player_id: int, db: Session):
 
 
 async def send_active_match_info(match_id: int, player_id: int, db: Session):
+    """
+    Envia al jugador el estado de una partida en curso. Si la partida tiene
+    un estado en memoria, el tablero, los movimientos parciales y las cartas
+    de movimiento salen de ahi, porque pueden no estar guardados todavia.
+    """
+    state = game_states.get(match_id)
     try:
         p_service = PlayerService(db)
         m_service = MatchService(db)
@@ -591,8 +410,11 @@ async def send_active_match_info(match_id: int, player_id: int, db: Session):
         match = m_service.get_match_by_id(match_id)
         player = p_service.get_player_by_id(player_id)
 
-        board_table = BoardService(db).get_board_table(match.board.id)
         board = board_service.get_board_by_id(match.board.id)
+        if state is None:
+            board_table = board_service.get_board_table(board.id)
+        else:
+            board_table = [list(row) for row in state.board]
 
         players_in_match = p_service.get_players_by_match(match_id)
         deck_size = ShapeCardService(db).get_deck_size(player_id)
@@ -608,11 +430,15 @@ async def send_active_match_info(match_id: int, player_id: int, db: Session):
         )
 
     movs = []
-    for last_movement in board.get_movs():
-        mov_type = movement_service.get_movement_card_by_id(
-            last_movement.id_mov
-        ).mov_type
-        movs.append([last_movement.id_mov, mov_type])
+    if state is None:
+        for last_movement in board_service.get_temporary_movements(board.id):
+            mov_type = movement_service.get_movement_card_by_id(
+                last_movement.id_mov
+            ).mov_type
+            movs.append([last_movement.id_mov, mov_type])
+    else:
+        movs = [[movement.id_mov, state.card_types[movement.id_mov]]
+                for movement in state.journal]
 
     msg_info = {
         "key": "GET_PLAYER_MATCH_INFO",
@@ -642,6 +468,16 @@ async def send_active_match_info(match_id: int, player_id: int, db: Session):
 
     await send_shape_cards_info(match_id, player_id, players_in_match, s_service)
 
+    if state is not None:
+        movements = state.hand(player_id)
+        if player.turn_order == current_player.turn_order:
+            movements += [tuple(mov) for mov in movs]
+        await notify_movement_card_to_player(player_id, match_id, movements)
+        allow_figures_event = allowed_figures_event(
+            state.figures_tracker.figures, state.ban_color)
+        await manager.send_to_player(match_id, player_id, allow_figures_event)
+        return
+
     await send_movement_cards_info(
         player_id,
         match_id,
@@ -655,6 +491,7 @@ async def send_active_match_info(match_id: int, player_id: int, db: Session):
 
 # =============================================================================
 @router.get("/{match_id}/player/{player_id}")
+@serialized_by_match
 async def get_match_info_to_player(
     match_id: int,
     player_id: int,
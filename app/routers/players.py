@@ -1,30 +1,34 @@
+import asyncio
 from asyncio import sleep
-from copy import copy
 from datetime import datetime, timedelta
-from random import randint
-from typing import Optional
-import os
+from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import Session
 
-from app.connection_manager import manager
+from app.backplane import REFRESH_LOBBY_EVENT
+from app.connection_manager import encode_message, manager
 from app.cruds.board import BoardService
-from app.cruds.match import MatchService
+from app.cruds.match import MatchService, turn_duration
 from app.cruds.movement_card import MovementCardService
 from app.cruds.player import PlayerService
 from app.cruds.shape_card import ShapeCardService
 from app.cruds.tile import TileService
-from app.database import get_db
+from app.database import Init_Session, get_db, unit_of_work
 from app.exceptions import *
+from app.game_state import GameState, game_states
 from app.logger import logging
+from app.match_actors import serialized_by_match
 from app.models import enums
 from app.models.enums import EasyShapes, HardShapes, ReasonWinning
 from app.models.models import Matches, Players, ShapeCards
 from app.schemas import MatchOut, PartialMove, UseFigure
+from app.sharding import shard_map
+from app.turn_scheduler import turn_scheduler
 from app.utils.board_shapes_algorithm import (
+    ColoredFigure,
     Coordinate,
     Figure,
     rotate_90_degrees,
@@ -32,6 +36,12 @@ from app.utils.board_shapes_algorithm import (
     rotate_270_degrees,
     translate_shape_to_bottom_left,
 )
+from app.utils.lobby_index import (
+    change_message,
+    lobby_index,
+    matches_filter,
+    snapshot_message,
+)
 from app.utils.utils import (
     FIGURE_COORDINATES,
     validate_diagonal,
@@ -42,26 +52,106 @@ from app.utils.utils import (
     validate_line_between,
     validate_line_border,
 )
+from app.workers import run_in_db_worker
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/matches")
 
 
-async def notify_matches_list(db):
+async def notify_matches_list(db, match_id: int):
+    """
+        Envia los cambios del lobby a sus conexiones. Con un backplane
+        compartido avisa tambien a los demas workers, que atienden sus propias
+        conexiones del lobby.
+        Args:
+            - db : Session de la base de datos.
+            - match_id : id de la partida que cambio.
+    """
+    manager.publish(REFRESH_LOBBY_EVENT, match_id=match_id)
+    await send_matches_list(db)
+
+
+def refresh_lobby(event: dict):
+    """
+        Recibe el aviso de un cambio del lobby hecho en otro worker. La
+        partida que cambio se vuelve a leer de la base de datos y el cambio se
+        envia a las conexiones de este worker, como uno propio.
+        Args:
+            - event : evento del backplane, con el id de la partida.
+    """
+    async def refresh():
+        with Init_Session() as db:
+            await run_in_db_worker(lobby_index.reload_match, event["match_id"], db)
+            await send_matches_list(db)
+
+    asyncio.get_running_loop().create_task(refresh())
+
+
+async def send_matches_list(db):
+    """
+        Envia los cambios del lobby a las conexiones de este worker.
+
+        Las conexiones en modo delta reciben solo los cambios que coinciden
+        con su filtro. El resto se agrupa por filtro y cada grupo recibe el
+        mismo frame con la lista completa. Las partidas salen del indice en
+        memoria del lobby.
+        Args:
+            - db : Session de la base de datos.
+    """
     try:
-        for conn in manager._connections:
-            filtered_matches = on_filter_matches(conn["match_name"], 
-                                                 conn["max_players"], db)
-            matches = [MatchOut.model_validate(match).model_dump() 
-                    for match in filtered_matches]
+        groups = {}
+        delta_connections = []
+        for conn in list(manager._connections.values()):
+            if conn.get("delta"):
+                delta_connections.append(conn)
+                continue
+            filters = (conn["match_name"], conn["max_players"])
+            groups.setdefault(filters, []).append(conn["websocket"])
+        if not groups and not delta_connections:
+            return
+
+        await run_in_db_worker(lobby_index.ensure_loaded, db)
+        for (match_name, max_players), websockets in groups.items():
+            matches = lobby_index.search(match_name, max_players)
             msg = {"key": "MATCHES_LIST", "payload": {"matches": matches}}
-            await conn["websocket"].send_json(msg)
+            frame = encode_message(msg)
+            for websocket in websockets:
+                await manager.send_to_connection(websocket, frame, "MATCHES_LIST")
+
+        await notify_matches_changes(delta_connections)
         
     except Exception as e:
         logger.error("Error al enviar mensaje: %s", e)
 
 
+async def notify_matches_changes(connections: list):
+    """
+        Envia a las conexiones en modo delta los cambios del lobby posteriores
+        a la ultima version que recibieron. Si esos cambios ya no estan en el
+        registro del indice, les envia un snapshot nuevo.
+        Args:
+            - connections : conexiones del lobby en modo delta.
+    """
+    frames = {}
+    for conn in connections:
+        changes = lobby_index.changes_since(conn["version"])
+        if changes is None:
+            version, matches = lobby_index.snapshot(conn["match_name"], conn["max_players"])
+            conn["version"] = version
+            await manager.send_to_connection(conn["websocket"], snapshot_message(version, matches))
+            continue
+
+        for change in changes:
+            if not matches_filter(change.match, conn["match_name"], conn["max_players"]):
+                continue
+            if change.version not in frames:
+                frames[change.version] = encode_message(change_message(change))
+            await manager.send_to_connection(conn["websocket"], frames[change.version])
+        if changes:
+            conn["version"] = changes[-1].version
+
+
 def on_filter_matches(
     match_name: Optional[str],
     max_players: Optional[int],
@@ -71,26 +161,33 @@ def on_filter_matches(
         Obtiene todas las partidas que coincidan con los filtros, si no tiene
         filtros devuelve todas las partidas disponibles.
         Args:
-            - s : string a buscar en el nombre de la partida.
+            - match_name : string a buscar en el nombre de la partida.
             - max_players : cantidad máxima de jugadores en la partida.
             - db : Session de la base de datos.
         Returns:
-            - Lista de partidas en esquema MatchOut.
+            - Lista de partidas serializadas con el esquema MatchOut.
     """
-    matches = MatchService(db).get_all_matches(True)
-
-    if not match_name and not max_players:
-        return matches
+    lobby_index.ensure_loaded(db)
+    return lobby_index.search(match_name, max_players)
 
-    filtered_matches = matches
-    if match_name:
-        filtered_matches = [
-            match for match in filtered_matches if match_name.lower() in match.match_name.lower()]
-    if max_players:
-        filtered_matches = [
-            match for match in filtered_matches if match.max_players == max_players]
 
-    return filtered_matches
+def lobby_snapshot(
+    match_name: Optional[str],
+    max_players: Optional[int],
+    db: Session
+):
+    """
+        Obtiene la version actual del lobby y las partidas que coinciden con
+        los filtros, para las conexiones en modo delta.
+        Args:
+            - match_name : string a buscar en el nombre de la partida.
+            - max_players : cantidad máxima de jugadores en la partida.
+            - db : Session de la base de datos.
+        Returns:
+            - Tupla (version, lista de partidas en esquema MatchOut).
+    """
+    lobby_index.ensure_loaded(db)
+    return lobby_index.snapshot(match_name, max_players)
 
 
 def give_movement_card_to_player(player_id: int, db: Session) -> list[tuple[int, str]]:
@@ -109,18 +206,11 @@ def give_movement_card_to_player(player_id: int, db: Session) -> list[tuple[int,
     match_id = player.match_id
     list_movs = player.movement_cards
     movs_to_give = 3 - len(list_movs)
-    movements_given = []
 
-    while movs_to_give > 0:
-        movements = movement_service.get_movement_cards_without_owner(match_id)
-        if not movements:
-            break  # No hay más cartas en el mazo
-        movement = movements[randint(0, len(movements) - 1)]
-        movement_service.add_movement_card_to_player(player_id, movement.id)
-        movements_given.append((movement.id, movement.mov_type))
-        movs_to_give -= 1
+    # Si no hay suficientes cartas en el mazo se dan las que quedan
+    movements = movement_service.draw_movement_cards(match_id, player_id, movs_to_give)
 
-    return movements_given
+    return [(movement.id, movement.mov_type) for movement in movements]
 
 
 async def notify_movement_card_to_player(player_id: int, match_id: int, buff_movement: list[tuple[int, str]]):
@@ -138,6 +228,20 @@ async def notify_movement_card_to_player(player_id: int, match_id: int, buff_mov
     await manager.send_to_player(match_id, player_id, msg_user)
 
 
+def draw_shape_cards(player_id: int, db: Session):
+    """
+        Da vuelta cartas del mazo de figuras del jugador hasta tener 3 visibles.
+        Es sincronica, se ejecuta en el pool de workers.
+        Returns:
+            - player : jugador.
+            - ShapesGiven : lista de tuplas con el id y tipo de las cartas dadas.
+    """
+    player = PlayerService(db).get_player_by_id(player_id)
+    shapes = ShapeCardService(db).draw_shape_cards(player_id)
+
+    return player, [(shape.id, shape.shape_type) for shape in shapes]
+
+
 async def give_shape_card_to_player(player_id: int, db: Session, is_init: bool):
     """
         Da hasta 3 cartas de figuras al jugador.
@@ -146,18 +250,7 @@ async def give_shape_card_to_player(player_id: int, db: Session, is_init: bool):
             - db : Session de la base de datos.
             - is_init : booleano que indica si es el inicio de la partida.
     """
-    player = PlayerService(db).get_player_by_id(player_id)
-    visible_cards = ShapeCardService(db).get_visible_cards(player_id, True)
-    ShapeDeck = ShapeCardService(db).get_visible_cards(player_id, False)
-    CardsToGive = 3 - len(visible_cards)
-    ShapesGiven = []
-
-    for i in range(CardsToGive):
-        if not ShapeDeck:
-            break  # No hay más cartas en el mazo
-        shape = ShapeDeck.pop(randint(0, len(ShapeDeck) - 1))
-        ShapeCardService(db).update_shape_card(shape.id, True, "NOT_BLOCKED")
-        ShapesGiven.append((shape.id, shape.shape_type))
+    player, ShapesGiven = await run_in_db_worker(draw_shape_cards, player_id, db)
 
     if not is_init:
         msg_all = {"key": "PLAYER_RECEIVE_SHAPE_CARD",
@@ -165,14 +258,49 @@ async def give_shape_card_to_player(player_id: int, db: Session, is_init: bool):
         await manager.broadcast_to_game(player.match_id, msg_all)
 
 
+async def discard_partial_movements(match_id: int, db: Session):
+    """
+    Descarta los movimientos parciales que queden en el tablero de una
+    partida terminada.
+    Args:
+        - match_id: ID de la partida
+        - db: Session de la base de datos
+    """
+    game_states.discard(match_id)
+    await run_in_db_worker(clear_partial_movements, match_id, db)
+
+
+def clear_partial_movements(match_id: int, db: Session):
+    """
+    Borra el historial de movimientos parciales del tablero de una partida.
+    Es sincronica, se ejecuta en el pool de workers.
+    """
+    board_service = BoardService(db)
+    try:
+        board = board_service.get_board_by_match_id(match_id)
+    except NoResultFound:
+        return
+    board_service.clear_temporary_movements(board.id)
+
+
+def finish_match(match_id: int, winner_id: int, db: Session):
+    """
+    Saca al ganador de la partida y la marca como terminada, en una sola
+    transaccion. Es sincronica, se ejecuta en el pool de workers.
+    """
+    with unit_of_work(db):
+        PlayerService(db).delete_player(winner_id)
+        MatchService(db).update_match(match_id, "FINISHED", 0)
+
+
 async def playerWinner(match_id: int, reason: ReasonWinning, db: Session):
-    match_service = MatchService(db)
     player_service = PlayerService(db)
 
-    players = player_service.get_players_by_match(match_id)[0]
+    players = (await run_in_db_worker(player_service.get_players_by_match, match_id))[0]
     player_id = players.id
-    player_service.delete_player(player_id)
-    match_service.update_match(match_id, "FINISHED", 0)
+    await run_in_db_worker(finish_match, match_id, player_id, db)
+    turn_scheduler.cancel(match_id)
+    await discard_partial_movements(match_id, db)
     reason_winning = reason.value
 
     msg = {
@@ -200,15 +328,17 @@ async def player_winner_by_no_shapes(
     Returns:
         - None, notifica a los jugadores que el jugador ha ganado
     """
-    cant_shapes = len(ShapeCardService(db).get_shape_card_by_player(player_winner.id))
+    shapes = await run_in_db_worker(ShapeCardService(db).get_shape_card_by_player, player_winner.id)
+    cant_shapes = len(shapes)
 
     if cant_shapes == 0:
         msg_win = {
             "key": "WINNER",
             "payload": {"player_id": player_winner.id, "reason": "NORMAL"},
         }
-        PlayerService(db).delete_player(player_winner.id)
-        MatchService(db).update_match(match.id, "FINISHED", 0)
+        await run_in_db_worker(finish_match, match.id, player_winner.id, db)
+        turn_scheduler.cancel(match.id)
+        await discard_partial_movements(match.id, db)
         try:
             await manager.broadcast_to_game(match.id, msg_win)
         except RuntimeError as e:
@@ -281,116 +411,199 @@ async def owner_leave(owner: Players, match: Matches, db: Session):
                 print(f"Player {player.id} not connected")
                 pass
 
-    match_service.delete_match(match.id)
+    await run_in_db_worker(match_service.delete_match, match.id)
+    lobby_index.remove_match(match.id)
 
     return {"message": "The match has been canceled because the owner has left."}
 
 
-async def turn_timeout(match_id: int, db: Session, turn_order: int, background_tasks):
-    match_service = MatchService(db)
-    timer = int(os.getenv("TURN_TIMER"))
-    await sleep(timer)
-    match = match_service.get_match_by_id(match_id)
-    logger.info("timestamp DB: %s", match.started_turn_time)
-    logger.info("Now: %s", datetime.now())
-    logger.info("Turn order DB: %s", turn_order)
-    logger.info("Turn order: %s", turn_order)
-    if match is not None and match.current_player_turn == turn_order and datetime.now() - match.started_turn_time >= timedelta(seconds=timer-1):
-        logger.info("IF Timeout")
-        movement_card_service = MovementCardService(db)
-        tile_service = TileService(db)
-        board_service = BoardService(db)
-        player_service = PlayerService(db)
-        shape_card_service = ShapeCardService(db)
-
-        try:
-            player = player_service.get_player_by_turn(turn_order, match_id)
-            match = MatchService(db).get_match_by_id(match_id)
-            board = board_service.get_board_by_match_id(match_id)
-        except Exception as e:
-            logger.error(e)
-            return None
-        movements = []
-        tiles = []
-        for _ in range(len(board.get_movs())):
-            try:
-                last_movement = board_service.get_last_temporary_movements(
-                    board.id)
-            except NoResultFound as e:
-                logger.error(e)
-                return None
+async def undo_turn_partial_moves(state: GameState, player_id: int, match_id: int):
+    """
+    Deshace en memoria los movimientos parciales del turno, del ultimo al
+    primero, y avisa cada uno a los jugadores.
+    Args:
+        - state: Estado de la partida
+        - player_id: ID del jugador al que se le devuelven las cartas
+        - match_id: ID de la partida
+    Returns:
+        - movements: Tuplas (id, tipo) de las cartas devueltas
+    """
+    movements = []
+    while state.journal:
+        last_movement, _ = state.undo(player_id)
+        movements.append((last_movement.id_mov, state.card_types[last_movement.id_mov]))
 
-            tile1 = last_movement.tile1
-            tile2 = last_movement.tile2
+        tiles = [{"rowIndex": last_movement.tile1.x, "columnIndex": last_movement.tile1.y},
+                 {"rowIndex": last_movement.tile2.x, "columnIndex": last_movement.tile2.y}]
+        msg = {"key": "UNDO_PARTIAL_MOVE", "payload": {"tiles": tiles}}
+        await manager.broadcast_to_game(match_id, msg)
+        await sleep(1)
 
-            try:
-                movement = movement_card_service.get_movement_card_by_id(
-                    last_movement.id_mov)
-                movement_card_service.add_movement_card_to_player(player.id, movement.id)
-            except NoResultFound as e:
-                logger.error(e)
-                return None
+        allow_figures_event = allowed_figures_event(
+            state.figures_tracker.figures, state.ban_color)
+        await manager.broadcast_to_game(match_id, allow_figures_event)
 
-            movements.append((movement.id, movement.mov_type))
-            tiles = [{"rowIndex": tile1.position_x, "columnIndex": tile1.position_y}, {
-            "rowIndex": tile2.position_x, "columnIndex": tile2.position_y}]
-            aux_tile = copy(tile1)
+    return movements
 
-            try:
-                tile_service.update_tile_position(
-                    tile1.id, tile2.position_x, tile2.position_y)
-                tile_service.update_tile_position(
-                    tile2.id, aux_tile.position_x, aux_tile.position_y)
-            except NoResultFound as e:
-                logger.error(e)
-                return None
-
-            msg = {"key": "UNDO_PARTIAL_MOVE", "payload": {"tiles": tiles}}
-            await manager.broadcast_to_game(match_id, msg)
-            await sleep(1)
-            formed_figures = board_service.get_formed_figures(match.board.id)
-            allow_figures_event = filter_allowed_figures(
-                match_id, board_service, formed_figures, tile_service)
-            await manager.broadcast_to_game(match_id, allow_figures_event)
 
+def finish_turn(player: Players, match: Matches, db: Session):
+    """
+    Pasa el turno al siguiente jugador y completa las cartas de movimiento del
+    jugador. Es sincronica, se ejecuta en el pool de workers.
+    Args:
+        - player: Jugador que termina el turno
+        - match: Partida
+        - db: Session de la base de datos
+    Returns:
+        - next_player: Jugador del siguiente turno
+        - movements: Cartas de movimiento dadas al jugador
+        - cant_draw: Si el jugador tiene una figura bloqueada y no puede robar figuras
+    """
+    with unit_of_work(db):
         next_player = end_turn_logic(player, match, db)
-        logger.info("Next Player turn: %s, %s", next_player.turn_order, next_player.player_name)
-        movements += give_movement_card_to_player(player.id, db)
+        movements = give_movement_card_to_player(player.id, db)
 
-        await notify_movement_card_to_player(player.id, match_id, movements)
-        
-        cant_draw = False
-        cards = shape_card_service.get_shape_card_by_player(player.id)
-        for card in cards:
-            if card.is_blocked != "NOT_BLOCKED":
-                cant_draw = True
-        
-        if not cant_draw:
-            await give_shape_card_to_player(player.id, db, is_init=False)
-        else:
-            msg_all = {"key": "PLAYER_RECEIVE_SHAPE_CARD",
-                    "payload": [{"player": player.player_name, 
-                                    "turn_order": player.turn_order, 
-                                    "shape_cards": []}]}
-            await manager.broadcast_to_game(player.match_id, msg_all)
-        
-        msg = {
-            "key": "END_PLAYER_TURN",
-            "payload": {
-                "current_player_turn": player.turn_order,
-                "current_player_name": player.player_name,
-                "next_player_name": next_player.player_name,
-                "next_player_turn": next_player.turn_order,
-                "turn_started": match.started_turn_time.isoformat()
-            }
+    cards = ShapeCardService(db).get_shape_card_by_player(player.id)
+    cant_draw = any(card.is_blocked != "NOT_BLOCKED" for card in cards)
+
+    return next_player, movements, cant_draw
+
+
+def schedule_turn_timeout(match_id: int, turn_order: int, deadline: Optional[datetime] = None):
+    """
+    Programa el vencimiento del turno actual de la partida, reemplazando el
+    vencimiento anterior si lo habia.
+    Args:
+        - match_id: id de la partida.
+        - turn_order: turno que vence.
+        - deadline: vencimiento guardado en la partida (Matches.turn_deadline).
+          Si no se indica, el turno dura TURN_TIMER segundos desde ahora.
+    """
+    if deadline is None:
+        delay = turn_duration()
+    else:
+        delay = max((deadline - datetime.now()).total_seconds(), 0)
+    turn_scheduler.schedule(match_id, turn_order, delay, turn_timeout)
+
+
+def recover_turn_timeouts(db: Session) -> int:
+    """
+    Reprograma los vencimientos de turno de las partidas en curso al iniciar
+    el servidor. Los turnos que vencieron mientras el servidor estaba caido
+    vencen inmediatamente.
+    Args:
+        - db: Session de la base de datos.
+    Returns:
+        - Cantidad de partidas reprogramadas.
+    """
+    # Con afinidad de partidas cada worker programa solo las suyas
+    matches = [match for match in MatchService(db).get_started_matches()
+               if shard_map.is_local(match.id)]
+    for match in matches:
+        deadline = match.turn_deadline
+        if deadline is None and match.started_turn_time is not None:
+            # Partidas empezadas antes de guardar el vencimiento
+            deadline = match.started_turn_time + timedelta(seconds=turn_duration())
+        schedule_turn_timeout(match.id, match.current_player_turn, deadline or datetime.now())
+
+    logger.info("%s turn timeouts recovered", len(matches))
+    return len(matches)
+
+
+@serialized_by_match
+async def turn_timeout(match_id: int, turn_order: int, db: Session):
+    """
+    Termina el turno de un jugador cuando se le acaba el tiempo. La llama el
+    turn_scheduler con una sesion nueva de la base de datos. Si falla, el
+    turn_scheduler la vuelve a llamar mas tarde.
+    Args:
+        - match_id: id de la partida.
+        - turn_order: turno que vencio.
+        - db: Session de la base de datos.
+    """
+    match_service = MatchService(db)
+    try:
+        match = await run_in_db_worker(match_service.get_match_by_id, match_id)
+    except NoResultFound:
+        # La partida ya no existe, no hay turno que terminar
+        return None
+    if match.state != enums.MatchState.STARTED.value or match.current_player_turn != turn_order:
+        # El turno ya termino por otro camino
+        return None
+
+    deadline = match.turn_deadline
+    if deadline is None:
+        # Partidas empezadas antes de guardar el vencimiento
+        deadline = match.started_turn_time + timedelta(seconds=turn_duration())
+    logger.info("Turn %s of match %s, deadline %s", turn_order, match_id, deadline)
+    if datetime.now() < deadline:
+        # Todavia no vencio: se reprograma por lo que falta, salvo que el
+        # turno ya tenga otro vencimiento
+        if turn_scheduler.get(match_id) is None:
+            schedule_turn_timeout(match_id, turn_order, deadline)
+        return None
+
+    player_service = PlayerService(db)
+    player = await run_in_db_worker(player_service.get_player_by_turn, turn_order, match_id)
+    match = await run_in_db_worker(MatchService(db).get_match_by_id, match_id)
+    state = await game_states.load(match_id, db)
+    movements = await undo_turn_partial_moves(state, player.id, match_id)
+    # Checkpoint del fin de turno
+    await game_states.checkpoint(match_id, db, release=True)
+
+    next_player, movements_given, cant_draw = await run_in_db_worker(
+        finish_turn, player, match, db)
+    movements += movements_given
+    logger.info("Next Player turn: %s, %s", next_player.turn_order, next_player.player_name)
+
+    await notify_movement_card_to_player(player.id, match_id, movements)
+
+    if not cant_draw:
+        await give_shape_card_to_player(player.id, db, is_init=False)
+    else:
+        msg_all = {"key": "PLAYER_RECEIVE_SHAPE_CARD",
+                "payload": [{"player": player.player_name, 
+                                "turn_order": player.turn_order, 
+                                "shape_cards": []}]}
+        await manager.broadcast_to_game(player.match_id, msg_all)
+    
+    msg = {
+        "key": "END_PLAYER_TURN",
+        "payload": {
+            "current_player_turn": player.turn_order,
+            "current_player_name": player.player_name,
+            "next_player_name": next_player.player_name,
+            "next_player_turn": next_player.turn_order,
+            "turn_started": match.started_turn_time.isoformat()
         }
-        await sleep(1)
-        await manager.broadcast_to_game(match.id, msg)
+    }
+    await sleep(1)
+    await manager.broadcast_to_game(match.id, msg)
 
-        background_tasks.add_task(turn_timeout, match_id, db, next_player.turn_order, background_tasks)
+    schedule_turn_timeout(match_id, next_player.turn_order, match.turn_deadline)
+
+
+def remove_player_from_match(player: Players, match: Matches, db: Session):
+    """
+    Elimina al jugador de la partida, pasando el turno si era el suyo. Es
+    sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - next_player: Jugador del siguiente turno o None si no era su turno
+    """
+    next_player = None
+    with unit_of_work(db):
+        if player.turn_order == match.current_player_turn:
+            next_player = end_turn_logic(player, match, db)
+
+        PlayerService(db).delete_player(player.id)
+        MatchService(db).update_match(
+            match.id, match.state, match.current_players - 1
+        )
+    return next_player
 
 
 @router.delete("/{match_id}/left/{player_id}")
+@serialized_by_match
 async def leave_player(player_id: int, match_id: int, db: Session = Depends(get_db)):
     """
     Endpoint to handle a player leaving a match.
@@ -409,15 +622,16 @@ async def leave_player(player_id: int, match_id: int, db: Session = Depends(get_
     match_service = MatchService(db)
     player_service = PlayerService(db)
 
+    await game_states.checkpoint(match_id, db, release=True)
     try:
-        player_to_delete = player_service.get_player_by_id(player_id)
+        player_to_delete = await run_in_db_worker(player_service.get_player_by_id, player_id)
     except ValueError:
         raise HTTPException(
             status_code=404, detail=f"Player not found with id: {player_id}"
         )
 
     try:
-        match_to_leave = match_service.get_match_by_id(match_id)
+        match_to_leave = await run_in_db_worker(match_service.get_match_by_id, match_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Match not found")
 
@@ -428,24 +642,19 @@ async def leave_player(player_id: int, match_id: int, db: Session = Depends(get_
 
     if player_to_delete.is_owner and match_to_leave.state == "WAITING":
         msg = await owner_leave(player_to_delete, match_to_leave, db)
-        await notify_matches_list(db)
+        await notify_matches_list(db, match_id)
         return msg
 
-    next_player = None
-    if player_to_delete.turn_order == match_to_leave.current_player_turn:
-        next_player = end_turn_logic(player_to_delete, match_to_leave, db)
-
-    player_service.delete_player(player_id)
+    next_player = await run_in_db_worker(
+        remove_player_from_match, player_to_delete, match_to_leave, db
+    )
+    await run_in_db_worker(lobby_index.update_match, match_to_leave)
 
     try:
         manager.disconnect_player_from_game(match_id, player_id)
     except PlayerNotConnected:
         pass
 
-    match_service.update_match(
-        match_id, match_to_leave.state, match_to_leave.current_players - 1
-    )
-
     msg = {"key": "PLAYER_LEFT", "payload": {"name": player_name}}
     try:
         await manager.broadcast_to_game(match_id, msg)
@@ -454,7 +663,8 @@ async def leave_player(player_id: int, match_id: int, db: Session = Depends(get_
         print(f"Error al enviar mensaje: {e}")
 
     if next_player:
-        db.refresh(match_to_leave)
+        await run_in_db_worker(db.refresh, match_to_leave)
+        schedule_turn_timeout(match_id, next_player.turn_order, match_to_leave.turn_deadline)
         msg = {
             "key": "END_PLAYER_TURN",
             "payload": {
@@ -470,18 +680,18 @@ async def leave_player(player_id: int, match_id: int, db: Session = Depends(get_
     if match_to_leave.current_players == 1 and match_to_leave.state == "STARTED":
         await playerWinner(match_id, ReasonWinning.FORFEIT, db)
 
-    await notify_matches_list(db)
+    await notify_matches_list(db, match_id)
 
     return {"player_id": player_id, "players": player_name}
 
 
-@router.patch("/{match_id}/end-turn/{player_id}", status_code=200)
-async def end_turn(match_id: int, player_id: int, db: Session = Depends(get_db), background_tasks = BackgroundTasks()):
-    movement_card_service = MovementCardService(db)
-    board_service = BoardService(db)
-    tile_service = TileService(db)
-    shape_card_service = ShapeCardService(db)
-
+def get_turn_context(match_id: int, player_id: int, db: Session):
+    """
+    Obtiene el jugador, la partida y el tablero para terminar un turno. Es
+    sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - player, match, board
+    """
     try:
         player = PlayerService(db).get_player_by_id(player_id)
     except:
@@ -491,64 +701,33 @@ async def end_turn(match_id: int, player_id: int, db: Session = Depends(get_db),
     except:
         raise HTTPException(status_code=404, detail=f"Match not found")
     try:
-        board = board_service.get_board_by_match_id(match_id)
+        board = BoardService(db).get_board_by_match_id(match_id)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Board not found")
-    
-    movements = []
-    tiles = []
-    for _ in range(len(board.get_movs())):
-        try:
-            last_movement = board_service.get_last_temporary_movements(board.id)
-        except NoResultFound as e:
-            raise HTTPException(status_code=404, detail=e) 
-        tile1 = last_movement.tile1
-        tile2 = last_movement.tile2
-
-        try:
-            movement = movement_card_service.get_movement_card_by_id(
-                last_movement.id_mov
-            )
-            movement_card_service.add_movement_card_to_player(player_id, movement.id)
-        except NoResultFound as e:
-            raise HTTPException(status_code=404, detail=e)
-
-        movements.append((movement.id, movement.mov_type))
-        tiles = [{"rowIndex": tile1.position_x, "columnIndex": tile1.position_y}, 
-                 {"rowIndex": tile2.position_x, "columnIndex": tile2.position_y}]
-        aux_tile = copy(tile1)
-
-        try:
-            tile_service.update_tile_position(
-                tile1.id, tile2.position_x, tile2.position_y
-            )
-            tile_service.update_tile_position(
-                tile2.id, aux_tile.position_x, aux_tile.position_y
-            )
-        except NoResultFound as e:
-            raise HTTPException(status_code=404, detail=e)
 
-        msg = {"key": "UNDO_PARTIAL_MOVE", "payload": {"tiles": tiles}}
-        await manager.broadcast_to_game(match_id, msg)
-        await sleep(1)
+    return player, match, board
 
-        formed_figures = board_service.get_formed_figures(match.board.id)
-        allow_figures_event = filter_allowed_figures(
-            match_id, board_service, formed_figures, tile_service)
-        await manager.broadcast_to_game(match_id, allow_figures_event)
 
+@router.patch("/{match_id}/end-turn/{player_id}", status_code=200)
+@serialized_by_match
+async def end_turn(match_id: int, player_id: int, db: Session = Depends(get_db)):
+    player, match, board = await run_in_db_worker(get_turn_context, match_id, player_id, db)
 
-    next_player = end_turn_logic(player, match, db)
-    movements += give_movement_card_to_player(player_id, db)
+    movements = []
+    # Los movimientos parciales son del jugador de turno, end_turn_logic
+    # rechaza a los demas
+    if player.turn_order == match.current_player_turn:
+        state = await get_game_state(match_id, db)
+        movements = await undo_turn_partial_moves(state, player_id, match_id)
+        # Checkpoint del fin de turno
+        await game_states.checkpoint(match_id, db, release=True)
+
+    next_player, movements_given, cant_draw = await run_in_db_worker(
+        finish_turn, player, match, db)
+    movements += movements_given
 
     await notify_movement_card_to_player(player_id, match_id, movements)
 
-    cant_draw = False
-    cards = shape_card_service.get_shape_card_by_player(player_id)
-    for card in cards:
-        if card.is_blocked != "NOT_BLOCKED":
-            cant_draw = True
-
     if not cant_draw:
         await give_shape_card_to_player(player.id, db, is_init=False)
     else:
@@ -576,8 +755,8 @@ async def end_turn(match_id: int, player_id: int, db: Session = Depends(get_db),
     }
     await sleep(1)
     await manager.broadcast_to_game(match.id, msg)
-    background_tasks.add_task(turn_timeout, match_id, db, match.current_player_turn, background_tasks)
-    return JSONResponse(None, background=background_tasks)
+    schedule_turn_timeout(match_id, match.current_player_turn, match.turn_deadline)
+    return JSONResponse(None)
 
 
 def validate_partial_move(partialMove: PartialMove, card_type: str):
@@ -621,184 +800,134 @@ def validate_partial_move(partialMove: PartialMove, card_type: str):
         raise HTTPException(status_code=400, detail="Movement card not valid")
 
 
-@router.post("/{match_id}/partial-move/{player_id}", status_code=200)
-async def partial_move(
-    match_id: int,
-    player_id: int,
-    partialMove: PartialMove,
-    db: Session = Depends(get_db),
-):
-    match_service = MatchService(db)
-    player_service = PlayerService(db)
-    movement_service = MovementCardService(db)
-
+async def get_game_state(match_id: int, db: Session) -> GameState:
+    """
+    Devuelve el estado en memoria de la partida, cargandolo si hace falta.
+    Raises:
+        - HTTPException 404: Si no se encuentra la partida o su tablero
+    """
     try:
-        match = match_service.get_match_by_id(match_id)
+        return await game_states.load(match_id, db)
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Match not found")
 
-    try:
-        player = player_service.get_player_by_id(player_id)
-    except ValueError:
+
+def check_player_turn(state: GameState, player_id: int):
+    """
+    Verifica que sea el turno del jugador.
+    Raises:
+        - HTTPException 404: Si el jugador no esta en la partida
+        - HTTPException 403: Si no es el turno del jugador
+    """
+    player = state.players.get(player_id)
+    if player is None:
         raise HTTPException(status_code=404, detail="Player not found")
 
-    if player.turn_order != match.current_player_turn:
+    if player.turn_order != state.current_player_turn:
         raise HTTPException(
             status_code=403, detail=f"It's not player {player.player_name}'s turn"
         )
 
-    try:
-        card_type = movement_service.get_movement_card_by_id(
-            partialMove.movement_card
-        ).mov_type
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Movement card not found")
 
-    if validate_partial_move(partialMove, card_type):
-        tile_service = TileService(db)
-        board_service = BoardService(db)
+def apply_partial_move(state: GameState, player_id: int, partialMove: PartialMove):
+    """
+    Valida y aplica un movimiento parcial en el estado en memoria de la
+    partida. Se guarda en la base de datos con GameStates.save.
+    Args:
+        - state: Estado de la partida
+        - player_id: ID del jugador
+        - partialMove: Movimiento a aplicar
+    Returns:
+        - tiles: Fichas intercambiadas
+        - allow_figures_event: Mensaje de ALLOW_FIGURES con las figuras del tablero
+    """
+    check_player_turn(state, player_id)
 
-        try:
-            board = board_service.get_board_by_match_id(match_id)
-        except NoResultFound:
-            raise HTTPException(status_code=404, detail="Board not found")
+    card_type = state.card_types.get(partialMove.movement_card)
+    if card_type is None:
+        raise HTTPException(status_code=404, detail="Movement card not found")
 
-        formed_figures = board_service.get_formed_figures(match.board.id)
-        try:
-            tile1 = tile_service.get_tile_by_position(
-                partialMove.tiles[0].rowIndex,
-                partialMove.tiles[0].columnIndex,
-                board.id,
-            )
-            tile2 = tile_service.get_tile_by_position(
-                partialMove.tiles[1].rowIndex,
-                partialMove.tiles[1].columnIndex,
-                board.id,
-            )
-        except NoResultFound:
-            raise HTTPException(status_code=404, detail="Tile not found")
+    if not validate_partial_move(partialMove, card_type):
+        raise HTTPException(status_code=400, detail="Invalid movement")
 
-        aux_tile = copy(tile1)
-        tile_service.update_tile_position(tile1.id, tile2.position_x, tile2.position_y)
-        tile_service.update_tile_position(
-            tile2.id, aux_tile.position_x, aux_tile.position_y
-        )
+    movement, figures_diff = state.move(
+        Coordinate(partialMove.tiles[0].rowIndex, partialMove.tiles[0].columnIndex),
+        Coordinate(partialMove.tiles[1].rowIndex, partialMove.tiles[1].columnIndex),
+        partialMove.movement_card,
+    )
 
-        create_figure = False
-        new_formed_figures = board_service.get_formed_figures(match.board.id)
+    tiles = [
+        {"rowIndex": movement.tile1.x, "columnIndex": movement.tile1.y},
+        {"rowIndex": movement.tile2.x, "columnIndex": movement.tile2.y},
+    ]
 
-        for figure in formed_figures:
-            try:
-                new_formed_figures.remove(figure)
-            except ValueError:
-                continue
+    logger.info("nuevas figuras formadas %s", figures_diff.added)
 
-        if new_formed_figures:
-            create_figure = True
+    allow_figures_event = allowed_figures_event(
+        state.figures_tracker.figures, state.ban_color)
 
-        board_service.update_list_of_parcial_movements(
-            board.id, [tile1, tile2], partialMove.movement_card, create_figure
-        )
-        try:
-            movement_service.update_card_owner_to_none(partialMove.movement_card)
-        except NoResultFound:
-            raise HTTPException(status_code=404, detail="Movement card not found")
-
-        tiles = [
-            {"rowIndex": tile1.position_x, "columnIndex": tile1.position_y},
-            {"rowIndex": tile2.position_x, "columnIndex": tile2.position_y},
-        ]
-        msg = {"key": "PLAYER_RECEIVE_NEW_BOARD", "payload": {"swapped_tiles": tiles}}
-        await manager.broadcast_to_game(match_id, msg)
-        
-        formed_figures = board_service.get_formed_figures(match.board.id)
+    return tiles, allow_figures_event
 
-        logger.info("nuevas figuras formadas %s", formed_figures)
-        
-        allow_figures_event = filter_allowed_figures(
-            match_id, board_service, formed_figures, tile_service)
-        await manager.broadcast_to_game(match_id, allow_figures_event)
 
-    else:
-        raise HTTPException(status_code=400, detail="Invalid movement")
-
-
-@router.delete("/{match_id}/partial-move/{player_id}", status_code=200)
-async def delete_partial_move(
-    match_id: int, player_id: int, db: Session = Depends(get_db)
+@router.post("/{match_id}/partial-move/{player_id}", status_code=200)
+@serialized_by_match
+async def partial_move(
+    match_id: int,
+    player_id: int,
+    partialMove: PartialMove,
+    db: Session = Depends(get_db),
 ):
-    match_service = MatchService(db)
-    player_service = PlayerService(db)
-    tile_service = TileService(db)
-    board_service = BoardService(db)
-    movement_service = MovementCardService(db)
-
-    try:
-        match = match_service.get_match_by_id(match_id)
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Match not found")
-
-    try:
-        player = player_service.get_player_by_id(player_id)
-    except ValueError:
-        raise HTTPException(status_code=404, detail="Player not found")
+    state = await get_game_state(match_id, db)
+    tiles, allow_figures_event = apply_partial_move(state, player_id, partialMove)
+    await game_states.save(match_id, db)
 
-    if player.turn_order != match.current_player_turn:
-        raise HTTPException(
-            status_code=403, detail=f"It's not player {player.player_name}'s turn"
-        )
+    msg = {"key": "PLAYER_RECEIVE_NEW_BOARD", "payload": {"swapped_tiles": tiles}}
+    await manager.broadcast_to_game(match_id, msg)
+    await manager.broadcast_to_game(match_id, allow_figures_event)
 
-    try:
-        board = board_service.get_board_by_match_id(match_id)
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Board not found")
 
-    last_movement = board_service.get_last_temporary_movements(board.id)
+def apply_undo_partial_move(state: GameState, player_id: int):
+    """
+    Deshace el ultimo movimiento parcial del jugador en el estado en memoria
+    de la partida.
+    Args:
+        - state: Estado de la partida
+        - player_id: ID del jugador
+    Returns:
+        - tiles: Fichas intercambiadas
+        - movement_card: Carta de movimiento devuelta al jugador
+        - allow_figures_event: Mensaje de ALLOW_FIGURES con las figuras del tablero
+    """
+    check_player_turn(state, player_id)
 
-    if last_movement == None:
+    undone = state.undo(player_id)
+    if undone is None:
         raise HTTPException(status_code=409, detail="No movements to undo")
+    last_movement, _ = undone
 
-    tile1 = last_movement.tile1
-    tile2 = last_movement.tile2
-    movement_id = last_movement.id_mov
+    tiles = [
+        {"rowIndex": last_movement.tile1.x, "columnIndex": last_movement.tile1.y},
+        {"rowIndex": last_movement.tile2.x, "columnIndex": last_movement.tile2.y},
+    ]
+    movement_card = (last_movement.id_mov, state.card_types[last_movement.id_mov])
 
-    try:
-        movement_type = movement_service.get_movement_card_by_id(movement_id).mov_type
-        movement_service.add_movement_card_to_player(player_id, movement_id)
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Movement card not found")
+    allow_figures_event = allowed_figures_event(
+        state.figures_tracker.figures, state.ban_color)
 
-    aux_tile = copy(tile1)
+    return tiles, movement_card, allow_figures_event
 
-    try:
-        tile_service.update_tile_position(tile1.id, tile2.position_x, tile2.position_y)
-        tile_service.update_tile_position(
-            tile2.id, aux_tile.position_x, aux_tile.position_y
-        )
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Tile not found")
 
-    tiles = [
-        {"rowIndex": tile1.position_x, "columnIndex": tile1.position_y},
-        {"rowIndex": tile2.position_x, "columnIndex": tile2.position_y},
-    ]
-    movement_card = (movement_id, movement_type)
+@router.delete("/{match_id}/partial-move/{player_id}", status_code=200)
+@serialized_by_match
+async def delete_partial_move(
+    match_id: int, player_id: int, db: Session = Depends(get_db)
+):
+    state = await get_game_state(match_id, db)
+    tiles, movement_card, allow_figures_event = apply_undo_partial_move(state, player_id)
+    await game_states.save(match_id, db)
 
     msg = {"key": "UNDO_PARTIAL_MOVE", "payload": {"tiles": tiles}}
     await manager.broadcast_to_game(match_id, msg)
-
-    # Send Info about figures coordinates
-    board_figures = None
-    try:
-        match = MatchService(db).get_match_by_id(match_id)
-        board_figures = BoardService(db).get_formed_figures(match.board.id)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Error with formed figures")
-
-    figures_found = board_service.get_formed_figures(board.id)
-    allow_figures_event = filter_allowed_figures(
-        match_id, board_service, figures_found, tile_service
-    )
     await manager.broadcast_to_game(match_id, allow_figures_event)
 
     return {"tiles": tiles, "movement_card": movement_card}
@@ -852,40 +981,53 @@ def check_ban_color(
     return new_color_ban
 
 
-async def undo_partials_movements(
-    board, player_id, match_id, db: Session = Depends(get_db)
-):
+def return_partial_moves(board, player_id, db: Session, figures_tracker=None):
+    """
+    Deshace los movimientos parciales del tablero hasta el ultimo que formo una
+    figura y descarta el resto. Es sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - movements: Cartas de movimiento devueltas al jugador
+        - tiles: Pares de fichas intercambiadas, en el orden en que se deshicieron
+    """
     board_service = BoardService(db)
     tile_service = TileService(db)
     movement_card_service = MovementCardService(db)
     movements = []
     tiles = []
-    for _ in range(len(board.get_movs())):
-        last_movement = board_service.get_last_temporary_movements(board.id)
-        if last_movement.create_figure:
-            break
-        tile1 = last_movement.tile1
-        tile2 = last_movement.tile2
+    with unit_of_work(db):
+        for _ in range(len(board_service.get_temporary_movements(board.id))):
+            last_movement = board_service.get_last_temporary_movements(board.id)
+            if last_movement.create_figure:
+                break
+            tile1 = last_movement.tile1
+            tile2 = last_movement.tile2
 
-        movement = movement_card_service.get_movement_card_by_id(last_movement.id_mov)
-        movement_card_service.add_movement_card_to_player(player_id, movement.id)
+            movement = movement_card_service.get_movement_card_by_id(last_movement.id_mov)
+            movement_card_service.add_movement_card_to_player(player_id, movement.id)
 
-        movements.append((movement.id, movement.mov_type))
-        tiles.append(
-            (
-                {"rowIndex": tile1.position_x, "columnIndex": tile1.position_y},
-                {"rowIndex": tile2.position_x, "columnIndex": tile2.position_y},
+            movements.append((movement.id, movement.mov_type))
+            tiles.append(
+                (
+                    {"rowIndex": tile1.x, "columnIndex": tile1.y},
+                    {"rowIndex": tile2.x, "columnIndex": tile2.y},
+                )
             )
-        )
 
-        aux_tile = copy(tile1)
-        tile_service.update_tile_position(tile1.id, tile2.position_x, tile2.position_y)
-        tile_service.update_tile_position(
-            tile2.id, aux_tile.position_x, aux_tile.position_y
-        )
+            tile_service.swap_positions(board.id, tile1, tile2)
+            if figures_tracker:
+                figures_tracker.swap(tile1, tile2)
+
+    board_service.clear_temporary_movements(board.id)
+
+    return movements, tiles
 
-    for i in range(len(board.get_movs())):
-        last_movement = board_service.get_last_temporary_movements(board.id)
+
+async def undo_partials_movements(
+    board, player_id, match_id, db: Session = Depends(get_db), figures_tracker=None
+):
+    movements, tiles = await run_in_db_worker(
+        return_partial_moves, board, player_id, db, figures_tracker
+    )
 
     if tiles:
         for tiles_to_swap in tiles:
@@ -896,21 +1038,42 @@ async def undo_partials_movements(
     return movements
 
 
-async def unlock_figures(shape_card: ShapeCards, player_id, match_id, db):
+def unlock_blocked_cards(shape_card: ShapeCards, player_id, db) -> List[int]:
+    """
+    Desbloquea la carta bloqueada del jugador si solo le queda esa y la que
+    acaba de usar. Es sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - Ids de las cartas desbloqueadas
+    """
+    if shape_card.is_blocked != "NOT_BLOCKED":
+        return []
     shape_card_service = ShapeCardService(db)
     visible_cards = shape_card_service.get_visible_cards(player_id, True)
-    if shape_card.is_blocked == "NOT_BLOCKED":
-        for card in visible_cards:
-            if card.is_visible == True and card.is_blocked == "BLOCKED" and len(visible_cards) == 2:
-                shape_card_service.update_shape_card(card.id, True, "UNLOCKED")
-                msg = {"key": "UNLOCK_FIGURE", "payload": { "figure_id": card.id }}
-                await manager.broadcast_to_game(match_id, msg)
+    unlocked = []
+    for card in visible_cards:
+        if card.is_visible == True and card.is_blocked == "BLOCKED" and len(visible_cards) == 2:
+            shape_card_service.update_shape_card(card.id, True, "UNLOCKED")
+            unlocked.append(card.id)
+    return unlocked
 
 
-@router.post("/{match_id}/player/{player_id}/use-figure", status_code=200)
-async def use_figure(
-    match_id: int, player_id: int, request: UseFigure, db: Session = Depends(get_db)
-):
+async def unlock_figures(shape_card: ShapeCards, player_id, match_id, db):
+    unlocked = await run_in_db_worker(unlock_blocked_cards, shape_card, player_id, db)
+    for card_id in unlocked:
+        msg = {"key": "UNLOCK_FIGURE", "payload": { "figure_id": card_id }}
+        await manager.broadcast_to_game(match_id, msg)
+
+
+def validate_figure_use(match_id: int, player_id: int, request: UseFigure, db: Session):
+    """
+    Verifica que el jugador pueda usar la carta de figura con las coordenadas
+    pedidas. Es sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - match, player, board, shape_card
+        - figures_tracker: Tracker de las figuras del tablero
+        - new_ban_color: Color de la figura, que pasa a ser el color prohibido
+        - figure_name: Tipo de figura de la carta
+    """
     match_service = MatchService(db)
     player_service = PlayerService(db)
     shape_card_service = ShapeCardService(db)
@@ -963,8 +1126,9 @@ async def use_figure(
     try:
         board = board_service.get_board_by_id(match.board.id)
 
+        figures_tracker = board_service.get_figures_tracker(board.id)
         figures_found = list(
-            map(lambda x: Figure(x), board_service.get_formed_figures(board.id))
+            map(lambda x: Figure(x), figures_tracker.figures)
         )
         coordinates = request.coordinates
         figure_to_find = Figure(
@@ -986,14 +1150,39 @@ async def use_figure(
         figure_name = shape_card_service.get_shape_card_by_id(
             request.figure_id
         ).shape_type
-        movements = await undo_partials_movements(board, player_id, match_id, db)
+    except NoResultFound:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    return (match, player, board, shape_card, figures_tracker,
+            new_ban_color, figure_name)
+
+
+@router.post("/{match_id}/player/{player_id}/use-figure", status_code=200)
+@serialized_by_match
+async def use_figure(
+    match_id: int, player_id: int, request: UseFigure, db: Session = Depends(get_db)
+):
+    shape_card_service = ShapeCardService(db)
+    board_service = BoardService(db)
+    tile_service = TileService(db)
+
+    await game_states.checkpoint(match_id, db, release=True)
+    (match, player, board, shape_card, figures_tracker,
+     new_ban_color, figure_name) = await run_in_db_worker(
+        validate_figure_use, match_id, player_id, request, db
+    )
+
+    try:
+        movements = await undo_partials_movements(
+            board, player_id, match_id, db, figures_tracker
+        )
         await unlock_figures(shape_card, player_id, match_id, db)
-        shape_card_service.delete_shape_card(request.figure_id)
+        await run_in_db_worker(shape_card_service.delete_shape_card, request.figure_id)
 
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Tile not found")
 
-    board_service.update_ban_color(board.id, new_ban_color)
+    await run_in_db_worker(board_service.update_ban_color, board.id, new_ban_color)
     msg2 = {
         "key": "COMPLETED_FIGURE",
         "payload": {
@@ -1006,10 +1195,8 @@ async def use_figure(
     await sleep(1)
     await player_winner_by_no_shapes(player, match, db)
 
-    figures_found = board_service.get_formed_figures(board.id)
-    allow_figures_event = filter_allowed_figures(
-        match_id, board_service, figures_found, tile_service
-    )
+    allow_figures_event = await run_in_db_worker(
+        filter_allowed_figures, board.id, board_service, figures_tracker.figures)
 
     await manager.broadcast_to_game(match_id, allow_figures_event)
 
@@ -1017,43 +1204,46 @@ async def use_figure(
 
 
 def filter_allowed_figures(
-    match_id: int,
+    board_id: int,
     board_service: BoardService,
-    figures_found: list[list[Coordinate]],
-    tile_service: TileService,
+    figures_found: list[ColoredFigure],
 ):
     """
-    Filtra las figuras que no son del color baneado
+    Filtra las figuras que no son del color baneado. El color de cada figura
+    viene con la figura, no hace falta buscar sus fichas.
     Args:
-        - match_id: ID de la partida
+        - board_id: ID del tablero
         - board_service: Servicio de tablero
-        - figures_found: Lista de figuras del tablero
+        - figures_found: Lista de figuras del tablero, con su color
     Returns:
         - allow_figures_event: Mensaje de evento de ALLOW_FIGURES, con las figuras filtradas.
     """
-    ban_color = board_service.get_ban_color(match_id)
-    filtered_figures = []
-    for figure in figures_found:
-        print(f"Figure coordinates: {figure}")
-        try:
-            tile = tile_service.get_tile_by_position(figure[0].x, figure[0].y, match_id)
-        except NoResultFound:
-            raise HTTPException(
-                status_code=404, detail="Tile with coordinates not found"
-            )
-        if tile.color != ban_color:
-            print(f"Tile color: {tile.color}")
-            filtered_figures.append(figure)
+    return allowed_figures_event(figures_found, board_service.get_ban_color(board_id))
+
 
-    allow_figures_event = {"key": "ALLOW_FIGURES", "payload": filtered_figures}
+def allowed_figures_event(figures_found: list[ColoredFigure], ban_color: Optional[str]):
+    """
+    Arma el mensaje de ALLOW_FIGURES con las figuras que no son del color
+    baneado.
+    Args:
+        - figures_found: Lista de figuras del tablero, con su color
+        - ban_color: Color prohibido del tablero
+    """
+    filtered_figures = [figure for figure in figures_found if figure.color != ban_color]
 
-    return allow_figures_event
+    return {"key": "ALLOW_FIGURES", "payload": filtered_figures}
 
 
-@router.post("/{match_id}/player/{player_id}/block-figure", status_code=200)
-async def block_figure(
-    match_id: int, player_id: int, request: UseFigure, db: Session = Depends(get_db)
-):
+def validate_figure_block(match_id: int, player_id: int, request: UseFigure, db: Session):
+    """
+    Verifica que el jugador pueda bloquear la carta de figura con las
+    coordenadas pedidas. Es sincronica, se ejecuta en el pool de workers.
+    Returns:
+        - player, board, shape_card
+        - player_owner: Jugador duenio de la carta a bloquear
+        - figures_tracker: Tracker de las figuras del tablero
+        - new_ban_color: Color de la figura, que pasa a ser el color prohibido
+    """
     match_service = MatchService(db)
     player_service = PlayerService(db)
     shape_card_service = ShapeCardService(db)
@@ -1131,9 +1321,8 @@ async def block_figure(
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Board not found")
 
-    figures_found = list(
-        map(lambda x: Figure(x), board_service.get_formed_figures(board.id))
-    )
+    figures_tracker = board_service.get_figures_tracker(board.id)
+    figures_found = list(map(lambda x: Figure(x), figures_tracker.figures))
     coordinates = request.coordinates
     figure_to_find = Figure(tuple(map(lambda x: Coordinate(x[0], x[1]), coordinates)))
 
@@ -1146,8 +1335,28 @@ async def block_figure(
             status_code=409, detail="Conflict with coordinates and Figure Card"
         )
 
-    movements = await undo_partials_movements(board, player_id, match_id, db)
-    shape_card_service.update_shape_card(request.figure_id, True, "BLOCKED")
+    return player, board, shape_card, player_owner, figures_tracker, new_ban_color
+
+
+@router.post("/{match_id}/player/{player_id}/block-figure", status_code=200)
+@serialized_by_match
+async def block_figure(
+    match_id: int, player_id: int, request: UseFigure, db: Session = Depends(get_db)
+):
+    shape_card_service = ShapeCardService(db)
+    board_service = BoardService(db)
+    tile_service = TileService(db)
+
+    await game_states.checkpoint(match_id, db, release=True)
+    (player, board, shape_card, player_owner,
+     figures_tracker, new_ban_color) = await run_in_db_worker(
+        validate_figure_block, match_id, player_id, request, db
+    )
+
+    movements = await undo_partials_movements(
+        board, player_id, match_id, db, figures_tracker
+    )
+    await run_in_db_worker(shape_card_service.update_shape_card, request.figure_id, True, "BLOCKED")
     msg2 = {
         "key": "BLOCKED_FIGURE",
         "payload": {
@@ -1162,11 +1371,9 @@ async def block_figure(
     await sleep(1)        
 
     # Tenemos que mandar de nuevo la lista porque se actualiza el color prohibido.\
-    board_service.update_ban_color(board.id, new_ban_color)
-    figures_found = board_service.get_formed_figures(board.id)
-    allow_figures_event = filter_allowed_figures(
-        match_id, board_service, figures_found, tile_service
-    )
+    await run_in_db_worker(board_service.update_ban_color, board.id, new_ban_color)
+    allow_figures_event = await run_in_db_worker(
+        filter_allowed_figures, board.id, board_service, figures_tracker.figures)
 
     await manager.broadcast_to_game(match_id, allow_figures_event)
 
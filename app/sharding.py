@@ -0,0 +1,121 @@
+"""
+Afinidad de partidas por worker.
+
+Con config.SHARD_COUNT > 1 cada partida tiene un unico worker duenio, el de
+indice match_id % SHARD_COUNT. Todo request HTTP o websocket de una partida
+(las rutas /matches/{match_id}/...) lo atiende su duenio: los demas workers
+responden con un 307 a la URL del duenio. Asi el estado en memoria de una
+partida (figuras del tablero, movimientos parciales, vencimiento del turno y
+conexiones de sus jugadores) vive en un solo proceso.
+
+El lobby (listar y crear partidas, /matches/ws) lo atiende cualquier worker.
+Los cambios del lobby se avisan a los demas workers por el backplane, que en
+este modo tiene que ser compartido (como siempre que hay varios workers).
+"""
+
+import re
+from typing import List, Optional
+
+from starlette.responses import RedirectResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app import config
+
+MATCH_PATH = re.compile(r"^/matches/(\d+)(?:/|$)")
+
+# Codigo con el que se cierra un websocket de una partida de otro worker, si
+# el servidor no permite responder el handshake con un 307
+WS_SHARD_REDIRECT_CODE = 4307
+
+
+def match_id_for_path(path: str) -> Optional[int]:
+    """Devuelve el id de la partida de una ruta, None si no es de una partida."""
+    found = MATCH_PATH.match(path)
+    return int(found.group(1)) if found else None
+
+
+class ShardMap:
+    """Reparto de las partidas entre los workers.
+
+    Attributes:
+        count: cantidad de workers.
+        index: indice de este worker.
+        urls: URL base de cada worker, en orden de indice.
+        shared: si otros workers atienden la misma base de datos.
+    """
+
+    def __init__(self, count: int = 1, index: int = 0, urls: Optional[List[str]] = None,
+                 shared: bool = False):
+        urls = urls or []
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid shard {index} of {count}")
+        if count > 1 and len(urls) != count:
+            raise ValueError(f"Expected {count} shard urls, got {len(urls)}")
+        self.count = count
+        self.index = index
+        self.urls = urls
+        self.shared = shared
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    @property
+    def exclusive(self) -> bool:
+        """Indica si cada partida la atiende un unico worker, ya sea porque hay
+        afinidad o porque nadie mas usa la base de datos. Solo entonces se
+        puede confiar en el estado en memoria de las partidas."""
+        return self.enabled or not self.shared
+
+    def shard_for(self, match_id: int) -> int:
+        """Indice del worker duenio de una partida."""
+        return match_id % self.count
+
+    def is_local(self, match_id: int) -> bool:
+        """Indica si la partida la atiende este worker."""
+        return not self.enabled or self.shard_for(match_id) == self.index
+
+    def owner_url(self, match_id: int) -> str:
+        """URL base del worker duenio de una partida."""
+        return self.urls[self.shard_for(match_id)]
+
+
+shard_map = ShardMap(config.SHARD_COUNT, config.SHARD_INDEX, config.SHARD_URLS, config.SHARED_DATABASE)
+
+
+class ShardRoutingMiddleware:
+    """Redirige los requests de las partidas de otros workers a su duenio.
+
+    Los requests HTTP reciben un 307, que conserva el metodo y el cuerpo. Los
+    websockets reciben un 307 en el handshake si el servidor lo permite, y si
+    no se cierran con WS_SHARD_REDIRECT_CODE y la URL del duenio como motivo.
+    """
+
+    def __init__(self, app: ASGIApp, shards: Optional[ShardMap] = None) -> None:
+        self.app = app
+        self.shards = shards if shards is not None else shard_map
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket") or not self.shards.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        match_id = match_id_for_path(scope["path"])
+        if match_id is None or self.shards.is_local(match_id):
+            await self.app(scope, receive, send)
+            return
+
+        location = self.shards.owner_url(match_id) + scope["path"]
+        if scope.get("query_string"):
+            location += "?" + scope["query_string"].decode("latin-1")
+
+        if scope["type"] == "http":
+            await RedirectResponse(location, status_code=307)(scope, receive, send)
+            return
+
+        location = re.sub(r"^http", "ws", location)
+        if "websocket.http.response" in scope.get("extensions", {}):
+            await RedirectResponse(location, status_code=307)(scope, receive, send)
+        else:
+            await send({"type": "websocket.close", "code": WS_SHARD_REDIRECT_CODE,
+                        "reason": location})
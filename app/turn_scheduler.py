@@ -0,0 +1,212 @@
+"""
+Vencimiento de los turnos de todas las partidas en una sola tarea.
+
+Cada partida tiene a lo sumo un vencimiento pendiente: el del turno actual. Los
+vencimientos se guardan en un heap ordenado por fecha; reprogramar una partida
+marca su entrada anterior como cancelada y agrega una nueva, en O(log n), y las
+entradas canceladas se descartan al llegar al tope del heap.
+
+Una sola tarea duerme hasta el vencimiento mas cercano. Al vencer un turno se
+llama a su callback con una sesion nueva de la base de datos, que se cierra al
+terminar: la sesion del request que programo el turno ya no existe.
+
+Si el callback falla (por ejemplo, el pool de la base de datos esta lleno) el
+turno se vuelve a programar con una espera que se duplica en cada intento:
+nadie mas puede terminar ese turno, y sin reintento la partida quedaria
+trabada.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.database import Init_Session
+from app.logger import logging
+
+logger = logging.getLogger(__name__)
+
+TurnCallback = Callable[[int, int, Session], Awaitable]
+
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+
+class TurnDeadline:
+    """Vencimiento del turno de una partida.
+
+    Attributes:
+        deadline: momento del vencimiento, segun time.monotonic().
+        match_id: id de la partida.
+        turn_order: turno que vence.
+        callback: funcion a llamar con (match_id, turn_order, db).
+        cancelled: si la entrada fue reemplazada o cancelada.
+        attempts: intentos fallidos anteriores de este vencimiento.
+    """
+
+    __slots__ = ("deadline", "seq", "match_id", "turn_order", "callback", "cancelled", "attempts")
+
+    def __init__(self, deadline: float, seq: int, match_id: int, turn_order: int, callback: TurnCallback):
+        self.deadline = deadline
+        self.seq = seq
+        self.match_id = match_id
+        self.turn_order = turn_order
+        self.callback = callback
+        self.cancelled = False
+        self.attempts = 0
+
+    def __lt__(self, other: "TurnDeadline") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class TurnScheduler:
+    """Programa los vencimientos de turno de todas las partidas.
+
+    Attributes:
+        session_factory: crea la sesion con la que se procesa cada vencimiento.
+        retry_delay: segundos hasta el primer reintento de un vencimiento fallido.
+        max_retry_delay: espera maxima entre reintentos.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = Init_Session,
+        retry_delay: float = RETRY_DELAY,
+        max_retry_delay: float = MAX_RETRY_DELAY,
+    ):
+        self.session_factory = session_factory
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.expired = 0
+        self.retried = 0
+        self._heap: List[TurnDeadline] = []
+        self._entries: Dict[int, TurnDeadline] = {}
+        self._seq = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def schedule(self, match_id: int, turn_order: int, delay: float, callback: TurnCallback) -> TurnDeadline:
+        """Programa el vencimiento del turno de una partida.
+
+        Si la partida ya tenia un vencimiento pendiente, se reemplaza.
+
+        Args:
+            match_id: id de la partida.
+            turn_order: turno que vence.
+            delay: segundos hasta el vencimiento.
+            callback: corrutina a llamar con (match_id, turn_order, db).
+
+        Returns:
+            TurnDeadline: entrada programada.
+        """
+        self.cancel(match_id)
+        entry = TurnDeadline(time.monotonic() + delay, next(self._seq), match_id, turn_order, callback)
+        self._entries[match_id] = entry
+        heapq.heappush(self._heap, entry)
+
+        self._ensure_running()
+        # Solo hace falta despertar la tarea si cambio el vencimiento mas cercano
+        if self._heap[0] is entry:
+            self._wakeup.set()
+        return entry
+
+    def cancel(self, match_id: int) -> bool:
+        """Cancela el vencimiento pendiente de una partida.
+
+        Returns:
+            bool: si la partida tenia un vencimiento pendiente.
+        """
+        entry = self._entries.pop(match_id, None)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        return True
+
+    def get(self, match_id: int) -> Optional[TurnDeadline]:
+        """Devuelve el vencimiento pendiente de una partida, si hay uno."""
+        return self._entries.get(match_id)
+
+    def clear(self):
+        """Descarta todos los vencimientos y detiene la tarea."""
+        self.stop()
+        self._heap.clear()
+        self._entries.clear()
+
+    def stop(self):
+        if self._task is not None:
+            if not self._task.get_loop().is_closed():
+                self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"scheduled": len(self._entries), "heap_size": len(self._heap),
+                "expired": self.expired, "retried": self.retried}
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            # Contexto vacio: la tarea no debe heredar el del llamador (por
+            # ejemplo la partida del actor que programo el turno), sino los
+            # vencimientos correrian como si ya estuvieran dentro del actor
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+
+    async def _run(self):
+        while True:
+            if self._task is not asyncio.current_task():
+                # Reemplazada por una tarea en otro event loop
+                return
+
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                timeout = None
+            else:
+                timeout = self._heap[0].deadline - time.monotonic()
+
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            entry = heapq.heappop(self._heap)
+            del self._entries[entry.match_id]
+            self.expired += 1
+            task = asyncio.get_running_loop().create_task(self._expire(entry))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _expire(self, entry: TurnDeadline):
+        db = self.session_factory()
+        try:
+            await entry.callback(entry.match_id, entry.turn_order, db)
+        except Exception as e:
+            logger.error("Error al vencer el turno %s de la partida %s: %s",
+                         entry.turn_order, entry.match_id, e)
+            self._retry(entry)
+        finally:
+            db.close()
+
+    def _retry(self, entry: TurnDeadline):
+        """Vuelve a programar un vencimiento que fallo, salvo que la partida
+        ya tenga otro pendiente."""
+        if entry.match_id in self._entries:
+            return
+        delay = min(self.retry_delay * 2 ** entry.attempts, self.max_retry_delay)
+        retry = self.schedule(entry.match_id, entry.turn_order, delay, entry.callback)
+        retry.attempts = entry.attempts + 1
+        self.retried += 1
+
+
+turn_scheduler = TurnScheduler()
@@ -60,6 +60,18 @@ class Figure:
 Shape: typing.TypeAlias = tuple[Coordinate, ...]
 
 
+class ColoredFigure(list):
+    """Coordinates of a figure found on a board, with the color of its tiles.
+
+    It is a plain list of coordinates, so it compares, iterates and serializes
+    like the figures returned before the color was added.
+    """
+
+    def __init__(self, coordinates: typing.Iterable[Coordinate], color: Colors) -> None:
+        super().__init__(coordinates)
+        self.color = color
+
+
 DIRECTIONS = [
     (0, 1),
     (0, -1),
@@ -211,7 +223,7 @@ def rotate_270_degrees(figure: Figure, board_dimensions: tuple[int,int]) -> Figu
 
 def find_board_figures(
     board: Board, figures_to_find: frozenset[Figure]
-) -> list[Figure]:
+) -> list[ColoredFigure]:
     """Finds all figure boards.
 
     Args:
@@ -220,7 +232,7 @@ def find_board_figures(
             should be positioned at the bottom left of the dimensions of the board.
 
     Return:
-        List of figures found.
+        List of figures found, each one with its color.
     """
     figures_found = []
     for shape in get_all_board_shapes(board):
@@ -228,6 +240,277 @@ def find_board_figures(
         shape_figure = Figure(tuple(translated_shape))
 
         if shape_figure in figures_to_find:
-            figures_found.append(sorted(shape))
+            first = shape[0]
+            figures_found.append(ColoredFigure(sorted(shape), board[first.x][first.y]))
 
     return figures_found
+
+
+# ================================ BITBOARD ENGINE ================================
+#
+# The board is packed as one integer per color, where the bit ``x * columns + y``
+# is set when the tile at (x, y) has that color. Every figure is precomputed as
+# the set of masks of all its translations over the board, so a connected region
+# is a figure if and only if its mask is in that set.
+
+Bitmask: typing.TypeAlias = int
+
+
+class BoardMasks:
+    """Precomputed masks for a board of the given dimensions."""
+
+    def __init__(self, dimensions: tuple[int, int]) -> None:
+        rows, columns = dimensions
+        self.dimensions = dimensions
+        self.columns = columns
+        self.full = (1 << (rows * columns)) - 1
+
+        first_column = 0
+        last_column = 0
+        for x in range(rows):
+            first_column |= 1 << (x * columns)
+            last_column |= 1 << (x * columns + columns - 1)
+
+        self.not_first_column = self.full & ~first_column
+        self.not_last_column = self.full & ~last_column
+
+    def neighbours(self, mask: Bitmask) -> Bitmask:
+        """Returns the mask of the cells adjacent (up, down, left, right) to mask."""
+        return (
+            ((mask << 1) & self.not_first_column)
+            | ((mask >> 1) & self.not_last_column)
+            | (mask << self.columns)
+            | (mask >> self.columns)
+        ) & self.full
+
+    def flood(self, seed: Bitmask, color_mask: Bitmask) -> Bitmask:
+        """Returns the connected region of color_mask that contains seed."""
+        region = seed
+        while True:
+            grown = (region | self.neighbours(region)) & color_mask
+            if grown == region:
+                return region
+            region = grown
+
+    def bit(self, x: int, y: int) -> Bitmask:
+        return 1 << (x * self.columns + y)
+
+    def to_coordinates(self, mask: Bitmask) -> list[Coordinate]:
+        """Unpacks a mask into its coordinates, sorted by row and column."""
+        coordinates = []
+        while mask:
+            lowest = mask & -mask
+            index = lowest.bit_length() - 1
+            coordinates.append(Coordinate(index // self.columns, index % self.columns))
+            mask ^= lowest
+        return coordinates
+
+
+def board_to_bitmasks(board: Board) -> dict[typing.Any, Bitmask]:
+    """Packs the board into one mask per color.
+
+    Args:
+        board: board to pack.
+
+    Returns:
+        dictionary from each color on the board to its mask.
+    """
+    color_masks = {}
+    columns = board.shape[1]
+    for x in range(board.shape[0]):
+        row = board[x]
+        for y in range(columns):
+            color_masks[row[y]] = color_masks.get(row[y], 0) | (1 << (x * columns + y))
+    return color_masks
+
+
+def get_figure_placements(
+    figures_to_find: typing.Iterable[Figure], dimensions: tuple[int, int]
+) -> frozenset[Bitmask]:
+    """Computes the masks of every figure translated to every valid position.
+
+    Only the figures positioned at the bottom left of the board are taken into
+    account, as `find_board_figures` does.
+
+    Args:
+        figures_to_find: figures positioned at the bottom left of the board.
+        dimensions: dimensions of the board.
+
+    Returns:
+        set with the mask of every placement of every figure.
+    """
+    masks = BoardMasks(dimensions)
+    placements = set()
+    for figure in figures_to_find:
+        coordinates = tuple(figure)
+        min_x = min(coordinate.x for coordinate in coordinates)
+        min_y = min(coordinate.y for coordinate in coordinates)
+        height = max(coordinate.x for coordinate in coordinates) - min_x
+        width = max(coordinate.y for coordinate in coordinates) - min_y
+
+        for dx in range(dimensions[0] - height):
+            for dy in range(dimensions[1] - width):
+                placement = [
+                    Coordinate(coordinate.x - min_x + dx, coordinate.y - min_y + dy)
+                    for coordinate in coordinates
+                ]
+                normalized = Figure(tuple(translate_shape_to_bottom_left(placement, dimensions)))
+                if normalized != Figure(coordinates):
+                    continue
+
+                mask = 0
+                for coordinate in placement:
+                    mask |= masks.bit(coordinate.x, coordinate.y)
+                placements.add(mask)
+
+    return frozenset(placements)
+
+
+# Placements are cached by the identity of the figures collection, figures lists
+# such as ALL_FIGURES are module constants so this avoids hashing them on every call.
+_placements_cache: dict[tuple[int, tuple[int, int]], tuple[typing.Any, frozenset[Bitmask]]] = {}
+
+
+def _get_cached_placements(
+    figures_to_find: typing.Iterable[Figure], dimensions: tuple[int, int]
+) -> frozenset[Bitmask]:
+    key = (id(figures_to_find), dimensions)
+    cached = _placements_cache.get(key)
+    if cached is None or cached[0] is not figures_to_find:
+        cached = (figures_to_find, get_figure_placements(figures_to_find, dimensions))
+        _placements_cache[key] = cached
+    return cached[1]
+
+
+_board_masks_cache: dict[tuple[int, int], BoardMasks] = {}
+
+
+def get_board_masks(dimensions: tuple[int, int]) -> BoardMasks:
+    """Returns the (cached) precomputed masks for a board of the given dimensions."""
+    if dimensions not in _board_masks_cache:
+        _board_masks_cache[dimensions] = BoardMasks(dimensions)
+    return _board_masks_cache[dimensions]
+
+
+def find_board_figures_bitboard(
+    board: Board, figures_to_find: typing.Iterable[Figure]
+) -> list[ColoredFigure]:
+    """Finds all figure boards using the bitboard representation.
+
+    Returns the same figures, in the same order, as `find_board_figures`.
+
+    Args:
+        board: Board where to look for figures.
+        figures_to_find: All the figures we should look for in the board. These figures
+            should be positioned at the bottom left of the dimensions of the board.
+
+    Return:
+        List of figures found, each one with its color.
+    """
+    masks = get_board_masks(board.shape)
+    placements = _get_cached_placements(figures_to_find, board.shape)
+
+    regions_found = []
+    for color, color_mask in board_to_bitmasks(board).items():
+        remaining = color_mask
+        while remaining:
+            region = masks.flood(remaining & -remaining, color_mask)
+            remaining &= ~region
+            if region in placements:
+                regions_found.append((region, color))
+
+    # The lowest bit of a region is its first tile in row order, which is the
+    # order in which find_board_figures walks the board.
+    regions_found.sort(key=lambda found: found[0] & -found[0])
+    return [ColoredFigure(masks.to_coordinates(region), color) for region, color in regions_found]
+
+
+FiguresDiff = collections.namedtuple("FiguresDiff", ["added", "removed"])
+
+
+class FiguresTracker:
+    """Keeps the figures of a board up to date while its tiles are swapped.
+
+    The whole board is scanned once, when the tracker is created. Each swap only
+    recomputes the regions of the two swapped colors that touch the swapped
+    tiles, every other region of the board can't change.
+    """
+
+    def __init__(self, board: Board, figures_to_find: typing.Iterable[Figure]) -> None:
+        self._masks = get_board_masks(board.shape)
+        self._placements = _get_cached_placements(figures_to_find, board.shape)
+        self._color_masks = board_to_bitmasks(board)
+        self._figures: set[Bitmask] = set()
+
+        for color_mask in self._color_masks.values():
+            self._figures.update(self._figure_regions(color_mask, color_mask))
+
+    def _figure_regions(self, color_mask: Bitmask, area: Bitmask) -> set[Bitmask]:
+        """Returns the regions of color_mask touching area that are figures."""
+        regions = set()
+        seeds = color_mask & area
+        while seeds:
+            region = self._masks.flood(seeds & -seeds, color_mask)
+            seeds &= ~region
+            if region in self._placements:
+                regions.add(region)
+        return regions
+
+    def _color_at(self, bit: Bitmask):
+        for color, color_mask in self._color_masks.items():
+            if color_mask & bit:
+                return color
+        raise ValueError("Coordinate out of the board")
+
+    def _sorted_coordinates(self, regions: typing.Iterable[Bitmask]) -> list[ColoredFigure]:
+        return [
+            ColoredFigure(self._masks.to_coordinates(region), self._color_at(region & -region))
+            for region in sorted(regions, key=lambda region: region & -region)
+        ]
+
+    @property
+    def figures(self) -> list[ColoredFigure]:
+        """Figures currently formed, in the same order as `find_board_figures`."""
+        return self._sorted_coordinates(self._figures)
+
+    def swap(self, first: Coordinate, second: Coordinate) -> FiguresDiff:
+        """Swaps two tiles and updates the figures formed.
+
+        Undoing a swap is swapping the same tiles again, which returns the
+        reversed diff.
+
+        Args:
+            first: coordinate of the first tile.
+            second: coordinate of the second tile.
+
+        Returns:
+            FiguresDiff with the figures added and removed by the swap.
+        """
+        first_bit = self._masks.bit(first[0], first[1])
+        second_bit = self._masks.bit(second[0], second[1])
+        first_color = self._color_at(first_bit)
+        second_color = self._color_at(second_bit)
+
+        if first_color == second_color:
+            return FiguresDiff([], [])
+
+        swapped = first_bit | second_bit
+        area = swapped | self._masks.neighbours(swapped)
+
+        before = set()
+        for color in (first_color, second_color):
+            before |= self._figure_regions(self._color_masks[color], area)
+
+        self._color_masks[first_color] ^= swapped
+        self._color_masks[second_color] ^= swapped
+
+        after = set()
+        for color in (first_color, second_color):
+            after |= self._figure_regions(self._color_masks[color], area)
+
+        removed = before - after
+        added = after - before
+        self._figures -= removed
+        self._figures |= added
+
+        return FiguresDiff(self._sorted_coordinates(added), self._sorted_coordinates(removed))
@@ -0,0 +1,128 @@
+"""
+Cache of the figures formed on the boards, keyed by a fingerprint of the board.
+
+The fingerprint of a board is its colors packed as a string, one character per
+tile in row order. The cache keeps two bounded LRU maps:
+    - board id -> fingerprint, so a board that has not changed doesn't have to be
+      reloaded from the database. TileService invalidates it on every change,
+      and again when the transaction of the change ends.
+    - fingerprint -> figures found, so detection only runs once per board state.
+
+The cache lives in the process memory, boards must only be modified through
+TileService for the fingerprints to stay valid. When other workers can modify
+the same boards, BoardService doesn't use the board id map and reads the
+fingerprint from the database every time; the figures map is always valid.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.models.enums import Colors
+
+COLOR_TO_CODE = {color.value: color.value[0] for color in Colors}
+CODE_TO_COLOR = {code: color for color, code in COLOR_TO_CODE.items()}
+
+DEFAULT_MAX_SIZE = 512
+
+
+def pack_board_table(board_table: list[list[str]]) -> str:
+    """Packs a matrix of colors as a string with one character per tile.
+
+    Args:
+        board_table: matrix of colors of the board.
+
+    Returns:
+        packed colors of the board.
+    """
+    return "".join(COLOR_TO_CODE[color] for row in board_table for color in row)
+
+
+def unpack_board_table(packed: str, columns: int = 6) -> list[list[str]]:
+    """Unpacks a string created by `pack_board_table` into a matrix of colors.
+
+    Args:
+        packed: packed colors of the board.
+        columns: amount of columns of the board.
+
+    Returns:
+        matrix of colors of the board.
+    """
+    colors = [CODE_TO_COLOR[code] for code in packed]
+    return [colors[i:i + columns] for i in range(0, len(colors), columns)]
+
+
+class FiguresCache:
+    """LRU maps of board fingerprints and figures.
+
+    The cache is used from the threads of the database worker pool, every
+    access to the maps holds the lock.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._fingerprints: OrderedDict[int, str] = OrderedDict()
+        self._figures: OrderedDict[str, list] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_fingerprint(self, board_id: int) -> Optional[str]:
+        """Returns the fingerprint of the board or None if it is not cached."""
+        with self._lock:
+            fingerprint = self._fingerprints.get(board_id)
+            if fingerprint is not None:
+                self._fingerprints.move_to_end(board_id)
+            return fingerprint
+
+    def set_fingerprint(self, board_id: int, fingerprint: str) -> None:
+        with self._lock:
+            self._fingerprints[board_id] = fingerprint
+            self._fingerprints.move_to_end(board_id)
+            if len(self._fingerprints) > self.max_size:
+                self._fingerprints.popitem(last=False)
+
+    def get_figures(self, fingerprint: str) -> Optional[list]:
+        """Returns a copy of the figures found for the fingerprint, None on a miss."""
+        with self._lock:
+            figures = self._figures.get(fingerprint)
+            if figures is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._figures.move_to_end(fingerprint)
+        return [copy.copy(figure) for figure in figures]
+
+    def set_figures(self, fingerprint: str, figures: list) -> None:
+        figures = [copy.copy(figure) for figure in figures]
+        with self._lock:
+            self._figures[fingerprint] = figures
+            self._figures.move_to_end(fingerprint)
+            if len(self._figures) > self.max_size:
+                self._figures.popitem(last=False)
+
+    def invalidate_board(self, board_id: int) -> None:
+        """Forgets the fingerprint of a board, it must be called when the board changes."""
+        with self._lock:
+            self._fingerprints.pop(board_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fingerprints.clear()
+            self._figures.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "boards": len(self._fingerprints),
+                "figures": len(self._figures),
+            }
+
+
+figures_cache = FiguresCache()
@@ -0,0 +1,272 @@
+"""
+In-memory index of the matches available in the lobby.
+
+A match is available while it is WAITING and not full. The index keeps:
+    - match id -> MatchOut of the match, already serialized.
+    - max_players -> ids of the matches with that size.
+    - n-gram -> ids of the matches whose lowercase name contains it, for every
+      n-gram of 1 to 3 characters.
+
+A name search of up to 3 characters is a single lookup. Longer searches
+intersect the sets of their trigrams and check the few candidates left, so
+filtering costs about the size of the result instead of the amount of open
+matches.
+
+The index lives in the process memory. It is loaded from the database on first
+use and must be updated by every endpoint that creates, joins, leaves, starts
+or deletes a match. Changes made by other workers are reloaded one match at a
+time with `reload_match`.
+
+Every change increments the version of the index and is kept in a bounded log,
+so lobby clients in delta mode can receive only the changes after the version
+of their last snapshot.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.cruds.match import MatchService
+from app.models.enums import MatchState
+from app.models.models import Matches
+from app.schemas import MatchOut
+
+NGRAM_SIZE = 3
+CHANGES_LIMIT = 256
+
+MATCH_ADDED = "MATCH_ADDED"
+MATCH_UPDATED = "MATCH_UPDATED"
+MATCH_REMOVED = "MATCH_REMOVED"
+
+
+class LobbyChange(NamedTuple):
+    version: int
+    kind: str
+    match: dict
+
+
+def name_ngrams(name: str) -> Set[str]:
+    """Returns every substring of 1 to NGRAM_SIZE characters of the name, in lowercase.
+
+    Args:
+        name: name of the match.
+
+    Returns:
+        set of n-grams of the name.
+    """
+    name = name.lower()
+    return {
+        name[i:i + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for i in range(len(name) - size + 1)
+    }
+
+
+def matches_filter(match: dict, match_name: Optional[str], max_players: Optional[int]) -> bool:
+    """Returns whether a serialized match satisfies the filters of a lobby client."""
+    if match_name and match_name.lower() not in match["match_name"].lower():
+        return False
+    if max_players and match["max_players"] != max_players:
+        return False
+    return True
+
+
+def snapshot_message(version: int, matches: List[dict]) -> dict:
+    """Message with the full list of matches for a client in delta mode."""
+    return {"key": "MATCHES_SNAPSHOT", "payload": {"version": version, "matches": matches}}
+
+
+def change_message(change: LobbyChange) -> dict:
+    """Message with a single change of the lobby for a client in delta mode."""
+    if change.kind == MATCH_REMOVED:
+        payload = {"version": change.version, "match_id": change.match["id"]}
+    else:
+        payload = {"version": change.version, "match": change.match}
+    return {"key": change.kind, "payload": payload}
+
+
+def is_available(match: Matches) -> bool:
+    """Returns whether a match is listed in the lobby."""
+    return (
+        match.state == MatchState.WAITING.value
+        and match.current_players < match.max_players
+    )
+
+
+class LobbyIndex:
+    def __init__(self) -> None:
+        self.loaded = False
+        self.version = 0
+        self._changes: Deque[LobbyChange] = deque(maxlen=CHANGES_LIMIT)
+        self._matches: Dict[int, dict] = {}
+        self._by_max_players: Dict[int, Set[int]] = {}
+        self._by_ngram: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Loads the available matches from the database if the index is empty."""
+        if self.loaded:
+            return
+
+        matches = MatchService(db).get_all_matches(True)
+        with self._lock:
+            if self.loaded:
+                return
+            for match in matches:
+                self._add(match)
+            self.loaded = True
+
+    def update_match(self, match: Matches) -> None:
+        """Adds, updates or removes a match according to its current state.
+
+        Args:
+            match: match that was created or modified.
+        """
+        if not self.loaded:
+            # Loaded in full from the database on first use
+            return
+
+        available = is_available(match)
+        with self._lock:
+            previous = self._remove(match.id)
+            if available:
+                current = self._add(match)
+                if previous is None:
+                    self._record(MATCH_ADDED, current)
+                elif previous != current:
+                    self._record(MATCH_UPDATED, current)
+            elif previous is not None:
+                self._record(MATCH_REMOVED, previous)
+
+    def reload_match(self, match_id: int, db: Session) -> None:
+        """Updates a match from its current row in the database.
+
+        Used when another worker changed the match, keeping the version of
+        the index increasing instead of reloading it in full.
+
+        Args:
+            match_id: id of the match that changed.
+            db: database session.
+        """
+        if not self.loaded:
+            return
+
+        match = db.query(Matches).filter(Matches.id == match_id).one_or_none()
+        if match is None:
+            self.remove_match(match_id)
+        else:
+            self.update_match(match)
+
+    def remove_match(self, match_id: int) -> None:
+        """Removes a match, for example when it is deleted."""
+        with self._lock:
+            previous = self._remove(match_id)
+            if previous is not None:
+                self._record(MATCH_REMOVED, previous)
+
+    def snapshot(self, match_name: Optional[str] = None, max_players: Optional[int] = None) -> Tuple[int, List[dict]]:
+        """Returns the current version together with the result of `search`."""
+        with self._lock:
+            return self.version, self._search(match_name, max_players)
+
+    def changes_since(self, version: Optional[int]) -> Optional[List[LobbyChange]]:
+        """Returns the changes after a version.
+
+        Args:
+            version: version of the last snapshot or change seen by a client.
+
+        Returns:
+            list of changes in order, or None if some of them are no longer in
+            the log and the client needs a new snapshot.
+        """
+        with self._lock:
+            if version is None or version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self._changes or self._changes[0].version > version + 1:
+                return None
+            return [change for change in self._changes if change.version > version]
+
+    def search(self, match_name: Optional[str] = None, max_players: Optional[int] = None) -> List[dict]:
+        """Returns the serialized available matches that satisfy the filters.
+
+        Args:
+            match_name: text the name of the match must contain, ignoring case.
+            max_players: exact amount of players of the match.
+
+        Returns:
+            list of MatchOut dumps, ordered by match id.
+        """
+        with self._lock:
+            return self._search(match_name, max_players)
+
+    def _search(self, match_name: Optional[str], max_players: Optional[int]) -> List[dict]:
+        candidates = None
+        if max_players:
+            candidates = self._by_max_players.get(max_players, set())
+
+        if match_name:
+            query = match_name.lower()
+            grams = [query] if len(query) <= NGRAM_SIZE else {
+                query[i:i + NGRAM_SIZE] for i in range(len(query) - NGRAM_SIZE + 1)
+            }
+            sets = sorted(
+                (self._by_ngram.get(gram, set()) for gram in grams), key=len
+            )
+            if candidates is not None:
+                sets.insert(0, candidates)
+            candidates = set.intersection(*sets)
+            if len(query) > NGRAM_SIZE:
+                candidates = {
+                    match_id for match_id in candidates
+                    if query in self._matches[match_id]["match_name"].lower()
+                }
+
+        if candidates is None:
+            candidates = self._matches.keys()
+
+        return [self._matches[match_id] for match_id in sorted(candidates)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matches.clear()
+            self._by_max_players.clear()
+            self._by_ngram.clear()
+            self._changes.clear()
+            self.version = 0
+            self.loaded = False
+
+    def _record(self, kind: str, match: dict) -> None:
+        self.version += 1
+        self._changes.append(LobbyChange(self.version, kind, match))
+
+    def _add(self, match: Matches) -> dict:
+        serialized = MatchOut.model_validate(match).model_dump()
+        self._matches[match.id] = serialized
+        self._by_max_players.setdefault(match.max_players, set()).add(match.id)
+        for gram in name_ngrams(match.match_name):
+            self._by_ngram.setdefault(gram, set()).add(match.id)
+        return serialized
+
+    def _remove(self, match_id: int) -> Optional[dict]:
+        serialized = self._matches.pop(match_id, None)
+        if serialized is None:
+            return None
+
+        bucket = self._by_max_players[serialized["max_players"]]
+        bucket.discard(match_id)
+        if not bucket:
+            del self._by_max_players[serialized["max_players"]]
+
+        for gram in name_ngrams(serialized["match_name"]):
+            ids = self._by_ngram[gram]
+            ids.discard(match_id)
+            if not ids:
+                del self._by_ngram[gram]
+        return serialized
+
+
+lobby_index = LobbyIndex()
@@ -0,0 +1,160 @@
+"""
+Ejecucion del trabajo bloqueante de la base de datos fuera del event loop.
+
+Los endpoints son `async def` pero SQLAlchemy es sincronico: mientras una
+consulta corre en el event loop ningun websocket del proceso puede enviar ni
+recibir mensajes. `db_worker_pool.run` ejecuta una funcion sincronica en un
+pool acotado de threads y la espera sin bloquear el event loop.
+
+Una sesion de SQLAlchemy no debe usarse desde dos threads a la vez: cada
+request espera a su funcion antes de seguir, por lo que su sesion se usa desde
+un solo thread por vez.
+
+`EventLoopMonitor` mide cuanto tarda el event loop en despertar una tarea
+dormida, que es el tiempo que estuvo bloqueado por codigo sincronico.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+from app.config import DB_QUEUE_LIMIT, DB_WORKERS
+from app.exceptions import WorkerPoolFull
+from app.logger import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DBWorkerPool:
+    """Pool acotado de threads para el trabajo sincronico de la base de datos.
+
+    Attributes:
+        max_workers: cantidad de threads del pool.
+        queue_limit: cantidad de tareas que pueden esperar un thread libre.
+            Si se supera, `run` lanza WorkerPoolFull en lugar de encolar.
+    """
+
+    def __init__(self, max_workers: int = DB_WORKERS, queue_limit: int = DB_QUEUE_LIMIT):
+        self.max_workers = max_workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        """Tareas en ejecucion o esperando un thread."""
+        return self._pending
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="db-worker"
+            )
+        return self._executor
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Ejecuta fn(*args, **kwargs) en el pool y devuelve su resultado.
+
+        Las excepciones de fn se propagan al llamador.
+
+        Raises:
+            WorkerPoolFull: si hay max_workers + queue_limit tareas pendientes.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.queue_limit:
+                self.rejected += 1
+                raise WorkerPoolFull()
+            self._pending += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), partial(fn, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "queue_limit": self.queue_limit,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+
+class EventLoopMonitor:
+    """Mide los bloqueos del event loop.
+
+    Una tarea duerme `interval` segundos en un ciclo; lo que tarde de mas en
+    despertarse es tiempo en el que el event loop estuvo bloqueado.
+
+    Attributes:
+        interval: segundos entre mediciones.
+        threshold: demora a partir de la cual una medicion cuenta como bloqueo.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.01):
+        self.interval = interval
+        self.threshold = threshold
+        self._task: Optional[asyncio.Task] = None
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.stalls = 0
+        self.total_stall = 0.0
+        self.max_stall = 0.0
+
+    def record(self, lag: float):
+        self.samples += 1
+        if lag >= self.threshold:
+            self.stalls += 1
+            self.total_stall += lag
+            self.max_stall = max(self.max_stall, lag)
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.record(time.perf_counter() - start - self.interval)
+
+    def start(self):
+        """Empieza a medir en el event loop actual."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "total_stall_ms": round(self.total_stall * 1000, 3),
+            "max_stall_ms": round(self.max_stall * 1000, 3),
+        }
+
+
+db_worker_pool = DBWorkerPool()
+event_loop_monitor = EventLoopMonitor()
+
+
+async def run_in_db_worker(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Atajo para `db_worker_pool.run`."""
+    return await db_worker_pool.run(fn, *args, **kwargs)
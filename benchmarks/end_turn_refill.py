@@ -0,0 +1,110 @@
+"""
+Benchmark de la reposicion de la mano al terminar un turno.
+
+Compara el camino anterior, que recarga el mazo para cada carta, elige una al
+azar y la actualiza con su propio commit, con el robo desde los mazos mezclados
+al iniciar la partida: una consulta y una actualizacion en bloque por mazo.
+Cada corrida prepara una partida en una base de datos SQLite en un archivo
+temporal y repone la mano completa de un jugador que jugo todas sus cartas.
+
+Uso:
+    python -m benchmarks.end_turn_refill [--runs N] [--players N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from random import randint
+from statistics import mean, median
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.cruds.match_provisioning import MatchProvisioningService
+from app.cruds.movement_card import MovementCardService
+from app.cruds.shape_card import ShapeCardService
+from app.models.models import Base, Matches, MovementCards, Players, ShapeCards
+
+
+def legacy_refill(db, player):
+    """Reposicion de la mano como la hacia finish_turn antes del cambio."""
+    movement_service = MovementCardService(db)
+    for _ in range(3 - len(movement_service.get_movement_card_by_user(player.id))):
+        movements = movement_service.get_movement_cards_without_owner(player.match_id)
+        if not movements:
+            break
+        movement = movements[randint(0, len(movements) - 1)]
+        movement_service.add_movement_card_to_player(player.id, movement.id)
+
+    visible_cards = ShapeCardService(db).get_visible_cards(player.id, True)
+    shape_deck = ShapeCardService(db).get_visible_cards(player.id, False)
+    for _ in range(3 - len(visible_cards)):
+        if not shape_deck:
+            break
+        shape = shape_deck.pop(randint(0, len(shape_deck) - 1))
+        ShapeCardService(db).update_shape_card(shape.id, True, "NOT_BLOCKED")
+
+
+def deck_refill(db, player):
+    hand = MovementCardService(db).get_movement_card_by_user(player.id)
+    MovementCardService(db).draw_movement_cards(player.match_id, player.id, 3 - len(hand))
+    ShapeCardService(db).draw_shape_cards(player.id)
+
+
+def run(refill, players_count):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.sqlite')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+        match = Matches(match_name="Bench", max_players=players_count, is_public=True,
+                        state="STARTED", current_players=players_count)
+        match.players = [
+            Players(player_name=f"Player {i}", is_owner=i == 0, session_token="")
+            for i in range(players_count)
+        ]
+        db.add(match)
+        db.commit()
+        MatchProvisioningService(db).provision_match(match, list(match.players))
+
+        # El jugador uso sus tres movimientos y completo sus tres figuras
+        player = match.players[0]
+        db.query(MovementCards).filter(MovementCards.player_owner == player.id).update(
+            {MovementCards.player_owner: None})
+        db.query(ShapeCards).filter(
+            ShapeCards.player_owner == player.id, ShapeCards.is_visible == True).delete()
+        db.commit()
+
+        statements = []
+        commits = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        event.listen(db, "after_commit", lambda session: commits.append(session))
+
+        start = time.perf_counter()
+        refill(db, player)
+        elapsed = time.perf_counter() - start
+
+        db.close()
+        engine.dispose()
+        return elapsed, len(statements), len(commits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args()
+
+    for name, refill in (("legacy", legacy_refill), ("deck", deck_refill)):
+        results = [run(refill, args.players) for _ in range(args.runs)]
+        times = [elapsed * 1000 for elapsed, _, _ in results]
+        print(
+            f"{name:>6}: queries={results[0][1]:>4}  commits={results[0][2]:>4}  "
+            f"mean={mean(times):8.2f} ms  median={median(times):8.2f} ms  "
+            f"max={max(times):8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de los bloqueos del event loop por el trabajo de la base de datos.
+
+Lanza varias tareas concurrentes que leen y actualizan tableros en SQLite, una
+vez ejecutando las consultas directamente en el event loop y otra vez con
+DBWorkerPool, y muestra el tiempo que el event loop estuvo bloqueado segun
+EventLoopMonitor.
+
+Uso:
+    python -m benchmarks.event_loop_stall [--tasks N] [--iterations N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.cruds.board import BoardService
+from app.cruds.tile import TileService
+from app.models.models import Base, Matches
+from app.workers import DBWorkerPool, EventLoopMonitor
+
+
+def board_work(session_factory, board_id):
+    """Lee el tablero e intercambia dos fichas, como un movimiento parcial."""
+    with session_factory() as db:
+        tile_service = TileService(db)
+        BoardService(db).get_board_table(board_id)
+        tile1 = tile_service.get_tile_by_position(0, 0, board_id)
+        tile2 = tile_service.get_tile_by_position(0, 1, board_id)
+        tile_service.swap_tiles(tile1, tile2)
+
+
+async def run(offload, tasks, iterations):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(
+            f"sqlite:///{os.path.join(directory, 'bench.sqlite')}",
+            connect_args={"check_same_thread": False},
+        )
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        board_ids = []
+        with session_factory() as db:
+            board_service = BoardService(db)
+            for i in range(tasks):
+                match = Matches(match_name=f"Bench {i}", max_players=4, is_public=True,
+                                state="STARTED", current_players=4)
+                db.add(match)
+                db.commit()
+                board = board_service.create_board(match.id)
+                board_service.init_board(board.id)
+                board_ids.append(board.id)
+
+        pool = DBWorkerPool(max_workers=4, queue_limit=tasks)
+        monitor = EventLoopMonitor(interval=0.005, threshold=0.005)
+        monitor.start()
+
+        async def worker(board_id):
+            for _ in range(iterations):
+                if offload:
+                    await pool.run(board_work, session_factory, board_id)
+                else:
+                    board_work(session_factory, board_id)
+                await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(board_id) for board_id in board_ids))
+        elapsed = time.perf_counter() - start
+
+        monitor.stop()
+        pool.shutdown()
+        engine.dispose()
+        return elapsed, monitor.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=25)
+    args = parser.parse_args()
+
+    for name, offload in (("inline", False), ("pool", True)):
+        elapsed, stats = asyncio.run(run(offload, args.tasks, args.iterations))
+        print(
+            f"{name:>6}: total={elapsed * 1000:9.2f} ms  "
+            f"stalls={stats['stalls']:>5}  stall_total={stats['total_stall_ms']:9.2f} ms  "
+            f"max_stall={stats['max_stall_ms']:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
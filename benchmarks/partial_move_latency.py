@@ -0,0 +1,89 @@
+"""
+Benchmark de latencia de los movimientos parciales.
+
+Levanta un worker de uvicorn con una base de datos SQLite en un directorio
+temporal y crea partidas de dos jugadores. Durante un tiempo fijo el jugador de
+turno de cada partida hace un movimiento parcial y lo deshace, una y otra vez,
+y se mide cuanto tarda cada request. Las partidas comparten el worker, por lo
+que la latencia incluye la espera detras de las acciones de las demas.
+
+Uso:
+    python -m benchmarks.partial_move_latency [--matches N] [--duration S]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.sharded_actions import MOVES, current_hand, prepare_match, start_workers
+
+
+async def play(client: httpx.AsyncClient, url: str, match_id: int, hand, stop_at: float, latencies: dict):
+    player_id, card_id, mov_type = hand
+    first, second = MOVES[mov_type]
+    move = {"movement_card": card_id, "tiles": [
+        {"rowIndex": first[0], "columnIndex": first[1]},
+        {"rowIndex": second[0], "columnIndex": second[1]},
+    ]}
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        response = await client.post(f"{url}/matches/{match_id}/partial-move/{player_id}", json=move)
+        latencies["partial-move"].append(time.perf_counter() - start)
+        response.raise_for_status()
+
+        start = time.perf_counter()
+        response = await client.delete(f"{url}/matches/{match_id}/partial-move/{player_id}")
+        latencies["undo"].append(time.perf_counter() - start)
+        response.raise_for_status()
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def run(matches: int, duration: float):
+    latencies = {"partial-move": [], "undo": []}
+    with tempfile.TemporaryDirectory() as directory:
+        urls, processes = start_workers(1, directory)
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                match_ids = [await prepare_match(client, urls[0], i) for i in range(matches)]
+                database = os.path.join(directory, "database_bench.sqlite")
+                hands = [current_hand(database, match_id) for match_id in match_ids]
+
+                start = time.monotonic()
+                await asyncio.gather(*(
+                    play(client, urls[0], match_id, hand, start + duration, latencies)
+                    for match_id, hand in zip(match_ids, hands)
+                ))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--matches", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.matches} partidas, {args.duration:.0f} s, {os.cpu_count()} nucleos")
+    latencies = asyncio.run(run(args.matches, args.duration))
+    for action, values in latencies.items():
+        print(f"{action:>12}: {len(values):6d} requests  "
+              f"p50 {statistics.median(values) * 1000:6.1f} ms  "
+              f"p95 {percentile(values, 0.95) * 1000:6.1f} ms  "
+              f"p99 {percentile(values, 0.99) * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark de acciones de juego por segundo con afinidad de partidas.
+
+Levanta 1, 2, 4 y 8 workers de uvicorn con SHARD_COUNT workers, una base de
+datos SQLite en un directorio temporal y el backplane SQLite. Crea partidas de
+dos jugadores, las inicia y durante un tiempo fijo el jugador de turno de cada
+partida hace un movimiento parcial y lo deshace, una y otra vez. Cada request
+se envia directamente al worker duenio de la partida, como lo haria un
+balanceador que conoce el reparto; los 307 de ShardRoutingMiddleware quedan
+para los clientes que no lo conocen.
+
+El escalamiento depende de los nucleos disponibles: los workers y el cliente
+comparten la maquina, y todas las escrituras van al mismo archivo SQLite.
+
+Uso:
+    python -m benchmarks.sharded_actions [--workers 1 2 4 8] [--matches N] [--duration S]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Un par de fichas valido para cada tipo de carta de movimiento
+MOVES = {
+    "Diagonal": ((0, 0), (2, 2)),
+    "Inverse Diagonal": ((0, 0), (1, 1)),
+    "Line": ((0, 0), (0, 1)),
+    "Line Between": ((0, 0), (0, 2)),
+    "Line Border": ((0, 0), (0, 3)),
+    "L": ((2, 1), (0, 0)),
+    "Inverse L": ((2, 0), (0, 1)),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_workers(count: int, directory: str):
+    urls = [f"http://127.0.0.1:{free_port()}" for _ in range(count)]
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        ENVIRONMENT="bench",
+        SHARD_COUNT=str(count),
+        SHARD_URLS=",".join(urls),
+        WS_BACKPLANE="sqlite",
+        # Con un solo worker nadie mas usa la base de datos
+        SHARED_DATABASE=str(count > 1),
+    )
+    processes = []
+    for index, url in enumerate(urls):
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--log-level", "warning",
+             "--port", url.rsplit(":", 1)[1]],
+            cwd=directory, env=dict(env, SHARD_INDEX=str(index)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+        # El primer worker crea las tablas antes de que arranquen los demas
+        wait_ready(url)
+    return urls, processes
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url + "/", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Worker {url} did not start")
+
+
+async def prepare_match(client: httpx.AsyncClient, lobby_url: str, number: int):
+    response = await client.post(lobby_url + "/matches/", json={
+        "lobby_name": f"Bench {number}", "max_players": 2, "player_name": "Owner"})
+    match_id, owner_id = response.json()["match_id"], response.json()["player_id"]
+    # Los requests de la partida siguen el 307 hasta su duenio
+    await client.post(f"{lobby_url}/matches/{match_id}", json={"player_name": "Guest"})
+    response = await client.patch(f"{lobby_url}/matches/{match_id}/start/{owner_id}")
+    response.raise_for_status()
+    return match_id
+
+
+def current_hand(database: str, match_id: int):
+    """Jugador de turno de una partida y una carta de movimiento de su mano."""
+    with sqlite3.connect(database) as connection:
+        return connection.execute(
+            "SELECT players.id, movementCards.id, movementCards.mov_type "
+            "FROM matches JOIN players ON players.match_id = matches.id "
+            "AND players.turn_order = matches.current_player_turn "
+            "JOIN movementCards ON movementCards.player_owner = players.id "
+            "WHERE matches.id = ? LIMIT 1",
+            (match_id,),
+        ).fetchone()
+
+
+async def play(client: httpx.AsyncClient, url: str, match_id: int, hand, stop_at: float):
+    player_id, card_id, mov_type = hand
+    first, second = MOVES[mov_type]
+    move = {"movement_card": card_id, "tiles": [
+        {"rowIndex": first[0], "columnIndex": first[1]},
+        {"rowIndex": second[0], "columnIndex": second[1]},
+    ]}
+    actions = 0
+    while time.monotonic() < stop_at:
+        response = await client.post(f"{url}/matches/{match_id}/partial-move/{player_id}", json=move)
+        response.raise_for_status()
+        response = await client.delete(f"{url}/matches/{match_id}/partial-move/{player_id}")
+        response.raise_for_status()
+        actions += 2
+    return actions
+
+
+async def run(workers: int, matches: int, duration: float) -> float:
+    with tempfile.TemporaryDirectory() as directory:
+        urls, processes = start_workers(workers, directory)
+        try:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+                match_ids = [await prepare_match(client, urls[0], i) for i in range(matches)]
+                database = os.path.join(directory, "database_bench.sqlite")
+                hands = [current_hand(database, match_id) for match_id in match_ids]
+
+                start = time.monotonic()
+                actions = await asyncio.gather(*(
+                    play(client, urls[match_id % workers], match_id, hand, start + duration)
+                    for match_id, hand in zip(match_ids, hands)
+                ))
+                elapsed = time.monotonic() - start
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+    return sum(actions) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--matches", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{args.matches} partidas, {args.duration:.0f} s por corrida, {os.cpu_count()} nucleos")
+    baseline = None
+    for workers in args.workers:
+        rate = asyncio.run(run(workers, args.matches, args.duration))
+        baseline = baseline or rate
+        print(f"{workers} workers: {rate:8.1f} acciones/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
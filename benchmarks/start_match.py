@@ -0,0 +1,106 @@
+"""
+Benchmark de la preparacion de una partida al iniciarla.
+
+Compara el camino anterior, que crea cada carta y cada ficha con su propio
+commit, con MatchProvisioningService, que hace todo en una sola transaccion.
+Cada corrida usa una base de datos SQLite en un archivo temporal, ya que en
+SQLite cada commit es una escritura sincronizada al disco.
+
+Uso:
+    python -m benchmarks.start_match [--runs N] [--players N]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from random import shuffle
+from statistics import mean, median
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Base, Matches, Players
+from app.cruds.board import BoardService
+from app.cruds.match import MatchService
+from app.cruds.match_provisioning import MatchProvisioningService
+from app.cruds.movement_card import MovementCardService
+from app.cruds.shape_card import ShapeCardService
+from app.models.enums import EasyShapes, HardShapes
+from app.routers.matches import give_movement_card_to_player, give_shape_card_to_player
+from app.utils.utils import MAX_SHAPE_CARDS
+
+
+def legacy_provision(db, match, players):
+    """Preparacion de la partida como la hacia start_match antes del cambio."""
+    MovementCardService(db).create_movement_deck(match.id)
+
+    shapes = [(shape.value, True) for shape in HardShapes] * 2
+    shapes += [(shape.value, False) for shape in EasyShapes] * 2
+    shuffle(shapes)
+    for player in players:
+        for _ in range(int(MAX_SHAPE_CARDS / match.max_players)):
+            shape = shapes.pop()
+            ShapeCardService(db).create_shape_card(shape[0], shape[1], False, player.id)
+
+    board_service = BoardService(db)
+    board = board_service.create_board(match.id)
+    board_service.init_board(board.id)
+    MatchService(db).set_players_order(match)
+
+    for player in players:
+        give_movement_card_to_player(player.id, db)
+        asyncio.run(give_shape_card_to_player(player.id, db, True))
+
+
+def bulk_provision(db, match, players):
+    MatchProvisioningService(db).provision_match(match, players)
+
+
+def run(provision, players_count):
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.sqlite')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+        match = Matches(match_name="Bench", max_players=players_count, is_public=True,
+                        state="STARTED", current_players=players_count)
+        match.players = [
+            Players(player_name=f"Player {i}", is_owner=i == 0, session_token="")
+            for i in range(players_count)
+        ]
+        db.add(match)
+        db.commit()
+        players = list(match.players)
+
+        commits = []
+        event.listen(db, "after_commit", lambda session: commits.append(session))
+
+        start = time.perf_counter()
+        provision(db, match, players)
+        elapsed = time.perf_counter() - start
+
+        db.close()
+        engine.dispose()
+        return elapsed, len(commits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4)
+    args = parser.parse_args()
+
+    for name, provision in (("legacy", legacy_provision), ("bulk", bulk_provision)):
+        results = [run(provision, args.players) for _ in range(args.runs)]
+        times = [elapsed * 1000 for elapsed, _ in results]
+        print(
+            f"{name:>6}: commits={results[0][1]:>4}  "
+            f"mean={mean(times):8.2f} ms  median={median(times):8.2f} ms  "
+            f"max={max(times):8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
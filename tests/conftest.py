@@ -22,6 +22,32 @@ from app.models.models import Base
 from app.database import Base, get_db
 from app.models.models import *
 from app.routers import matches, players
+from app.utils.figures_cache import figures_cache
+from app.turn_scheduler import turn_scheduler
+from app.utils.lobby_index import lobby_index
+from app.movement_journal import movement_journal
+from app.game_state import game_states
+from app.match_actors import match_actors
+
+
+def clear_process_state():
+    figures_cache.clear()
+    lobby_index.clear()
+    turn_scheduler.clear()
+    movement_journal.clear()
+    game_states.clear()
+    match_actors.clear()
+    match_actors.reset_stats()
+
+
+@pytest.fixture(autouse=True)
+def reset_process_state():
+    # Los singletons del modulo viven en memoria del proceso, la base de datos
+    # se recrea y los ids se repiten entre tests: nada debe pasar de un test a
+    # otro (por ejemplo un turno programado que vence en el siguiente)
+    clear_process_state()
+    yield
+    clear_process_state()
 
 
 @pytest.fixture
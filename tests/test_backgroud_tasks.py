@@ -1,5 +1,4 @@
 from unittest.mock import AsyncMock, MagicMock, patch
-from fastapi import BackgroundTasks
 import pytest
 from datetime import datetime, timedelta
 from app.routers.players import turn_timeout
@@ -19,6 +18,5 @@ async def test_turn_timeout_success(mock_manager, mock_movement_service, mock_ti
     mock_match_service.return_value = match
     mock_player_service.return_value.get_player_by_turn.return_value.turn_order = 1
     mock_player_service.return_value.get_player_by_turn.return_value.player_name = "Player1"
-    background_tasks = BackgroundTasks()
-    response = await turn_timeout(match.id, db_session, turn_order, background_tasks)
+    response = await turn_timeout(match.id, turn_order, db_session)
     assert response == None
\ No newline at end of file
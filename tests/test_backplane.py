@@ -0,0 +1,176 @@
+import asyncio
+import json
+import multiprocessing
+from contextlib import nullcontext
+from unittest.mock import patch
+
+import pytest
+
+from app.backplane import REFRESH_LOBBY_EVENT, InProcessBackplane, SQLiteBackplane, create_backplane
+from app.connection_manager import ConnectionManager
+from app.cruds.match import MatchService
+from app.exceptions import GameConnectionDoesNotExist, PlayerNotConnected
+from app.routers import players
+from app.utils.lobby_index import lobby_index
+
+
+class FakeWebSocket:
+    def __init__(self, on_receive=None):
+        self.received = []
+        self.on_receive = on_receive
+
+    async def send_text(self, frame):
+        self.received.append(json.loads(frame))
+        if self.on_receive is not None:
+            self.on_receive(frame)
+
+    async def close(self):
+        pass
+
+
+async def wait_for(condition, timeout=5):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def worker(path, ready, frames):
+    """Worker de otro proceso con el jugador 2 de la partida 1 conectado."""
+    async def run():
+        manager = ConnectionManager(backplane=SQLiteBackplane(path, poll_interval=0.01))
+        manager.create_game_connection(1)
+        done = asyncio.Event()
+
+        def on_receive(frame):
+            frames.put(frame)
+            done.set()
+
+        manager.connect_player_to_game(1, 2, FakeWebSocket(on_receive))
+        manager.start_backplane()
+        ready.set()
+        await asyncio.wait_for(done.wait(), timeout=10)
+        manager.shutdown()
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def backplane_path(tmp_path):
+    return str(tmp_path / "backplane.sqlite")
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_players_in_other_workers(backplane_path):
+    first = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    second = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    first.create_game_connection(1)
+    player1, player2, other_game = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    first.connect_player_to_game(1, 1, player1)
+    # La partida se creo en el primer worker
+    second.connect_player_to_game(1, 2, player2)
+    second.connect_player_to_game(2, 3, other_game)
+    first.start_backplane()
+    second.start_backplane()
+
+    try:
+        await first.broadcast_to_game(1, {"key": "START_MATCH"})
+        await second.send_to_player(1, 1, {"key": "ALLOW_FIGURES"})
+        await wait_for(lambda: player2.received and len(player1.received) == 2)
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+    assert player1.received == [{"key": "START_MATCH"}, {"key": "ALLOW_FIGURES"}]
+    assert player2.received == [{"key": "START_MATCH"}]
+    assert other_game.received == []
+
+
+@pytest.mark.asyncio
+async def test_lobby_broadcast_reaches_other_workers(backplane_path):
+    first = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    second = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    lobby = FakeWebSocket()
+    second.add_anonymous_connection(lobby)
+    second.start_backplane()
+
+    try:
+        await first.broadcast({"key": "MATCHES_LIST", "payload": {"matches": []}})
+        await wait_for(lambda: lobby.received)
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+    assert lobby.received == [{"key": "MATCHES_LIST", "payload": {"matches": []}}]
+
+
+@pytest.mark.asyncio
+async def test_lobby_changes_reach_lobby_of_other_workers(backplane_path, db_session):
+    first = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    second = ConnectionManager(backplane=SQLiteBackplane(backplane_path, poll_interval=0.01))
+    second.subscribe(REFRESH_LOBBY_EVENT, players.refresh_lobby)
+    lobby = FakeWebSocket()
+    second.add_anonymous_connection(lobby)
+    second.start_backplane()
+
+    lobby_index.ensure_loaded(db_session)
+
+    try:
+        # La partida se crea en el primer worker
+        match = MatchService(db_session).create_match("Partida", 4, True, None)
+        with patch("app.routers.players.manager", first):
+            await players.notify_matches_list(db_session, match.id)
+
+        with patch("app.routers.players.manager", second), \
+             patch("app.routers.players.Init_Session", return_value=nullcontext(db_session)):
+            await wait_for(lambda: lobby.received)
+    finally:
+        first.shutdown()
+        second.shutdown()
+
+    assert lobby.received[0]["key"] == "MATCHES_LIST"
+    assert [m["id"] for m in lobby.received[0]["payload"]["matches"]] == [match.id]
+    # El indice se actualiza con la partida que cambio, sin volver a empezar
+    assert lobby_index.version == 1
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_worker_in_other_process(backplane_path):
+    context = multiprocessing.get_context("spawn")
+    ready, frames = context.Event(), context.Queue()
+    process = context.Process(target=worker, args=(backplane_path, ready, frames))
+    process.start()
+    manager = ConnectionManager(backplane=SQLiteBackplane(backplane_path))
+    player1 = FakeWebSocket()
+    try:
+        assert await asyncio.to_thread(ready.wait, 30)
+        manager.create_game_connection(1)
+        manager.connect_player_to_game(1, 1, player1)
+
+        await manager.broadcast_to_game(1, {"key": "PLAYER_LEFT", "payload": {"name": "Player 3"}})
+        frame = await asyncio.to_thread(frames.get, True, 10)
+        await manager.flush()
+    finally:
+        manager.shutdown()
+        process.join(10)
+        if process.is_alive():
+            process.kill()
+
+    assert json.loads(frame) == {"key": "PLAYER_LEFT", "payload": {"name": "Player 3"}}
+    assert player1.received == [json.loads(frame)]
+    assert process.exitcode == 0
+
+
+@pytest.mark.asyncio
+async def test_in_process_backplane_keeps_connection_errors():
+    manager = ConnectionManager(backplane=InProcessBackplane())
+
+    with pytest.raises(GameConnectionDoesNotExist):
+        await manager.broadcast_to_game(1, {"key": "START_MATCH"})
+    manager.create_game_connection(1)
+    with pytest.raises(PlayerNotConnected):
+        await manager.send_to_player(1, 1, {"key": "START_MATCH"})
+
+
+def test_create_unknown_backplane():
+    with pytest.raises(ValueError):
+        create_backplane("redis")
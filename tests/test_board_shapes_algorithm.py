@@ -1,7 +1,9 @@
+import random
+
 import pytest
 
 from app.utils.board_shapes_algorithm import *
-from app.utils.utils import FIGURE_COORDINATES
+from app.utils.utils import ALL_FIGURES, FIGURE_COORDINATES
 
 def test_rotate_90_degrees():
     board_dimensions = (6,6)
@@ -92,3 +94,112 @@ def test_find_board_figures():
         [[Coordinate(1, 0), Coordinate(1, 1),
           Coordinate(1, 2), Coordinate(1, 3)]]
     )
+    assert board_figures[0].color == Colors.BLUE
+
+
+def test_board_to_bitmasks():
+    board = Board([
+        [Colors.RED, Colors.BLUE],
+        [Colors.BLUE, Colors.RED],
+    ])
+
+    assert board_to_bitmasks(board) == {Colors.RED: 0b1001, Colors.BLUE: 0b0110}
+
+
+def test_get_figure_placements():
+    figures = [Figure((Coordinate(3, 0), Coordinate(3, 1)))]
+
+    placements = get_figure_placements(figures, (4, 4))
+
+    # Una linea horizontal de 2 entra en 3 columnas por 4 filas
+    assert len(placements) == 12
+    assert 0b11 in placements
+    assert 0b11 << 14 in placements
+
+
+def test_find_board_figures_bitboard():
+    board = Board([
+        [Colors.RED, Colors.YELLOW, Colors.RED, Colors.RED],
+        [Colors.BLUE, Colors.BLUE, Colors.BLUE, Colors.BLUE],
+        [Colors.RED, Colors.GREEN, Colors.RED, Colors.RED],
+        [Colors.GREEN, Colors.YELLOW, Colors.RED, Colors.RED]
+    ])
+    figures_to_find = frozenset([
+        Figure((Coordinate(3, 0), Coordinate(3, 1),
+               Coordinate(3, 2), Coordinate(3, 3)))
+    ])
+
+    board_figures = find_board_figures_bitboard(board, figures_to_find)
+    assert (
+        board_figures ==
+        [[Coordinate(1, 0), Coordinate(1, 1),
+          Coordinate(1, 2), Coordinate(1, 3)]]
+    )
+    assert board_figures[0].color == Colors.BLUE
+
+
+@pytest.mark.parametrize("colors", [list(Colors), [Colors.RED, Colors.BLUE]])
+def test_find_board_figures_bitboard_matches_bfs(colors):
+    rng = random.Random(1234)
+
+    for _ in range(300):
+        tiles = [rng.choice(colors) for _ in range(36)]
+        board = Board([tiles[i * 6:(i + 1) * 6] for i in range(6)])
+
+        bitboard_figures = find_board_figures_bitboard(board, ALL_FIGURES)
+        bfs_figures = find_board_figures(board, ALL_FIGURES)
+        assert bitboard_figures == bfs_figures
+        assert [figure.color for figure in bitboard_figures] == [figure.color for figure in bfs_figures]
+
+
+def test_figures_tracker_swap():
+    board = Board([
+        [Colors.RED, Colors.RED, Colors.RED, Colors.BLUE],
+        [Colors.BLUE, Colors.BLUE, Colors.BLUE, Colors.RED],
+        [Colors.GREEN, Colors.YELLOW, Colors.GREEN, Colors.YELLOW],
+        [Colors.YELLOW, Colors.GREEN, Colors.YELLOW, Colors.GREEN]
+    ])
+    figures_to_find = frozenset([
+        Figure((Coordinate(3, 0), Coordinate(3, 1),
+               Coordinate(3, 2), Coordinate(3, 3)))
+    ])
+    tracker = FiguresTracker(board, figures_to_find)
+    assert tracker.figures == []
+
+    diff = tracker.swap(Coordinate(0, 3), Coordinate(1, 3))
+
+    line_red = [Coordinate(0, 0), Coordinate(0, 1), Coordinate(0, 2), Coordinate(0, 3)]
+    line_blue = [Coordinate(1, 0), Coordinate(1, 1), Coordinate(1, 2), Coordinate(1, 3)]
+    assert diff == FiguresDiff([line_red, line_blue], [])
+    assert tracker.figures == [line_red, line_blue]
+    assert [figure.color for figure in tracker.figures] == [Colors.RED, Colors.BLUE]
+
+    # Deshacer el intercambio devuelve el diff invertido
+    diff = tracker.swap(Coordinate(0, 3), Coordinate(1, 3))
+    assert diff == FiguresDiff([], [line_red, line_blue])
+    assert tracker.figures == []
+
+
+def test_figures_tracker_matches_full_scan():
+    rng = random.Random(4321)
+    colors = list(Colors)
+
+    for _ in range(100):
+        tiles = [rng.choice(colors) for _ in range(36)]
+        matrix = [tiles[i * 6:(i + 1) * 6] for i in range(6)]
+        tracker = FiguresTracker(Board(matrix), ALL_FIGURES)
+
+        for _ in range(5):
+            first = Coordinate(rng.randrange(6), rng.randrange(6))
+            second = Coordinate(rng.randrange(6), rng.randrange(6))
+            before = find_board_figures(Board(matrix), ALL_FIGURES)
+
+            diff = tracker.swap(first, second)
+            matrix[first.x][first.y], matrix[second.x][second.y] = \
+                matrix[second.x][second.y], matrix[first.x][first.y]
+            after = find_board_figures(Board(matrix), ALL_FIGURES)
+
+            assert tracker.figures == after
+            assert [figure.color for figure in tracker.figures] == [figure.color for figure in after]
+            assert sorted(diff.added) == sorted(f for f in after if f not in before)
+            assert sorted(diff.removed) == sorted(f for f in before if f not in after)
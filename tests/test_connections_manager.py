@@ -1,6 +1,13 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
 import pytest
+from app.connection_manager import ConnectionManager
+from app.connection_writer import DROP_OLDEST
 from app.exceptions import *
 from app.routers.matches import manager as manager2
 
@@ -179,4 +186,203 @@ def test_add_anonymous_connection_remove_anonymous_connection(app):
 def test_create_connection(client):
     with client.websocket_connect("/matches/ws") as websocket:
         data = websocket.receive_json()
-        assert data == {"key": "MATCHES_LIST", "payload": {"matches": []}}
\ No newline at end of file
+        assert data == {"key": "MATCHES_LIST", "payload": {"matches": []}}
+
+class FakeWebSocket:
+    def __init__(self, delay=0, error=None):
+        self.delay = delay
+        self.error = error
+        self.received = []
+        self.closed = False
+
+    async def send_text(self, frame):
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        self.received.append(frame)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_broadcast_to_game_evicts_failed_connections():
+    manager = ConnectionManager(send_timeout=0.05)
+    manager.create_game_connection(1)
+    fast = FakeWebSocket()
+    slow = FakeWebSocket(delay=1)
+    broken = FakeWebSocket(error=RuntimeError("closed"))
+    manager.connect_player_to_game(1, 1, slow)
+    manager.connect_player_to_game(1, 2, broken)
+    manager.connect_player_to_game(1, 3, fast)
+
+    start = time.perf_counter()
+    stats = await manager.broadcast_to_game(1, {"msg": "data"})
+
+    # Solo se encola: no espera a ningun cliente
+    assert time.perf_counter() - start < 0.01
+    assert stats == {"queued": 3, "evicted": 0}
+
+    await manager.flush()
+    await asyncio.sleep(0)
+
+    assert fast.received == ['{"msg":"data"}']
+    assert list(manager._games[1]) == [3]
+    assert slow.closed and broken.closed
+    assert manager.stats()["sent"] == 1
+    assert manager.stats()["failed"] == 1
+    assert manager.stats()["timed_out"] == 1
+    assert manager.stats()["evicted"] == 2
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_evicts_failed_anonymous_connections():
+    manager = ConnectionManager(send_timeout=0.05)
+    alive = FakeWebSocket()
+    broken = FakeWebSocket(error=RuntimeError("closed"))
+    manager.add_anonymous_connection(broken)
+    manager.add_anonymous_connection(alive)
+
+    await manager.broadcast({"msg": "data"})
+    await manager.flush()
+
+    assert [conn["websocket"] for conn in manager._connections.values()] == [alive]
+    assert alive.received == ['{"msg":"data"}']
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_broadcast_to_game_encodes_once():
+    manager = ConnectionManager()
+    manager.create_game_connection(1)
+    websockets = [FakeWebSocket() for _ in range(3)]
+    for player_id, websocket in enumerate(websockets):
+        manager.connect_player_to_game(1, player_id, websocket)
+
+    with patch("app.connection_manager.json.dumps", wraps=json.dumps) as dumps:
+        await manager.broadcast_to_game(1, {"key": "ALLOW_FIGURES", "payload": ["ñ"]})
+        await manager.broadcast_to_game(1, '{"already":"encoded"}')
+    await manager.flush()
+
+    dumps.assert_called_once()
+    for websocket in websockets:
+        assert websocket.received[0] is websockets[0].received[0]
+        assert json.loads(websocket.received[0]) == {"key": "ALLOW_FIGURES", "payload": ["ñ"]}
+        assert websocket.received[1] == '{"already":"encoded"}'
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_send_coalesces_snapshots():
+    manager = ConnectionManager()
+    websocket = FakeWebSocket(delay=0.01)
+    manager.add_anonymous_connection(websocket)
+
+    await manager.send_to_connection(websocket, {"key": "START_MATCH"})
+    await manager.send_to_connection(websocket, {"key": "MATCHES_LIST", "payload": 1})
+    await manager.send_to_connection(websocket, {"key": "PLAYER_JOIN"})
+    await manager.send_to_connection(websocket, {"key": "MATCHES_LIST", "payload": 2})
+    await manager.flush()
+
+    assert [json.loads(frame) for frame in websocket.received] == [
+        {"key": "START_MATCH"},
+        {"key": "PLAYER_JOIN"},
+        {"key": "MATCHES_LIST", "payload": 2},
+    ]
+    assert manager.stats()["coalesced"] == 1
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_queue_overflow_policies():
+    manager = ConnectionManager(queue_size=2)
+    manager.create_game_connection(1)
+    stuck = FakeWebSocket(delay=1)
+    manager.connect_player_to_game(1, 1, stuck)
+
+    for i in range(2):
+        await manager.broadcast_to_game(1, {"key": "MOVE", "payload": i})
+    stats = await manager.broadcast_to_game(1, {"key": "MOVE", "payload": 2})
+    await asyncio.sleep(0.01)
+
+    assert stats == {"queued": 0, "evicted": 1}
+    assert 1 not in manager._games[1]
+    assert stuck.closed
+
+    manager = ConnectionManager(queue_size=2, overflow_policy=DROP_OLDEST)
+    websocket = FakeWebSocket(delay=0.01)
+    manager.add_anonymous_connection(websocket)
+    for i in range(4):
+        await manager.send_to_connection(websocket, {"key": "MOVE", "payload": i})
+    await manager.flush()
+
+    assert [json.loads(frame)["payload"] for frame in websocket.received] == [2, 3]
+    assert manager.stats()["dropped"] == 2
+    manager.shutdown()
+
+
+class FakeLobbyWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.incoming = asyncio.Queue()
+
+    async def receive_json(self):
+        msg = await self.incoming.get()
+        if msg is None:
+            raise WebSocketDisconnect()
+        return msg
+
+
+@pytest.mark.asyncio
+async def test_lobby_connections_stress():
+    manager = ConnectionManager()
+    mismatches = []
+
+    async def lobby_session(i):
+        websocket = FakeLobbyWebSocket()
+        connection_id = manager.add_anonymous_connection(websocket)
+
+        def on_filter_matches(match_name, max_players):
+            if match_name != f"Match {i}" or max_players not in (None, i % 4 + 1):
+                mismatches.append(i)
+            return []
+
+        session = asyncio.create_task(manager.keep_alive_matches(connection_id, on_filter_matches))
+        await websocket.incoming.put({"key": "FILTER_MATCHES", "payload": {"match_name": f"Match {i}"}})
+        # Deja que otras sesiones se conecten y desconecten en el medio
+        await asyncio.sleep(0)
+        await websocket.incoming.put({"key": "FILTER_MATCHES", "payload": {"max_players": i % 4 + 1}})
+        await websocket.incoming.put(None)
+
+        try:
+            await session
+        except WebSocketDisconnect:
+            pass
+        finally:
+            manager.remove_anonymous_connection(websocket)
+        return websocket
+
+    websockets = await asyncio.gather(*(lobby_session(i) for i in range(3000)))
+    await manager.flush()
+
+    assert mismatches == []
+    assert manager._connections == {}
+    assert manager._connection_ids == {}
+    # Las dos respuestas pueden haberse combinado en una sola
+    assert all(1 <= len(websocket.received) <= 2 for websocket in websockets)
+    manager.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_lobby_snapshot_sends_serialized_matches_as_is():
+    manager = ConnectionManager()
+    websocket = FakeWebSocket()
+    connection_id = manager.add_anonymous_connection(websocket)
+    matches = [{"id": 1, "name": "Partida", "max_players": 4, "current_players": 1}]
+
+    await manager.send_lobby_snapshot(manager._connections[connection_id], lambda *_: matches)
+    await manager.flush()
+
+    assert json.loads(websocket.received[0]) == {"key": "MATCHES_LIST", "payload": {"matches": matches}}
+    manager.shutdown()
@@ -0,0 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from unittest.mock import patch
+
+from app.cruds.board import BoardService
+from app.cruds.tile import TileService
+from app.database import unit_of_work
+from app.models.enums import Colors
+from app.models.models import Boards
+from app.sharding import shard_map
+from app.utils.figures_cache import (FiguresCache, figures_cache,
+                                     pack_board_table, unpack_board_table)
+
+
+def create_board(db_session, colors):
+    board = Boards(match_id=1)
+    db_session.add(board)
+    db_session.commit()
+
+    tile_service = TileService(db_session)
+    colors_iter = iter(colors)
+    for i in range(6):
+        for j in range(6):
+            tile_service.create_tile(board.id, next(colors_iter), i, j)
+    return board
+
+
+def test_pack_and_unpack_board_table():
+    colors = cycle([color.value for color in Colors])
+    board_table = [[next(colors) for _ in range(6)] for _ in range(6)]
+
+    packed = pack_board_table(board_table)
+
+    assert packed == "rgby" * 9
+    assert unpack_board_table(packed) == board_table
+
+
+def test_figures_cache_hits_and_misses():
+    cache = FiguresCache(max_size=2)
+
+    assert cache.get_figures("a") is None
+    cache.set_figures("a", [[(0, 0), (0, 1)]])
+    assert cache.get_figures("a") == [[(0, 0), (0, 1)]]
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_figures_cache_is_bounded():
+    cache = FiguresCache(max_size=2)
+
+    cache.set_figures("a", [])
+    cache.set_figures("b", [])
+    cache.get_figures("a")
+    cache.set_figures("c", [])
+
+    # "b" es el menos usado recientemente
+    assert cache.get_figures("b") is None
+    assert cache.get_figures("a") == []
+    assert cache.get_figures("c") == []
+
+
+def test_figures_cache_is_thread_safe():
+    cache = FiguresCache(max_size=8)
+
+    def work(worker):
+        for i in range(2000):
+            key = f"{worker}-{i % 16}"
+            cache.set_fingerprint(i % 16, key)
+            cache.get_fingerprint(i % 16)
+            cache.set_figures(key, [[(0, 0)]])
+            cache.get_figures(key)
+            cache.invalidate_board(i % 16)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(work, range(4)))
+
+    stats = cache.stats()
+    assert stats["figures"] <= 8
+    assert stats["boards"] <= 8
+    assert stats["hits"] + stats["misses"] == 4 * 2000
+
+
+def test_get_formed_figures_uses_cache(db_session):
+    colors = ["red"] * 4 + ["blue", "green"] * 16
+    board = create_board(db_session, colors)
+    board_service = BoardService(db_session)
+
+    figures = board_service.get_formed_figures(board.id)
+    assert figures_cache.stats()["misses"] == 1
+
+    cached = board_service.get_formed_figures(board.id)
+    assert cached == figures
+    assert [figure.color for figure in cached] == [figure.color for figure in figures]
+    assert figures_cache.stats()["hits"] == 1
+
+
+def test_update_tile_position_invalidates_board(db_session):
+    colors = ["red"] * 4 + ["blue", "green"] * 16
+    board = create_board(db_session, colors)
+    board_service = BoardService(db_session)
+    tile_service = TileService(db_session)
+
+    table = board_service.get_board_table(board.id)
+    assert figures_cache.get_fingerprint(board.id) == pack_board_table(table)
+
+    tile1 = tile_service.get_tile_by_position(0, 0, board.id)
+    tile2 = tile_service.get_tile_by_position(0, 4, board.id)
+    tile_service.update_tile_position(tile1.id, 0, 4)
+
+    assert figures_cache.get_fingerprint(board.id) is None
+
+    tile_service.update_tile_position(tile2.id, 0, 0)
+    table = board_service.get_board_table(board.id)
+    assert table[0][:5] == ["blue", "red", "red", "red", "red"]
+
+
+def test_rolled_back_change_is_not_cached(db_session):
+    colors = ["red"] * 4 + ["blue", "green"] * 16
+    board = create_board(db_session, colors)
+    board_service = BoardService(db_session)
+    table = board_service.get_board_table(board.id)
+
+    try:
+        with unit_of_work(db_session):
+            TileService(db_session).swap_positions(board.id, (0, 0), (0, 4))
+            # La misma sesion ve el cambio antes del commit
+            assert board_service.get_board_table(board.id) != table
+            raise ValueError("Error")
+    except ValueError:
+        pass
+
+    assert figures_cache.get_fingerprint(board.id) is None
+    assert board_service.get_board_table(board.id) == table
+
+
+def test_board_is_not_cached_with_shared_database(db_session):
+    colors = ["red"] * 4 + ["blue", "green"] * 16
+    board = create_board(db_session, colors)
+
+    with patch.object(shard_map, "shared", True):
+        table = BoardService(db_session).get_board_table(board.id)
+        assert figures_cache.get_fingerprint(board.id) is None
+
+        # Un tablero cacheado antes de que otro worker lo cambiara
+        TileService(db_session).swap_positions(board.id, (0, 0), (0, 4))
+        figures_cache.set_fingerprint(board.id, pack_board_table(table))
+
+        assert BoardService(db_session).get_board_table(board.id) != table
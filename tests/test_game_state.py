@@ -0,0 +1,242 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.cruds.board import BoardService
+from app.game_state import GameState, game_states
+from app.models.models import Matches, MovementCards, Players
+from app.movement_journal import movement_journal
+from app.sharding import shard_map
+from app.utils.board_shapes_algorithm import Coordinate
+
+# Un par de fichas valido para cada tipo de carta de movimiento
+MOVES = {
+    "Diagonal": ((0, 0), (2, 2)),
+    "Inverse Diagonal": ((0, 0), (1, 1)),
+    "Line": ((0, 0), (0, 1)),
+    "Line Between": ((0, 0), (0, 2)),
+    "Line Border": ((0, 0), (0, 3)),
+    "L": ((2, 1), (0, 0)),
+    "Inverse L": ((2, 0), (0, 1)),
+}
+
+
+@pytest.fixture
+def started_match(client, db_session):
+    response = client.post("/matches/", json={"lobby_name": "Partida", "max_players": 2, "player_name": "Player1"})
+    match_id = response.json()["match_id"]
+    owner_id = response.json()["player_id"]
+    client.post(f"/matches/{match_id}", json={"player_name": "Player2"})
+    with patch("app.routers.matches.manager.send_to_player", new_callable=AsyncMock):
+        response = client.patch(f"/matches/{match_id}/start/{owner_id}")
+    assert response.status_code == 200
+    return db_session.query(Matches).filter(Matches.id == match_id).one()
+
+
+def current_player(match: Matches, db_session) -> Players:
+    return db_session.query(Players).filter(
+        Players.match_id == match.id, Players.turn_order == match.current_player_turn).one()
+
+
+def partial_move(client, match: Matches, player: Players, card: MovementCards):
+    first, second = MOVES[card.mov_type]
+    return client.post(f"/matches/{match.id}/partial-move/{player.id}", json={
+        "movement_card": card.id,
+        "tiles": [{"rowIndex": first[0], "columnIndex": first[1]},
+                  {"rowIndex": second[0], "columnIndex": second[1]}],
+    })
+
+
+def card_owner(card: MovementCards, db_session):
+    return db_session.query(MovementCards.player_owner).filter(MovementCards.id == card.id).scalar()
+
+
+def swapped(board, first, second):
+    board = [list(row) for row in board]
+    (x1, y1), (x2, y2) = first, second
+    board[x1][y1], board[x2][y2] = board[x2][y2], board[x1][y1]
+    return board
+
+
+def db_board(match: Matches, db_session):
+    db_session.expire_all()
+    return BoardService(db_session).get_board_table(match.board.id)
+
+
+@pytest.fixture
+def played_move(started_match, client, db_session):
+    player = current_player(started_match, db_session)
+    card = db_session.query(MovementCards).filter(MovementCards.player_owner == player.id).first()
+    board = db_board(started_match, db_session)
+    with patch("app.routers.players.manager.broadcast_to_game", new_callable=AsyncMock):
+        assert partial_move(client, started_match, player, card).status_code == 200
+    return player, card, board
+
+
+def test_partial_move_is_kept_in_memory(started_match, played_move, db_session):
+    player, card, board = played_move
+    state = game_states.get(started_match.id)
+
+    assert state.dirty
+    assert state.card_owners[card.id] is None
+    assert state.board == swapped(board, *MOVES[card.mov_type])
+    # La base de datos sigue en el ultimo checkpoint
+    assert db_board(started_match, db_session) == board
+    assert card_owner(card, db_session) == player.id
+    assert movement_journal.entries(started_match.board.id) == []
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_persists_moves(started_match, played_move, db_session):
+    player, card, board = played_move
+    state = game_states.get(started_match.id)
+
+    await game_states.checkpoint(started_match.id, db_session)
+
+    assert not state.dirty
+    assert db_board(started_match, db_session) == state.board
+    assert card_owner(card, db_session) is None
+    assert movement_journal.entries(started_match.board.id) == state.journal
+
+    # Deshacer despues del checkpoint tambien se guarda
+    state.undo(player.id)
+    await game_states.checkpoint(started_match.id, db_session, release=True)
+
+    assert game_states.get(started_match.id) is None
+    assert db_board(started_match, db_session) == board
+    assert card_owner(card, db_session) == player.id
+    assert movement_journal.entries(started_match.board.id) == []
+
+
+@pytest.mark.asyncio
+async def test_crash_after_checkpoint_leaves_no_stale_journal(started_match, played_move, db_session):
+    player, card, _ = played_move
+    state = game_states.get(started_match.id)
+    await game_states.checkpoint(started_match.id, db_session)
+
+    state.undo(player.id)
+    other_card = next(card_id for card_id, _ in state.hand(player.id) if card_id != card.id)
+    first, second = MOVES[state.card_types[other_card]]
+    state.move(Coordinate(*first), Coordinate(*second), other_card)
+
+    # El servidor se cae despues de guardar el tablero y antes del historial
+    replace = movement_journal.replace
+    calls = []
+
+    def crash_on_second_call(board_id, entries):
+        calls.append(entries)
+        if len(calls) == 2:
+            raise RuntimeError("crash")
+        replace(board_id, entries)
+
+    with patch.object(movement_journal, "replace", side_effect=crash_on_second_call):
+        with pytest.raises(RuntimeError):
+            await game_states.checkpoint(started_match.id, db_session)
+
+    # El primer movimiento ya se deshizo en el tablero guardado: no puede
+    # quedar en el historial
+    assert db_board(started_match, db_session) == state.board
+    assert movement_journal.entries(started_match.board.id) == []
+
+
+@pytest.mark.asyncio
+async def test_restart_resumes_from_last_checkpoint(started_match, played_move, db_session):
+    player, card, board = played_move
+
+    # El servidor se cae antes del checkpoint
+    game_states.clear()
+    state = await game_states.load(started_match.id, db_session)
+
+    assert state.board == board
+    assert state.card_owners[card.id] == player.id
+    assert state.journal == []
+
+
+def test_match_info_comes_from_memory(started_match, played_move, client, db_session):
+    player, card, board = played_move
+    state = game_states.get(started_match.id)
+    match_id, board_id, token = started_match.id, started_match.board.id, player.session_token
+
+    with patch("app.routers.matches.manager.send_to_player", new_callable=AsyncMock) as mock_send:
+        response = client.get(f"/matches/{match_id}/player/{player.id}",
+                              headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    messages = {call.args[2]["key"]: call.args[2]["payload"] for call in mock_send.await_args_list}
+    info = messages["GET_PLAYER_MATCH_INFO"]
+    assert info["board"] == state.board
+    assert info["last_movements"] == [[card.id, card.mov_type]]
+    assert (card.id, card.mov_type) in messages["GET_MOVEMENT_CARD"]["movement_card"]
+    # Pedir la informacion no guarda el estado
+    assert state.dirty
+    assert game_states.get(match_id) is state
+    assert movement_journal.entries(board_id) == []
+
+
+def test_end_turn_undoes_moves_in_memory(started_match, played_move, client, db_session):
+    player, card, board = played_move
+
+    with patch("app.routers.players.manager.broadcast_to_game", new_callable=AsyncMock), \
+         patch("app.routers.players.sleep", new_callable=AsyncMock), \
+         patch("app.routers.players.give_shape_card_to_player", new_callable=AsyncMock), \
+         patch("app.routers.players.notify_movement_card_to_player", new_callable=AsyncMock) as mock_notify:
+        response = client.patch(f"/matches/{started_match.id}/end-turn/{player.id}")
+
+    assert response.status_code == 200
+    assert (card.id, card.mov_type) in mock_notify.await_args.args[2]
+    assert game_states.get(started_match.id) is None
+    assert db_board(started_match, db_session) == board
+    assert card_owner(card, db_session) == player.id
+    current_turn = db_session.query(Matches.current_player_turn).filter(
+        Matches.id == started_match.id).scalar()
+    assert current_turn != player.turn_order
+
+
+def test_shared_database_saves_each_action(started_match, client, db_session):
+    player = current_player(started_match, db_session)
+    card = db_session.query(MovementCards).filter(MovementCards.player_owner == player.id).first()
+    match_id, board_id, player_id, card_id = started_match.id, started_match.board.id, player.id, card.id
+    move = MOVES[card.mov_type]
+    board = db_board(started_match, db_session)
+
+    def saved_board():
+        db_session.expire_all()
+        return BoardService(db_session).get_board_table(board_id)
+
+    def saved_owner():
+        return db_session.query(MovementCards.player_owner).filter(MovementCards.id == card_id).scalar()
+
+    with patch.object(shard_map, "shared", True), \
+         patch("app.routers.players.manager.broadcast_to_game", new_callable=AsyncMock):
+        assert partial_move(client, started_match, player, card).status_code == 200
+
+        # Otro worker puede atender la proxima accion: nada queda en memoria
+        assert game_states.get(match_id) is None
+        assert saved_board() == swapped(board, *move)
+        assert saved_owner() is None
+        assert len(movement_journal.entries(board_id)) == 1
+
+        response = client.delete(f"/matches/{match_id}/partial-move/{player_id}")
+
+    assert response.status_code == 200
+    assert game_states.get(match_id) is None
+    assert saved_board() == board
+    assert saved_owner() == player_id
+    assert movement_journal.entries(board_id) == []
+
+
+def test_move_and_undo_leave_no_changes():
+    board = [["red", "blue", "green", "yellow", "red", "blue"] for _ in range(6)]
+    state = GameState(1, 1, 1, None, {}, board, {1: "Line"}, {1: 7}, [])
+
+    entry, _ = state.move(Coordinate(0, 0), Coordinate(0, 1), 1)
+
+    assert entry.tile1 == Coordinate(0, 1) and entry.tile2 == Coordinate(0, 0)
+    assert state.changes() == ({(0, 0): "blue", (0, 1): "red"}, {1: None})
+    assert state.hand(7) == []
+
+    state.undo(7)
+
+    assert state.changes() == ({}, {})
+    assert state.hand(7) == [(1, "Line")]
+    assert not state.dirty
@@ -0,0 +1,169 @@
+from unittest.mock import patch
+
+from app.cruds.match import MatchService
+from app.models.models import Matches
+from app.utils.lobby_index import (
+    MATCH_ADDED,
+    MATCH_REMOVED,
+    LobbyIndex,
+    change_message,
+    lobby_index,
+    name_ngrams,
+)
+
+
+def test_name_ngrams():
+    assert name_ngrams("AbC") == {"a", "b", "c", "ab", "bc", "abc"}
+
+
+def test_search_by_name_and_max_players(db_session):
+    db_session.add_all([
+        Matches(match_name="Partida de Ana", max_players=2, is_public=True, state="WAITING", current_players=1),
+        Matches(match_name="ana y beto", max_players=4, is_public=True, state="WAITING", current_players=1),
+        Matches(match_name="Torneo", max_players=4, is_public=True, state="WAITING", current_players=1),
+        Matches(match_name="Ana llena", max_players=2, is_public=True, state="WAITING", current_players=2),
+        Matches(match_name="Ana empezada", max_players=3, is_public=True, state="STARTED", current_players=1),
+    ])
+    db_session.commit()
+    index = LobbyIndex()
+    index.ensure_loaded(db_session)
+
+    def names(matches):
+        return [match["match_name"] for match in matches]
+
+    assert names(index.search()) == ["Partida de Ana", "ana y beto", "Torneo"]
+    assert names(index.search("ANA")) == ["Partida de Ana", "ana y beto"]
+    assert names(index.search("a", 4)) == ["ana y beto"]
+    assert names(index.search("de ana")) == ["Partida de Ana"]
+    # Tiene los trigramas de "neo t" pero no el texto
+    assert names(index.search("neo t")) == []
+    assert names(index.search(max_players=3)) == []
+
+
+def test_update_and_remove_match(db_session):
+    match = Matches(match_name="Sala", max_players=2, is_public=True, state="WAITING", current_players=1)
+    db_session.add(match)
+    db_session.commit()
+    index = LobbyIndex()
+    index.ensure_loaded(db_session)
+    assert len(index.search("sal")) == 1
+
+    match.match_name = "Otra"
+    index.update_match(match)
+    assert index.search("sal") == []
+    assert index.search("otr")[0]["id"] == match.id
+
+    match.current_players = 2
+    index.update_match(match)
+    assert index.search() == []
+    assert index._by_ngram == {} and index._by_max_players == {}
+
+    match.current_players = 1
+    index.update_match(match)
+    index.remove_match(match.id)
+    assert index.search() == []
+
+
+def test_endpoints_keep_index_updated(client, db_session):
+    lobby_index.ensure_loaded(db_session)
+    response = client.post("/matches/", json={
+        "lobby_name": "Sala Nueva", "max_players": 2, "is_public": True,
+        "player_name": "Owner", "token": ""
+    })
+    match_id = response.json()["match_id"]
+
+    with patch("app.utils.lobby_index.MatchService.get_all_matches",
+               wraps=MatchService(db_session).get_all_matches) as mock_get_all_matches:
+        assert [match["id"] for match in lobby_index.search("nueva")] == [match_id]
+
+        response = client.post(f"/matches/{match_id}", json={"player_name": "Guest"})
+        player_id = response.json()["player_id"]
+        assert lobby_index.search("nueva") == []
+
+        client.delete(f"/matches/{match_id}/left/{player_id}")
+        assert lobby_index.search("nueva")[0]["current_players"] == 1
+
+    mock_get_all_matches.assert_not_called()
+
+
+def test_changes_since(db_session):
+    match = Matches(match_name="Sala", max_players=2, is_public=True, state="WAITING", current_players=1)
+    db_session.add(match)
+    db_session.commit()
+    index = LobbyIndex()
+    index.ensure_loaded(db_session)
+    version, matches = index.snapshot()
+    assert version == 0 and len(matches) == 1
+
+    index.update_match(match)
+    assert index.changes_since(version) == []
+
+    match.current_players = 2
+    index.update_match(match)
+    changes = index.changes_since(version)
+    assert [(change.version, change.kind) for change in changes] == [(1, MATCH_REMOVED)]
+    assert change_message(changes[0]) == {
+        "key": MATCH_REMOVED, "payload": {"version": 1, "match_id": match.id}
+    }
+
+    with patch("app.utils.lobby_index.CHANGES_LIMIT", 2):
+        index = LobbyIndex()
+    index.ensure_loaded(db_session)
+    for current_players in (1, 2, 1):
+        match.current_players = current_players
+        index.update_match(match)
+    assert [change.kind for change in index.changes_since(1)] == [MATCH_REMOVED, MATCH_ADDED]
+    # El primer cambio ya no esta en el registro: hace falta un snapshot
+    assert index.changes_since(0) is None
+
+
+def test_reload_match_changed_by_other_worker(db_session):
+    index = LobbyIndex()
+    index.ensure_loaded(db_session)
+    version, _ = index.snapshot()
+
+    # Otro worker crea la partida y despues la borra
+    match = MatchService(db_session).create_match("Sala", 2, True, None)
+    index.reload_match(match.id, db_session)
+    assert [match["id"] for match in index.search("sal")] == [match.id]
+
+    MatchService(db_session).delete_match(match.id)
+    index.reload_match(match.id, db_session)
+    assert index.search() == []
+
+    changes = index.changes_since(version)
+    assert [(change.version, change.kind) for change in changes] == [
+        (version + 1, MATCH_ADDED), (version + 2, MATCH_REMOVED)
+    ]
+
+
+def test_delta_lobby_connection(client):
+    def create_match(name):
+        return client.post("/matches/", json={
+            "lobby_name": name, "max_players": 2, "is_public": True,
+            "player_name": "Owner", "token": ""
+        }).json()["match_id"]
+
+    with client.websocket_connect("/matches/ws?mode=delta") as websocket:
+        snapshot = websocket.receive_json()
+        assert snapshot == {"key": "MATCHES_SNAPSHOT", "payload": {"version": 0, "matches": []}}
+
+        websocket.send_json({"key": "FILTER_MATCHES", "payload": {"match_name": "sala"}})
+        assert websocket.receive_json()["key"] == "MATCHES_SNAPSHOT"
+
+        create_match("Otra partida")
+        match_id = create_match("Sala de Ana")
+        event = websocket.receive_json()
+        assert event["key"] == MATCH_ADDED
+        assert event["payload"]["version"] == 2
+        assert event["payload"]["match"]["id"] == match_id
+
+        client.post(f"/matches/{match_id}", json={"player_name": "Guest"})
+        assert websocket.receive_json() == {
+            "key": MATCH_REMOVED, "payload": {"version": 3, "match_id": match_id}
+        }
+
+        websocket.send_json({"key": "RESYNC", "payload": {}})
+        assert websocket.receive_json() == {
+            "key": "MATCHES_SNAPSHOT", "payload": {"version": 3, "matches": []}
+        }
@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+from app.match_actors import MatchActors, match_actors, serialized_by_match
+
+
+async def step(log, name, delay=0.01):
+    log.append(f"{name} start")
+    await asyncio.sleep(delay)
+    log.append(f"{name} end")
+    return name
+
+
+@pytest.mark.asyncio
+async def test_actions_of_a_match_run_in_order():
+    actors = MatchActors()
+    log = []
+
+    results = await asyncio.gather(
+        actors.submit(1, step, log, "first"),
+        actors.submit(1, step, log, "second"),
+        actors.submit(1, step, log, "third"),
+    )
+
+    assert results == ["first", "second", "third"]
+    assert log == ["first start", "first end", "second start", "second end",
+                   "third start", "third end"]
+    assert actors.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_actions_of_different_matches_run_concurrently():
+    actors = MatchActors()
+    log = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(actors.submit(match_id, step, log, match_id, 0.1) for match_id in range(5)))
+
+    assert time.perf_counter() - start < 0.3
+
+
+@pytest.mark.asyncio
+async def test_failed_action_does_not_stop_the_actor():
+    actors = MatchActors()
+    log = []
+
+    async def fail():
+        raise ValueError("invalid movement")
+
+    failed, done = await asyncio.gather(
+        actors.submit(1, fail), actors.submit(1, step, log, "next"), return_exceptions=True
+    )
+
+    assert isinstance(failed, ValueError)
+    assert done == "next"
+
+
+@pytest.mark.asyncio
+async def test_nested_action_of_the_same_match_runs_inline():
+    actors = MatchActors()
+    log = []
+
+    async def outer():
+        return await actors.submit(1, step, log, "inner")
+
+    assert await asyncio.wait_for(actors.submit(1, outer), timeout=1) == "inner"
+    assert actors.stats()["inline"] == 1
+
+
+@pytest.mark.asyncio
+async def test_serialized_by_match_uses_match_id_argument():
+    log = []
+
+    @serialized_by_match
+    async def action(player_id: int, match_id: int):
+        await step(log, f"{match_id}-{player_id}")
+        return match_id
+
+    results = await asyncio.gather(action(1, 7), action(player_id=2, match_id=7))
+
+    assert results == [7, 7]
+    assert log == ["7-1 start", "7-1 end", "7-2 start", "7-2 end"]
+    assert match_actors.stats()["active"] == 0
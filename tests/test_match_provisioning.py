@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import event
+from unittest.mock import patch
+
+from app.config import PACKED_STORAGE
+from app.cruds.match_provisioning import MatchProvisioningService
+from app.models.models import Boards, Matches, MovementCards, Players, ShapeCards, Tiles
+
+
+def create_match(db_session, players_count):
+    match = Matches(match_name="Match", max_players=players_count, is_public=True,
+                    state="STARTED", current_players=players_count)
+    match.players = [
+        Players(player_name=f"Player {i}", is_owner=i == 0, session_token="")
+        for i in range(players_count)
+    ]
+    db_session.add(match)
+    db_session.commit()
+    return match
+
+
+def count_commits(db_session):
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(session))
+    return commits
+
+
+def test_provision_match(db_session):
+    match = create_match(db_session, 4)
+    commits = count_commits(db_session)
+
+    board = MatchProvisioningService(db_session).provision_match(match, match.players)
+
+    assert len(commits) == 1
+    assert db_session.query(Tiles).filter(Tiles.board_id == board.id).count() == 36
+    assert sorted(player.turn_order for player in match.players) == [1, 2, 3, 4]
+    assert match.current_player_turn == 1
+
+    movement_cards = db_session.query(MovementCards).filter(MovementCards.match_id == match.id).all()
+    assert len(movement_cards) == 49
+    assert len([card for card in movement_cards if card.player_owner is None]) == 49 - 4 * 3
+    assert sorted(card.deck_position for card in movement_cards) == list(range(49))
+
+    for player in match.players:
+        cards = db_session.query(ShapeCards).filter(ShapeCards.player_owner == player.id).all()
+        assert len(cards) == 12
+        assert len([card for card in cards if card.is_visible]) == 3
+        assert len([card for card in player.movement_cards]) == 3
+
+
+def test_provision_match_packed(db_session):
+    match = create_match(db_session, 2)
+
+    with patch("app.config.BOARD_STORAGE", PACKED_STORAGE):
+        board = MatchProvisioningService(db_session).provision_match(match, match.players)
+
+    assert len(board.packed_tiles) == 36
+    assert db_session.query(Tiles).count() == 0
+
+
+def test_provision_match_rollback(db_session):
+    match = create_match(db_session, 2)
+
+    with patch("app.cruds.match_provisioning.random_board_colors", side_effect=ValueError), \
+            pytest.raises(ValueError):
+        MatchProvisioningService(db_session).provision_match(match, match.players)
+
+    assert db_session.query(Boards).count() == 0
+    assert db_session.query(MovementCards).count() == 0
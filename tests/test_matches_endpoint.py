@@ -1,3 +1,5 @@
+import asyncio
+import json
 from random import seed
 from unittest import mock
 import pytest
@@ -13,9 +15,11 @@ from app.cruds.movement_card import MovementCardService
 from app.models import Matches, Players, MovementCards
 from app.connection_manager import manager
 from app.models.models import Boards, Tiles
+from app.routers.matches import start_match
 from app.routers.players import (give_movement_card_to_player, 
                                  notify_movement_card_to_player, 
-                                 give_shape_card_to_player)
+                                 give_shape_card_to_player,
+                                 notify_matches_list)
 
 def test_create_match(client, db_session):
     response = client.post(
@@ -98,7 +102,7 @@ def test_join_match_with_incorrect_password(client):
 
 def test_start_match_success(client, load_matches):
     manager.create_game_connection(1)
-    with client.websocket_connect("/matches/1/ws/1") as ws1, client.websocket_connect("/matches/1/ws/2") as ws2, patch("app.routers.players.turn_timeout") as mock_turn_timeout:
+    with client.websocket_connect("/matches/1/ws/1") as ws1, client.websocket_connect("/matches/1/ws/2") as ws2, patch("app.routers.matches.schedule_turn_timeout") as mock_schedule_turn_timeout:
         response = client.patch("/matches/1/start/1")
         assert response.status_code == 200
         data = ws1.receive_json()
@@ -144,8 +148,7 @@ async def test_give_shape_card_to_player_initial():
 
     player = MagicMock(id=player_id, player_name="Player1", turn_order=1, match_id=1)
     shape_card_service = MagicMock()
-    shape_card_service.get_visible_cards.return_value = []
-    shape_card_service.get_visible_cards.return_value = [MagicMock(id=1, shape_type="circle")]
+    shape_card_service.draw_shape_cards.return_value = [MagicMock(id=1, shape_type="circle")]
 
     with patch('app.routers.players.PlayerService.get_player_by_id', return_value=player), \
          patch('app.routers.players.ShapeCardService', return_value=shape_card_service), \
@@ -153,7 +156,7 @@ async def test_give_shape_card_to_player_initial():
         
         await give_shape_card_to_player(player_id, db_session, is_init)
         
-        shape_card_service.update_shape_card.assert_called_once()
+        shape_card_service.draw_shape_cards.assert_called_once_with(player_id)
         mock_broadcast_to_game.assert_not_called()
 
 @pytest.mark.asyncio
@@ -164,8 +167,7 @@ async def test_give_shape_card_to_player_non_initial():
 
     player = MagicMock(id=player_id, player_name="Player1", turn_order=1, match_id=1)
     shape_card_service = MagicMock()
-    shape_card_service.get_visible_cards.return_value = []
-    shape_card_service.get_visible_cards.return_value = [MagicMock(id=1, shape_type="circle")]
+    shape_card_service.draw_shape_cards.return_value = [MagicMock(id=1, shape_type="circle")]
 
     with patch('app.routers.players.PlayerService.get_player_by_id', return_value=player), \
          patch('app.routers.players.ShapeCardService', return_value=shape_card_service), \
@@ -173,8 +175,10 @@ async def test_give_shape_card_to_player_non_initial():
         
         await give_shape_card_to_player(player_id, db_session, is_init)
         
-        shape_card_service.update_shape_card.assert_called_once()
-        mock_broadcast_to_game.assert_called_once()
+        shape_card_service.draw_shape_cards.assert_called_once_with(player_id)
+        mock_broadcast_to_game.assert_called_once_with(1, {
+            "key": "PLAYER_RECEIVE_SHAPE_CARD",
+            "payload": [{"player": "Player1", "turn_order": 1, "shape_cards": [(1, "circle")]}]})
     
 def test_give_movement_card_to_player_enough_cards():
     db_session = MagicMock(spec=Session)
@@ -184,13 +188,12 @@ def test_give_movement_card_to_player_enough_cards():
     movement_card = MagicMock(id=1, mov_type="move")
 
     with patch('app.routers.matches.PlayerService.get_player_by_id', return_value=player), \
-         patch('app.routers.matches.MovementCardService.get_movement_cards_without_owner', return_value=[movement_card] * 3), \
-         patch('app.routers.matches.MovementCardService.add_movement_card_to_player') as mock_add_movement_card_to_player:
+         patch('app.routers.matches.MovementCardService.draw_movement_cards', return_value=[movement_card] * 3) as mock_draw_movement_cards:
         
         movements_given = give_movement_card_to_player(player_id, db_session)
         
         assert len(movements_given) == 3
-        mock_add_movement_card_to_player.assert_called_with(player_id, movement_card.id)
+        mock_draw_movement_cards.assert_called_once_with(1, player_id, 3)
 
 def test_give_movement_card_to_player_no_cards():
     db_session = MagicMock(spec=Session)
@@ -200,13 +203,11 @@ def test_give_movement_card_to_player_no_cards():
     movement_card = MagicMock(id=1, mov_type="move")
 
     with patch('app.routers.matches.PlayerService.get_player_by_id', return_value=player), \
-            patch('app.routers.matches.MovementCardService.get_movement_cards_without_owner', return_value=[]), \
-            patch('app.routers.matches.MovementCardService.add_movement_card_to_player') as mock_add_movement_card_to_player:
+            patch('app.routers.matches.MovementCardService.draw_movement_cards', return_value=[]):
         
         movements_given = give_movement_card_to_player(player_id, db_session)
         
         assert len(movements_given) == 0
-        mock_add_movement_card_to_player.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_start_match_success2(client, db_session):
@@ -218,20 +219,80 @@ async def test_start_match_success2(client, db_session):
 
     with patch('app.routers.matches.MatchService.get_match_by_id', return_value=match), \
          patch('app.routers.matches.PlayerService.get_player_by_id', return_value=player), \
-         patch('app.routers.matches.MovementCardService.create_movement_deck'), \
-         patch('app.routers.matches.ShapeCardService.create_shape_card'), \
-         patch('app.routers.matches.BoardService.create_board', return_value=MagicMock(id=1)), \
-         patch('app.routers.matches.BoardService.init_board'), \
-         patch('app.routers.matches.MatchService.set_players_order'), \
+         patch('app.routers.matches.PlayerService.get_players_by_match', return_value=match.players), \
+         patch('app.routers.matches.MatchProvisioningService.provision_match') as mock_provision_match, \
          patch('app.routers.matches.manager.send_to_player', new_callable=AsyncMock) as mock_send_to_player, \
-         patch('app.routers.matches.give_movement_card_to_player'), \
-         patch('app.routers.matches.give_shape_card_to_player', new_callable=AsyncMock), \
-         patch("app.routers.matches.turn_timeout") as turn_timeout:
+         patch("app.routers.matches.schedule_turn_timeout") as mock_schedule_turn_timeout:
 
         response = client.patch(f"/matches/{match_id}/start/{player_id}")
         assert response.status_code == status.HTTP_200_OK
 
         # Verificar que el estado del match se haya actualizado
         assert match.state == "STARTED"
+        mock_provision_match.assert_called_once_with(match, match.players)
+        assert mock_send_to_player.await_count == len(match.players)
+        mock_schedule_turn_timeout.assert_called_once_with(match_id, match.current_player_turn, match.turn_deadline)
 
-        
\ No newline at end of file
+        
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_provision_once(db_session):
+    match = MagicMock(id=1, current_players=2, max_players=2, state="WAITING", players=[MagicMock(id=1), MagicMock(id=2)])
+    player = MagicMock(id=1, is_owner=True, match_id=1)
+
+    with patch('app.routers.matches.MatchService.get_match_by_id', return_value=match), \
+         patch('app.routers.matches.PlayerService.get_player_by_id', return_value=player), \
+         patch('app.routers.matches.PlayerService.get_players_by_match', return_value=match.players), \
+         patch('app.routers.matches.MatchProvisioningService.provision_match') as mock_provision_match, \
+         patch('app.routers.matches.manager.send_to_player', new_callable=AsyncMock), \
+         patch("app.routers.matches.notify_matches_list", new_callable=AsyncMock), \
+         patch("app.routers.matches.schedule_turn_timeout") as mock_schedule_turn_timeout:
+        # El duenio hace doble click en empezar
+        results = await asyncio.gather(
+            start_match(match_id=1, player_id=1, db=db_session),
+            start_match(match_id=1, player_id=1, db=db_session),
+            return_exceptions=True,
+        )
+
+    assert [getattr(result, "status_code", None) for result in results] == [200, 404]
+    mock_provision_match.assert_called_once()
+    mock_schedule_turn_timeout.assert_called_once()
+
+
+class LobbyWebSocket:
+    def __init__(self):
+        self.received = []
+
+    async def send_text(self, frame):
+        self.received.append(json.loads(frame))
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_notify_matches_list_groups_by_filter(load_matches, db_session):
+    filters = [(None, None), ("match 3", None), (None, 2)]
+    websockets = [LobbyWebSocket() for _ in range(30)]
+    for i, websocket in enumerate(websockets):
+        connection_id = manager.add_anonymous_connection(websocket)
+        manager._connections[connection_id]["match_name"], \
+            manager._connections[connection_id]["max_players"] = filters[i % 3]
+
+    try:
+        with patch("app.routers.players.MatchService.get_all_matches",
+                   wraps=MatchService(db_session).get_all_matches) as mock_get_all_matches, \
+             patch("app.connection_manager.json.dumps", wraps=json.dumps) as mock_dumps:
+            await notify_matches_list(db_session, 3)
+            await manager.flush()
+
+        mock_get_all_matches.assert_called_once_with(True)
+        assert mock_dumps.call_count == len(filters)
+        names = [[match["match_name"] for match in websocket.received[0]["payload"]["matches"]]
+                 for websocket in websockets[:3]]
+        assert names == [["Match 3"], ["Match 3"], []]
+        assert all(websocket.received == websockets[i % 3].received
+                   for i, websocket in enumerate(websockets))
+    finally:
+        for websocket in websockets:
+            manager.remove_anonymous_connection(websocket)
@@ -142,4 +142,34 @@ def test_get_movement_cards_by_match(movement_card_service: MovementCardService,
     
     assert db_session.query(MovementCards).count() == 3
     assert len(movement_card_service.get_movement_card_by_match(match_id=1)) == 2
-    assert len(movement_card_service.get_movement_card_by_match(match_id=2)) == 1
\ No newline at end of file
+    assert len(movement_card_service.get_movement_card_by_match(match_id=2)) == 1
+
+def test_draw_movement_cards_in_deck_order(movement_card_service: MovementCardService, db_session):
+    for position, mov in enumerate([Movements.L, Movements.LINE, Movements.DIAGONAL, Movements.LINE_BETWEEN]):
+        card = MovementCards(mov_type=mov.value, match_id=1, deck_position=3 - position)
+        db_session.add(card)
+    db_session.commit()
+
+    drawn = movement_card_service.draw_movement_cards(match_id=1, player_id=1, amount=3)
+
+    assert [card.mov_type for card in drawn] == [
+        Movements.LINE_BETWEEN.value, Movements.DIAGONAL.value, Movements.LINE.value]
+    assert len(movement_card_service.get_movement_card_by_user(1)) == 3
+    # Solo queda una carta en el mazo
+    assert len(movement_card_service.draw_movement_cards(match_id=1, player_id=2, amount=3)) == 1
+    assert movement_card_service.draw_movement_cards(match_id=1, player_id=2, amount=3) == []
+
+
+def test_played_card_goes_to_the_bottom_of_the_deck(movement_card_service: MovementCardService, db_session):
+    cards = [MovementCards(mov_type=Movements.L.value, match_id=1, deck_position=i) for i in range(3)]
+    db_session.add_all(cards)
+    db_session.commit()
+    played = movement_card_service.draw_movement_cards(match_id=1, player_id=1, amount=1)[0]
+
+    movement_card_service.update_card_owner_to_none(played.id)
+    assert played.deck_position == 3
+
+    # Deshacer el movimiento parcial no cambia el orden del mazo
+    movement_card_service.add_movement_card_to_player(1, played.id)
+    assert played.deck_position == 3
+    assert [card.id for card in movement_card_service.draw_movement_cards(1, 2, 2)] == [cards[1].id, cards[2].id]
@@ -0,0 +1,90 @@
+import pytest
+
+from app.movement_journal import (
+    InMemoryMovementJournal,
+    JournalEntry,
+    SQLiteMovementJournal,
+    create_movement_journal,
+)
+from app.utils.board_shapes_algorithm import Coordinate
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def journal(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryMovementJournal()
+    return SQLiteMovementJournal(str(tmp_path / "journal.sqlite"))
+
+
+def entry(id_mov, create_figure=False):
+    return JournalEntry(Coordinate(0, id_mov), Coordinate(1, id_mov), id_mov, create_figure)
+
+
+def test_pop_returns_last_movement(journal):
+    journal.append(1, entry(1))
+    journal.append(1, entry(2, create_figure=True))
+
+    assert journal.pop(1) == entry(2, create_figure=True)
+    assert journal.pop(1) == entry(1)
+    assert journal.pop(1) is None
+
+
+def test_entries_keeps_movements(journal):
+    journal.append(1, entry(1))
+    journal.append(2, entry(2))
+    journal.append(1, entry(3))
+
+    assert journal.entries(1) == [entry(1), entry(3)]
+    assert journal.entries(1) == [entry(1), entry(3)]
+    assert journal.entries(3) == []
+
+
+def test_drop_only_discards_board(journal):
+    journal.append(1, entry(1))
+    journal.append(2, entry(2))
+
+    journal.drop(1)
+
+    assert journal.entries(1) == []
+    assert journal.entries(2) == [entry(2)]
+
+
+
+def test_replace_only_changes_board(journal):
+    journal.append(1, entry(1))
+    journal.append(2, entry(2))
+
+    journal.replace(1, [entry(3), entry(4)])
+
+    assert journal.entries(1) == [entry(3), entry(4)]
+    assert journal.entries(2) == [entry(2)]
+
+    journal.replace(1, [])
+
+    assert journal.pop(1) is None
+
+def test_clear(journal):
+    journal.append(1, entry(1))
+    journal.append(2, entry(2))
+
+    journal.clear()
+
+    assert journal.pop(1) is None
+    assert journal.pop(2) is None
+
+
+def test_sqlite_journal_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / "journal.sqlite")
+    first_worker = SQLiteMovementJournal(path)
+    second_worker = SQLiteMovementJournal(path)
+
+    first_worker.append(1, entry(1))
+    first_worker.append(1, entry(2))
+
+    assert second_worker.pop(1) == entry(2)
+    assert first_worker.entries(1) == [entry(1)]
+
+
+def test_create_unknown_movement_journal():
+    with pytest.raises(ValueError):
+        create_movement_journal("redis")
@@ -0,0 +1,131 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import NoResultFound
+from unittest.mock import patch
+
+from app.config import PACKED_STORAGE
+from app.cruds.board import BoardService
+from app.cruds.tile import TileService
+from app.migrations import add_missing_columns, pack_boards
+from app.models.models import Boards, Tiles
+
+
+@pytest.fixture
+def packed_storage():
+    with patch("app.config.BOARD_STORAGE", PACKED_STORAGE):
+        yield
+
+
+def create_tiles_board(db_session):
+    board = Boards(match_id=1)
+    db_session.add(board)
+    db_session.commit()
+
+    colors = ["red", "blue", "green", "yellow"] * 9
+    tile_service = TileService(db_session)
+    for i in range(6):
+        for j in range(6):
+            tile_service.create_tile(board.id, colors[i * 6 + j], i, j)
+    return board
+
+
+def test_init_board_packed(db_session, packed_storage):
+    board_service = BoardService(db_session)
+    board = board_service.create_board(match_id=1)
+
+    board_service.init_board(board.id)
+
+    db_session.refresh(board)
+    assert len(board.packed_tiles) == 36
+    assert db_session.query(Tiles).filter(Tiles.board_id == board.id).count() == 0
+    table = board_service.get_board_table(board.id)
+    assert sum(row.count("red") for row in table) == 9
+
+
+def test_get_tile_by_position_packed(db_session, packed_storage):
+    board = Boards(match_id=1, packed_tiles="rgby" * 9)
+    db_session.add(board)
+    db_session.commit()
+
+    tile = TileService(db_session).get_tile_by_position(0, 2, board.id)
+
+    assert tile.color == "blue"
+    assert (tile.position_x, tile.position_y, tile.board_id) == (0, 2, board.id)
+
+    with pytest.raises(NoResultFound):
+        TileService(db_session).get_tile_by_position(0, 2, board.id + 1)
+
+
+def test_swap_tiles_packed(db_session, packed_storage):
+    board = Boards(match_id=1, packed_tiles="rgby" * 9)
+    db_session.add(board)
+    db_session.commit()
+    tile_service = TileService(db_session)
+    board_service = BoardService(db_session)
+
+    tile1 = tile_service.get_tile_by_position(0, 0, board.id)
+    tile2 = tile_service.get_tile_by_position(5, 5, board.id)
+    board_service.get_board_table(board.id)
+
+    tile_service.swap_tiles(tile1, tile2)
+
+    db_session.refresh(board)
+    assert board.packed_tiles == "y" + ("rgby" * 9)[1:35] + "r"
+    assert (tile1.position_x, tile1.position_y) == (5, 5)
+    assert (tile2.position_x, tile2.position_y) == (0, 0)
+    # El tablero cacheado se invalida con el intercambio
+    assert board_service.get_board_table(board.id)[0][0] == "yellow"
+
+
+
+def test_update_colors_packed(db_session, packed_storage):
+    board = Boards(match_id=1, packed_tiles="rgby" * 9)
+    db_session.add(board)
+    db_session.commit()
+    board_service = BoardService(db_session)
+    board_service.get_board_table(board.id)
+
+    TileService(db_session).update_colors(board.id, {(0, 0): "yellow", (5, 5): "red"})
+
+    db_session.refresh(board)
+    assert board.packed_tiles == "y" + ("rgby" * 9)[1:35] + "r"
+    assert board_service.get_board_table(board.id)[0][0] == "yellow"
+
+def test_pack_board(db_session):
+    board = create_tiles_board(db_session)
+    board_service = BoardService(db_session)
+    expected = board_service.get_board_table(board.id)
+
+    assert board_service.pack_board(board.id)
+
+    db_session.refresh(board)
+    assert board.packed_tiles == "rbgy" * 9
+    assert db_session.query(Tiles).filter(Tiles.board_id == board.id).count() == 0
+    with patch("app.config.BOARD_STORAGE", PACKED_STORAGE):
+        assert board_service.get_board_table(board.id) == expected
+
+
+def test_pack_boards_skips_incomplete_boards(db_session):
+    create_tiles_board(db_session)
+    incomplete = Boards(match_id=2)
+    db_session.add(incomplete)
+    db_session.commit()
+    TileService(db_session).create_tile(incomplete.id, "red", 0, 0)
+
+    assert pack_boards(db_session) == 1
+    assert pack_boards(db_session) == 0
+
+
+def test_add_missing_columns(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE boards (id INTEGER PRIMARY KEY, ban_color VARCHAR(50), match_id INTEGER)"
+        ))
+
+    added = add_missing_columns(engine)
+
+    assert added == ["boards.packed_tiles"]
+    columns = {column["name"] for column in inspect(engine).get_columns("boards")}
+    assert "packed_tiles" in columns
+    assert add_missing_columns(engine) == []
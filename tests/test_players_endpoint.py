@@ -7,10 +7,12 @@ from sqlalchemy.orm.session import Session
 from app.models.enums import EasyShapes, ReasonWinning
 from app.schemas import PartialMove, Tile, UseFigure
 from app.exceptions import PlayerNotConnected
+from app.game_state import GameState, PlayerState
+from app.movement_journal import JournalEntry
 from app.routers.players import check_ban_color, filter_allowed_figures, validate_partial_move
 from app.utils.board_shapes_algorithm import rotate_90_degrees, rotate_180_degrees, rotate_270_degrees
 from app.utils.utils import FIGURE_COORDINATES
-from app.utils.board_shapes_algorithm import Coordinate
+from app.utils.board_shapes_algorithm import ColoredFigure, Coordinate
 
 
 @pytest.fixture(scope="function")
@@ -41,6 +43,7 @@ def setup_board_mocks():
             patch("app.cruds.board.BoardService.update_list_of_parcial_movements") as mock_update_list_of_parcial_movements, \
             patch("app.cruds.board.BoardService.print_temporary_movements") as mock_print_temporary_movements, \
             patch("app.cruds.board.BoardService.get_formed_figures") as mock_get_formed_figures, \
+            patch("app.cruds.board.BoardService.get_figures_tracker") as mock_get_figures_tracker, \
             patch("app.cruds.board.BoardService.get_last_temporary_movements") as mock_get_last_temporary_movements, \
             patch("app.cruds.board.BoardService.get_board_by_id") as mock_get_board_by_id, \
             patch("app.cruds.board.BoardService.get_ban_color") as mock_get_ban_color:
@@ -49,24 +52,13 @@ def setup_board_mocks():
             "mock_update_list_of_parcial_movements": mock_update_list_of_parcial_movements,
             "mock_print_temporary_movements": mock_print_temporary_movements,
             "mock_get_formed_figures": mock_get_formed_figures,
+            "mock_get_figures_tracker": mock_get_figures_tracker,
             "mock_get_last_temporary_movements": mock_get_last_temporary_movements,
             "mock_get_board_by_id": mock_get_board_by_id,
             "mock_get_ban_color": mock_get_ban_color,
         }
 
 
-@pytest.fixture(scope="function")
-def setup_tile_mocks():
-    with patch("app.cruds.tile.TileService.get_tile_by_position") as mock_get_tile_by_position, \
-            patch("app.cruds.tile.TileService.get_tile_by_id") as mock_get_tile_by_id, \
-            patch("app.cruds.tile.TileService.update_tile_position") as mock_update_tile_position:
-        yield {
-            "mock_get_tile_by_position": mock_get_tile_by_position,
-            "mock_update_tile_position": mock_update_tile_position,
-            "mock_get_tile_by_id": mock_get_tile_by_id,
-        }
-
-
 @pytest.fixture(scope="function")
 def setup_movement_card_mocks():
     with patch("app.cruds.movement_card.MovementCardService.get_movement_card_by_id") as mock_get_movement_card_by_id, \
@@ -228,28 +220,33 @@ def test_validate_partial_move_invalid_tile_position():
     assert excinfo.value.detail == "Tile position is invalid"
 
 
-def test_partial_move_success(setup_player_mocks, setup_match_mocks, setup_board_mocks, setup_tile_mocks, setup_movement_card_mocks, setup_broadcast_mocks, setup_validation_mocks, client):
-    player_mocks = setup_player_mocks
-    match_mocks = setup_match_mocks
-    board_mocks = setup_board_mocks
-    tile_mocks = setup_tile_mocks
-    movement_card_mocks = setup_movement_card_mocks
-    broadcast_mocks = setup_broadcast_mocks
-    validation_mocks = setup_validation_mocks
+BOARD = [
+    ["red", "blue", "green", "yellow", "red", "blue"],
+    ["green", "yellow", "red", "blue", "green", "yellow"],
+    ["red", "blue", "green", "yellow", "red", "blue"],
+    ["green", "yellow", "red", "blue", "green", "yellow"],
+    ["red", "blue", "green", "yellow", "red", "blue"],
+    ["green", "yellow", "red", "blue", "green", "yellow"],
+]
 
-    player_mocks["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    match_mocks["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    movement_card_mocks["mock_get_movement_card_by_id"].return_value = MagicMock(
-        mov_type="Diagonal")
-    tile_mocks["mock_get_tile_by_position"].side_effect = [
-        MagicMock(id=1, position_x=0, position_y=0),
-        MagicMock(id=2, position_x=1, position_y=1)
-    ]
-    board_mocks["mock_get_board_by_match_id"].return_value = MagicMock(id=1)
-    board_mocks["mock_get_formed_figures"].return_value = []
-    validation_mocks["mock_validate_partial_move"].return_value = True
+
+@pytest.fixture(scope="function")
+def setup_game_state():
+    state = GameState(
+        match_id=1, board_id=1, current_player_turn=1, ban_color="yellow",
+        players={1: PlayerState("Player 1", 1), 2: PlayerState("Player 2", 2)},
+        board=BOARD,
+        card_types={1: "Inverse Diagonal", 2: "Line"},
+        card_owners={1: 1, 2: 1},
+        journal=[],
+    )
+    with patch("app.game_state.GameState.load", return_value=state):
+        yield state
+
+
+def test_partial_move_success(setup_game_state, setup_broadcast_mocks, client):
+    state = setup_game_state
+    broadcast_mocks = setup_broadcast_mocks
 
     response = client.post("/matches/1/partial-move/1", json={
         "tiles": [{"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}],
@@ -257,14 +254,16 @@ def test_partial_move_success(setup_player_mocks, setup_match_mocks, setup_board
     })
 
     assert response.status_code == 200
-    tile_mocks["mock_update_tile_position"].assert_any_call(1, 1, 1)
-    tile_mocks["mock_update_tile_position"].assert_any_call(2, 0, 0)
-    board_mocks["mock_update_list_of_parcial_movements"].assert_called_once()
-    movement_card_mocks["mock_update_card_owner_to_none"].assert_called_once()
+    assert state.board[0][0] == "yellow" and state.board[1][1] == "red"
+    assert state.card_owners[1] is None
+    assert state.journal == [JournalEntry(Coordinate(1, 1), Coordinate(0, 0), 1, False)]
+    # El movimiento se guarda en el proximo checkpoint
+    assert state.dirty
     expected_calls = [
         ((1, {"key": "PLAYER_RECEIVE_NEW_BOARD", "payload": {"swapped_tiles": [
-         {"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}]}}),),
-        ((1, {"key": "ALLOW_FIGURES", "payload": []}),)
+         {"rowIndex": 1, "columnIndex": 1}, {"rowIndex": 0, "columnIndex": 0}]}}),),
+        ((1, {"key": "ALLOW_FIGURES", "payload": [
+            figure for figure in state.figures_tracker.figures if figure.color != "yellow"]}),)
     ]
     broadcast_mocks["mock_broadcast_to_game"].assert_has_calls(
         expected_calls, any_order=True)
@@ -285,17 +284,8 @@ def test_partial_move_match_not_found(setup_match_mocks, client):
     assert response.json() == {"detail": "Match not found"}
 
 
-def test_partial_move_player_not_found(setup_player_mocks, setup_match_mocks, client):
-    player_mocks = setup_player_mocks
-    match_mocks = setup_match_mocks
-
-    # Mock para la búsqueda del match
-    match_mocks["mock_get_match_by_id"].return_value = {"id": 1, "name": "Test Match"}
-
-    # Mock para la búsqueda del jugador
-    player_mocks["mock_get_player_by_id"].side_effect = ValueError("Player not found")
-
-    response = client.post("/matches/1/partial-move/1", json={
+def test_partial_move_player_not_found(setup_game_state, client):
+    response = client.post("/matches/1/partial-move/3", json={
         "tiles": [{"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}],
         "movement_card": 1
     })
@@ -304,35 +294,28 @@ def test_partial_move_player_not_found(setup_player_mocks, setup_match_mocks, cl
     assert response.json() == {"detail": "Player not found"}
 
 
-def test_partial_move_not_player_turn(setup_player_mocks, setup_match_mocks, client):
-    player_mocks = setup_player_mocks
-    match_mocks = setup_match_mocks
-
-    player_mocks["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=False, turn_order=2)
-    match_mocks["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_turn=1)
-
-    response = client.post("/matches/1/partial-move/1", json={
+def test_partial_move_not_player_turn(setup_game_state, client):
+    response = client.post("/matches/1/partial-move/2", json={
         "tiles": [{"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}],
         "movement_card": 1
     })
 
     assert response.status_code == status.HTTP_403_FORBIDDEN
-    assert response.json() == {"detail": "It's not player Player 1's turn"}
+    assert response.json() == {"detail": "It's not player Player 2's turn"}
 
 
-def test_partial_move_invalid_movement(setup_player_mocks, setup_match_mocks, setup_movement_card_mocks, client):
-    player_mocks = setup_player_mocks
-    match_mocks = setup_match_mocks
-    movement_card_mocks = setup_movement_card_mocks
+def test_partial_move_movement_card_not_found(setup_game_state, client):
+    response = client.post("/matches/1/partial-move/1", json={
+        "tiles": [{"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}],
+        "movement_card": 7
+    })
 
-    player_mocks["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=False, turn_order=1)
-    match_mocks["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    movement_card_mocks["mock_get_movement_card_by_id"].return_value = MagicMock(
-        mov_type="Line Border")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {"detail": "Movement card not found"}
+
+
+def test_partial_move_invalid_movement(setup_game_state, client):
+    state = setup_game_state
 
     with patch("app.routers.players.validate_partial_move", return_value=False):
         response = client.post("/matches/1/partial-move/1", json={
@@ -342,39 +325,35 @@ def test_partial_move_invalid_movement(setup_player_mocks, setup_match_mocks, se
 
     assert response.status_code == status.HTTP_400_BAD_REQUEST
     assert response.json() == {"detail": "Invalid movement"}
+    assert not state.dirty
 
 
-def test_delete_partial_move_success(setup_player_mocks, setup_match_mocks, setup_board_mocks, setup_tile_mocks, setup_movement_card_mocks, setup_broadcast_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_board = setup_board_mocks
-    mocks_tile = setup_tile_mocks
-    mocks_movement_card = setup_movement_card_mocks
+def test_delete_partial_move_success(setup_game_state, setup_broadcast_mocks, client):
+    state = setup_game_state
     mocks_broadcast = setup_broadcast_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    mocks_movement_card["mock_get_movement_card_by_id"].return_value = MagicMock(
-        mov_type="Diagonal")
-    mocks_board["mock_get_last_temporary_movements"].return_value = MagicMock(tile1=MagicMock(
-        id=1, position_x=0, position_y=0), tile2=MagicMock(id=2, position_x=1, position_y=1), id_mov=1)
-    mocks_board["mock_get_board_by_match_id"].return_value = MagicMock(id=1)
-    mocks_board["mock_get_formed_figures"].return_value = []
-    mocks_board["mock_get_ban_color"].return_value = "red"
+    client.post("/matches/1/partial-move/1", json={
+        "tiles": [{"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}],
+        "movement_card": 1
+    })
+    mocks_broadcast["mock_broadcast_to_game"].reset_mock()
 
     response = client.delete("/matches/1/partial-move/1")
 
     assert response.status_code == 200
-    mocks_tile["mock_update_tile_position"].assert_any_call(1, 1, 1)
-    mocks_tile["mock_update_tile_position"].assert_any_call(2, 0, 0)
-    mocks_movement_card["mock_add_movement_card_to_player"].assert_called_once()
+    assert response.json() == {
+        "tiles": [{"rowIndex": 1, "columnIndex": 1}, {"rowIndex": 0, "columnIndex": 0}],
+        "movement_card": [1, "Inverse Diagonal"],
+    }
+    assert state.board == BOARD
+    assert state.card_owners[1] == 1
+    # Deshacer antes del checkpoint no deja nada para guardar
+    assert not state.dirty
 
     expected_calls = [
         call(1, {"key": "UNDO_PARTIAL_MOVE", "payload": {"tiles": [
-             {"rowIndex": 0, "columnIndex": 0}, {"rowIndex": 1, "columnIndex": 1}]}}),
-        call(1, {"key": "ALLOW_FIGURES", "payload": []})
+             {"rowIndex": 1, "columnIndex": 1}, {"rowIndex": 0, "columnIndex": 0}]}}),
+        call(1, {"key": "ALLOW_FIGURES", "payload": [
+            figure for figure in state.figures_tracker.figures if figure.color != "yellow"]})
     ]
     mocks_broadcast["mock_broadcast_to_game"].assert_has_calls(
         expected_calls, any_order=True)
@@ -391,130 +370,27 @@ def test_delete_partial_move_match_not_found(setup_match_mocks, client):
     assert response.json() == {"detail": "Match not found"}
 
 
-def test_delete_partial_move_player_not_found(setup_player_mocks, setup_match_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_match["mock_get_match_by_id"].return_value = {"id": 1, "name": "Test Match"}
-    mocks_player["mock_get_player_by_id"].side_effect = ValueError("Player not found")
-
-    response = client.delete("/matches/1/partial-move/1")
+def test_delete_partial_move_player_not_found(setup_game_state, client):
+    response = client.delete("/matches/1/partial-move/3")
 
     assert response.status_code == status.HTTP_404_NOT_FOUND
     assert response.json() == {"detail": "Player not found"}
 
 
-def test_delete_partial_move_not_player_turn(setup_player_mocks, setup_match_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=False, turn_order=2)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-
-    response = client.delete("/matches/1/partial-move/1")
+def test_delete_partial_move_not_player_turn(setup_game_state, client):
+    response = client.delete("/matches/1/partial-move/2")
 
     assert response.status_code == status.HTTP_403_FORBIDDEN
-    assert response.json() == {"detail": "It's not player Player 1's turn"}
+    assert response.json() == {"detail": "It's not player Player 2's turn"}
 
 
-def test_delete_partial_move_no_movements_to_undo(setup_player_mocks, setup_match_mocks, setup_board_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_board = setup_board_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    mocks_board["mock_get_last_temporary_movements"].return_value = None
-
+def test_delete_partial_move_no_movements_to_undo(setup_game_state, client):
     response = client.delete("/matches/1/partial-move/1")
 
     assert response.status_code == status.HTTP_409_CONFLICT
     assert response.json() == {"detail": "No movements to undo"}
 
 
-def test_delete_partial_move_movement_card_not_found(setup_player_mocks, setup_match_mocks, setup_board_mocks, setup_movement_card_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_board = setup_board_mocks
-    mocks_movement_card = setup_movement_card_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    mocks_board["mock_get_last_temporary_movements"].return_value = MagicMock(tile1=MagicMock(
-        id=1, position_x=0, position_y=0), tile2=MagicMock(id=2, position_x=1, position_y=1), id_mov=1)
-    mocks_board["mock_get_board_by_match_id"].return_value = MagicMock(id=1)
-    mocks_movement_card["mock_get_movement_card_by_id"].side_effect = NoResultFound(
-        "Movement card not found")
-
-    response = client.delete("/matches/1/partial-move/1")
-
-    assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.json() == {"detail": "Movement card not found"}
-
-
-def test_delete_partial_move_tile_not_found(setup_player_mocks, setup_match_mocks, setup_board_mocks, setup_tile_mocks, setup_movement_card_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_board = setup_board_mocks
-    mocks_tile = setup_tile_mocks
-    mocks_movement_card = setup_movement_card_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    mocks_board["mock_get_last_temporary_movements"].return_value = MagicMock(tile1=MagicMock(
-        id=1, position_x=0, position_y=0), tile2=MagicMock(id=2, position_x=1, position_y=1), id_mov=1)
-    mocks_board["mock_get_board_by_match_id"].return_value = MagicMock(id=1)
-    mocks_movement_card["mock_get_movement_card_by_id"].return_value = MagicMock(
-        mov_type="Diagonal")
-    mocks_tile["mock_update_tile_position"].side_effect = NoResultFound(
-        "Tile not found")
-
-    response = client.delete("/matches/1/partial-move/1")
-
-    assert response.status_code == status.HTTP_404_NOT_FOUND
-    assert response.json() == {"detail": "Tile not found"}
-
-
-def test_delete_partial_move_formed_figures_error(setup_player_mocks, 
-                                                  setup_match_mocks, setup_board_mocks, 
-                                                  setup_movement_card_mocks, 
-                                                  setup_tile_mocks, 
-                                                  setup_broadcast_mocks, client):
-    mocks_player = setup_player_mocks
-    mocks_match = setup_match_mocks
-    mocks_board = setup_board_mocks
-    mocks_movement_card = setup_movement_card_mocks
-    mocks_tile = setup_tile_mocks
-    mocks_broadcast = setup_broadcast_mocks
-
-    mocks_player["mock_get_player_by_id"].return_value = MagicMock(
-        id=1, player_name="Player 1", match_id=1, is_owner=True, turn_order=1)
-    mocks_match["mock_get_match_by_id"].return_value = MagicMock(
-        id=1, state="STARTED", current_players=2, current_player_turn=1)
-    mocks_board["mock_get_last_temporary_movements"].return_value = MagicMock(tile1=MagicMock(
-        id=1, position_x=0, position_y=0), tile2=MagicMock(id=2, position_x=1, position_y=1), id_mov=1)
-    mocks_board["mock_get_board_by_match_id"].return_value = MagicMock(id=1)
-    mocks_movement_card["mock_get_movement_card_by_id"].return_value = MagicMock(
-        mov_type="Diagonal")
-    mocks_board["mock_get_formed_figures"].side_effect = Exception(
-        "Error with formed figures")
-    mocks_tile["mock_get_tile_by_id"].return_value = MagicMock(
-        id=1, position_x=0, position_y=0)
-    mocks_broadcast["mock_broadcast_to_game"].return_value = None
-
-    response = client.delete("/matches/1/partial-move/1")
-
-    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
-    assert response.json() == {"detail": "Error with formed figures"}
-
-
 @pytest.mark.asyncio
 async def test_owner_leave_match(setup_player_mocks, setup_match_mocks, setup_broadcast_mocks, client):
     mocks_player = setup_player_mocks
@@ -563,7 +439,7 @@ def test_use_figure_without_use_movements(setup_player_mocks, setup_match_mocks,
     mocks_shape_card["delete_shape_card"].return_value = None
 
     valid_coordinates = FIGURE_COORDINATES["MINI_LINE"]
-    mocks_board['mock_get_formed_figures'].return_value = [valid_coordinates, rotate_90_degrees(
+    mocks_board['mock_get_figures_tracker'].return_value.figures = [valid_coordinates, rotate_90_degrees(
         valid_coordinates, (6, 6)), rotate_180_degrees(valid_coordinates, (6, 6)), rotate_270_degrees(valid_coordinates, (6, 6))]
 
     response = client.post("/matches/1/player/1/use-figure",
@@ -591,10 +467,10 @@ def test_use_figure_with_movement_return(setup_player_mocks, setup_match_mocks,
     mocks_board['mock_get_board_by_id'].return_value = MagicMock(
         id=1, match_id=1, temporary_movements=[any])
     valid_coordinates = FIGURE_COORDINATES["MINI_LINE"]
-    mocks_board['mock_get_formed_figures'].return_value = [valid_coordinates, rotate_90_degrees(
+    mocks_board['mock_get_figures_tracker'].return_value.figures = [valid_coordinates, rotate_90_degrees(
         valid_coordinates, (6, 6)), rotate_180_degrees(valid_coordinates, (6, 6)), rotate_270_degrees(valid_coordinates, (6, 6))]
-    mocks_board["mock_get_last_temporary_movements"].return_value = MagicMock(
-        id_mov=1, create_figure=False, tile1=MagicMock(position_x=0, position_y=0), tile2=MagicMock(position_x=1, position_y=1))
+    mocks_board["mock_get_last_temporary_movements"].return_value = JournalEntry(
+        Coordinate(0, 0), Coordinate(1, 1), id_mov=1, create_figure=False)
     mocks_movement_card['mock_get_movement_card_by_id'].return_value = MagicMock(
         id=1, mov_type=1)
     mocks_shape_card["delete_shape_card"].return_value = None
@@ -643,38 +519,28 @@ def test_check_ban_color_with_banned_color():
 def test_filter_allowed_figures():
     # Mock services
     board_service = MagicMock()
-    tile_service = MagicMock()
 
     # Mock data
-    match_id = 1
+    board_id = 1
     ban_color = "red"
     figures_found = [
-        [Coordinate(0, 0), Coordinate(0, 1)],
-        [Coordinate(1, 0), Coordinate(1, 1)],
-        [Coordinate(2, 0), Coordinate(2, 1)]
+        ColoredFigure([Coordinate(0, 0), Coordinate(0, 1)], "blue"),
+        ColoredFigure([Coordinate(1, 0), Coordinate(1, 1)], "red"),
+        ColoredFigure([Coordinate(2, 0), Coordinate(2, 1)], "green"),
     ]
 
     # Mock return values
     board_service.get_ban_color.return_value = ban_color
-    tile_service.get_tile_by_position.side_effect = [
-        MagicMock(color="blue"), MagicMock(color="blue"),
-        MagicMock(color="red"), MagicMock(color="red"),
-        MagicMock(color="green"), MagicMock(color="green")
-    ]
 
     # Call the function
-    result = filter_allowed_figures(match_id, board_service, figures_found, tile_service)
+    result = filter_allowed_figures(board_id, board_service, figures_found)
 
     # Assertions
     assert result["key"] == "ALLOW_FIGURES"
-    assert len(result["payload"]) == 2
     assert result["payload"] == [
         [Coordinate(0, 0), Coordinate(0, 1)],
-        [Coordinate(1, 0), Coordinate(1, 1)]
+        [Coordinate(2, 0), Coordinate(2, 1)]
     ]
 
-    # Ensure the mocks were called with expected arguments
-    board_service.get_ban_color.assert_called_once_with(match_id)
-    tile_service.get_tile_by_position.assert_any_call(0, 0, match_id)
-    tile_service.get_tile_by_position.assert_any_call(1, 0, match_id)
-    tile_service.get_tile_by_position.assert_any_call(2, 0, match_id)
\ No newline at end of file
+    # El color de las figuras no se busca en la base de datos
+    board_service.get_ban_color.assert_called_once_with(board_id)
@@ -0,0 +1,77 @@
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from app import config
+from app.migrations import create_missing_indexes
+from app.cruds.movement_card import MovementCardService
+from app.cruds.player import PlayerService
+from app.cruds.shape_card import ShapeCardService
+from app.cruds.tile import TileService
+
+
+@contextmanager
+def captured_selects(db_session):
+    """Guarda los SELECT que ejecuta la sesion, con sus parametros."""
+    engine = db_session.get_bind()
+    selects = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        yield selects
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+
+def full_scans(db_session, statement, parameters):
+    """Devuelve los pasos del plan de la consulta que recorren una tabla entera."""
+    plan = db_session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in plan if row[-1].startswith("SCAN")]
+
+
+HOT_QUERIES = {
+    "tiles_by_position": lambda db: TileService(db).get_tile_by_position(1, 1, 1),
+    "visible_shape_cards": lambda db: ShapeCardService(db).get_visible_cards(1, True),
+    "hidden_shape_cards": lambda db: ShapeCardService(db).get_visible_cards(1, False),
+    "shape_deck_size": lambda db: ShapeCardService(db).get_deck_size(1),
+    "blocked_shape_cards": lambda db: ShapeCardService(db).get_blocked_cards(1),
+    "draw_shape_cards": lambda db: ShapeCardService(db).draw_shape_cards(1),
+    "movement_cards_without_owner": lambda db: MovementCardService(db).get_movement_cards_without_owner(1),
+    "movement_cards_by_user": lambda db: MovementCardService(db).get_movement_card_by_user(1),
+    "movement_deck_bottom": lambda db: MovementCardService(db).get_deck_bottom(1),
+    "draw_movement_cards": lambda db: MovementCardService(db).draw_movement_cards(1, 1, 3),
+    "player_by_turn": lambda db: PlayerService(db).get_player_by_turn(1, 1),
+    "players_by_match": lambda db: PlayerService(db).get_players_by_match(1),
+}
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_queries_use_an_index(name, db_session, monkeypatch, load_data_for_test):
+    # Las fichas solo se consultan por posicion si no estan empaquetadas
+    monkeypatch.setattr(config, "BOARD_STORAGE", config.TILES_STORAGE)
+
+    with captured_selects(db_session) as selects:
+        HOT_QUERIES[name](db_session)
+
+    assert selects
+    for statement, parameters in selects:
+        assert full_scans(db_session, statement, parameters) == [], statement
+
+
+def test_create_missing_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.sqlite'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE tiles (id INTEGER PRIMARY KEY, color VARCHAR, position_x INTEGER, "
+            "position_y INTEGER, board_id INTEGER)"
+        ))
+
+    assert create_missing_indexes(engine) == ["ix_tiles_board_position"]
+    assert [index["name"] for index in inspect(engine).get_indexes("tiles")] == ["ix_tiles_board_position"]
+    assert create_missing_indexes(engine) == []
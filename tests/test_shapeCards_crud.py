@@ -167,4 +167,26 @@ def test_get_visible_cards_not_found(shape_service: ShapeCardService):
 
     # Verificar que la lista de cartas visibles está vacía
     visible_cards = shape_service.get_visible_cards(player_id, True)
-    assert len(visible_cards) == 0
\ No newline at end of file
+    assert len(visible_cards) == 0
+
+def test_draw_shape_cards_in_deck_order(shape_service: ShapeCardService, db_session):
+    player_id = 1
+    db_session.add_all([
+        ShapeCards(shape_type=3, is_hard=False, is_visible=True, is_blocked="BLOCKED",
+                   player_owner=player_id, deck_position=0),
+        ShapeCards(shape_type=7, is_hard=False, is_visible=False, is_blocked="NOT_BLOCKED",
+                   player_owner=player_id, deck_position=5),
+        ShapeCards(shape_type=5, is_hard=False, is_visible=False, is_blocked="NOT_BLOCKED",
+                   player_owner=player_id, deck_position=3),
+        ShapeCards(shape_type=1, is_hard=True, is_visible=False, is_blocked="NOT_BLOCKED",
+                   player_owner=player_id, deck_position=4),
+    ])
+    db_session.commit()
+
+    drawn = shape_service.draw_shape_cards(player_id)
+
+    assert [card.shape_type for card in drawn] == [5, 1]
+    assert all(card.is_visible for card in drawn)
+    assert len(shape_service.get_visible_cards(player_id, True)) == 3
+    # La mano esta completa
+    assert shape_service.draw_shape_cards(player_id) == []
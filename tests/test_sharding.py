@@ -0,0 +1,97 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.testclient import WebSocketDenialResponse
+
+from app.backplane import REFRESH_LOBBY_EVENT
+from app.connection_manager import ConnectionManager
+from app.sharding import ShardMap, ShardRoutingMiddleware, match_id_for_path
+
+URLS = ["http://shard0:8000", "http://shard1:8000"]
+
+
+@pytest.fixture
+def sharded_client():
+    app = FastAPI()
+    app.add_middleware(ShardRoutingMiddleware, shards=ShardMap(2, 0, URLS))
+
+    @app.get("/matches/")
+    def list_matches():
+        return []
+
+    @app.patch("/matches/{match_id}/end-turn/{player_id}")
+    def end_turn(match_id: int, player_id: int):
+        return {"match_id": match_id}
+
+    @app.websocket("/matches/{match_id}/ws/{player_id}")
+    async def game_websocket(match_id: int, player_id: int, websocket: WebSocket):
+        await websocket.accept()
+        await websocket.send_json({"match_id": match_id})
+        await websocket.close()
+
+    return TestClient(app, follow_redirects=False)
+
+
+def test_shard_map():
+    shards = ShardMap(2, 1, URLS)
+
+    assert shards.enabled
+    assert [shards.shard_for(match_id) for match_id in range(1, 5)] == [1, 0, 1, 0]
+    assert shards.is_local(3) and not shards.is_local(4)
+    assert shards.owner_url(4) == "http://shard0:8000"
+    assert ShardMap().is_local(4)
+
+
+def test_shard_map_invalid_config():
+    with pytest.raises(ValueError):
+        ShardMap(2, 0, URLS[:1])
+    with pytest.raises(ValueError):
+        ShardMap(2, 2, URLS)
+
+
+def test_match_id_for_path():
+    assert match_id_for_path("/matches/12/partial-move/3") == 12
+    assert match_id_for_path("/matches/12") == 12
+    assert match_id_for_path("/matches/") is None
+    assert match_id_for_path("/matches/ws") is None
+
+
+def test_local_match_is_handled(sharded_client):
+    response = sharded_client.patch("/matches/2/end-turn/1")
+
+    assert response.status_code == 200
+    assert response.json() == {"match_id": 2}
+
+
+def test_lobby_is_handled_by_any_shard(sharded_client):
+    assert sharded_client.get("/matches/").status_code == 200
+
+
+def test_remote_match_is_redirected_to_owner(sharded_client):
+    response = sharded_client.patch("/matches/3/end-turn/1?force=1")
+
+    assert response.status_code == 307
+    assert response.headers["location"] == "http://shard1:8000/matches/3/end-turn/1?force=1"
+
+
+def test_remote_match_websocket_is_redirected_to_owner(sharded_client):
+    with sharded_client.websocket_connect("/matches/2/ws/1") as websocket:
+        assert websocket.receive_json() == {"match_id": 2}
+
+    with pytest.raises(WebSocketDenialResponse) as denial:
+        with sharded_client.websocket_connect("/matches/3/ws/1"):
+            pass
+    assert denial.value.status_code == 307
+    assert denial.value.headers["location"] == "ws://shard1:8000/matches/3/ws/1"
+
+
+def test_deliver_dispatches_subscribed_events():
+    manager = ConnectionManager()
+    handler = MagicMock()
+    manager.subscribe(REFRESH_LOBBY_EVENT, handler)
+
+    manager.deliver({"type": REFRESH_LOBBY_EVENT})
+
+    handler.assert_called_once_with({"type": REFRESH_LOBBY_EVENT})
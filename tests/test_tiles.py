@@ -1,4 +1,5 @@
 from app.models.models import Tiles
+from sqlalchemy.exc import NoResultFound
 from app.cruds.tile import TileService
 import app.exceptions as e
 import pytest
@@ -81,4 +82,54 @@ def test_delete_tile (tile_service : TileService, db_session):
     expected = db_session.query(Tiles).count()
     assert expected == before - 1
     with pytest.raises(e.TileNotFound):
-        tile_service.get_tile_by_id(tile_id=1)
\ No newline at end of file
+        tile_service.get_tile_by_id(tile_id=1)
+
+
+def test_swap_tiles(tile_service : TileService, db_session):
+    tile1 = tile_service.create_tile(board_id=1, color="red", position_x=0, position_y=0)
+    tile2 = tile_service.create_tile(board_id=1, color="blue", position_x=2, position_y=3)
+
+    tile_service.swap_tiles(tile1, tile2)
+
+    assert tile_service.get_tile_by_position(2, 3, 1).color == "red"
+    assert tile_service.get_tile_by_position(0, 0, 1).color == "blue"
+    assert (tile1.position_x, tile1.position_y) == (2, 3)
+    assert (tile2.position_x, tile2.position_y) == (0, 0)
+
+
+def test_swap_positions(tile_service : TileService, db_session):
+    tile_service.create_tile(board_id=1, color="red", position_x=0, position_y=0)
+    tile_service.create_tile(board_id=1, color="blue", position_x=2, position_y=3)
+    tile_service.create_tile(board_id=2, color="green", position_x=0, position_y=0)
+
+    tile_service.swap_positions(1, (0, 0), (2, 3))
+
+    assert tile_service.get_tile_by_position(2, 3, 1).color == "red"
+    assert tile_service.get_tile_by_position(0, 0, 1).color == "blue"
+    assert tile_service.get_tile_by_position(0, 0, 2).color == "green"
+
+
+def test_swap_positions_tile_not_found(tile_service : TileService):
+    tile_service.create_tile(board_id=1, color="red", position_x=0, position_y=0)
+
+    with pytest.raises(NoResultFound):
+        tile_service.swap_positions(1, (0, 0), (2, 3))
+
+
+def test_update_colors(tile_service : TileService, db_session):
+    tile_service.create_tile(board_id=1, color="red", position_x=0, position_y=0)
+    tile_service.create_tile(board_id=1, color="blue", position_x=2, position_y=3)
+    tile_service.create_tile(board_id=2, color="green", position_x=0, position_y=0)
+
+    tile_service.update_colors(1, {(0, 0): "blue", (2, 3): "red"})
+
+    assert tile_service.get_tile_by_position(2, 3, 1).color == "red"
+    assert tile_service.get_tile_by_position(0, 0, 1).color == "blue"
+    assert tile_service.get_tile_by_position(0, 0, 2).color == "green"
+
+
+def test_update_colors_tile_not_found(tile_service : TileService):
+    tile_service.create_tile(board_id=1, color="red", position_x=0, position_y=0)
+
+    with pytest.raises(NoResultFound):
+        tile_service.update_colors(1, {(2, 3): "red"})
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.models.models import Matches
+from app.routers.players import recover_turn_timeouts, turn_timeout
+from app.sharding import ShardMap
+from app.turn_scheduler import turn_scheduler
+
+
+@pytest.fixture
+def started_match(client, db_session):
+    response = client.post("/matches/", json={"lobby_name": "Partida", "max_players": 2, "player_name": "Player1"})
+    match_id = response.json()["match_id"]
+    owner_id = response.json()["player_id"]
+    client.post(f"/matches/{match_id}", json={"player_name": "Player2"})
+    with patch("app.routers.matches.manager.send_to_player", new_callable=AsyncMock):
+        response = client.patch(f"/matches/{match_id}/start/{owner_id}")
+    assert response.status_code == 200
+
+    # Reinicio del servidor: se pierden los vencimientos en memoria
+    turn_scheduler.clear()
+    session_factory = turn_scheduler.session_factory
+    turn_scheduler.session_factory = sessionmaker(bind=db_session.get_bind())
+    yield db_session.query(Matches).filter(Matches.id == match_id).one()
+    turn_scheduler.session_factory = session_factory
+
+
+@pytest.mark.asyncio
+async def test_started_match_persists_turn_deadline(started_match):
+    assert started_match.turn_deadline == started_match.started_turn_time + timedelta(seconds=1)
+
+
+@pytest.mark.asyncio
+async def test_recover_pending_turn(started_match, db_session):
+    started_match.turn_deadline = datetime.now() + timedelta(seconds=30)
+    db_session.commit()
+
+    assert recover_turn_timeouts(db_session) == 1
+
+    entry = turn_scheduler.get(started_match.id)
+    assert entry.turn_order == started_match.current_player_turn
+    assert 29 < entry.deadline - time.monotonic() <= 30
+
+
+@pytest.mark.asyncio
+async def test_recover_only_matches_of_this_shard(started_match, db_session):
+    started_match.turn_deadline = datetime.now() + timedelta(seconds=30)
+    db_session.commit()
+    other_shard = ShardMap(2, (started_match.id + 1) % 2, ["http://shard0", "http://shard1"])
+
+    with patch("app.routers.players.shard_map", other_shard):
+        assert recover_turn_timeouts(db_session) == 0
+
+    assert turn_scheduler.get(started_match.id) is None
+
+
+@pytest.mark.asyncio
+async def test_recover_overdue_turn_expires_immediately(started_match, db_session):
+    # El turno vencio mientras el servidor estaba caido
+    started_match.started_turn_time = datetime.now() - timedelta(seconds=5)
+    started_match.turn_deadline = datetime.now() - timedelta(seconds=4)
+    db_session.commit()
+    match_id = started_match.id
+
+    with patch("app.routers.players.sleep", new_callable=AsyncMock), \
+         patch("app.routers.players.manager.broadcast_to_game", new_callable=AsyncMock), \
+         patch("app.routers.players.manager.send_to_player", new_callable=AsyncMock):
+        recover_turn_timeouts(db_session)
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if turn_scheduler.stats()["expired"]:
+                break
+        # Deja terminar el callback del vencimiento
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if turn_scheduler.get(match_id) is not None:
+                break
+
+    db_session.expire_all()
+    match = db_session.query(Matches).filter(Matches.id == match_id).one()
+    assert match.current_player_turn == 2
+    assert match.turn_deadline > datetime.now()
+    assert turn_scheduler.get(match_id).turn_order == 2
+
+
+@pytest.mark.asyncio
+async def test_turn_timeout_waits_for_saved_deadline(started_match, db_session, monkeypatch):
+    # TURN_TIMER cambio al reiniciar: el vencimiento guardado es el que vale
+    monkeypatch.delenv("TURN_TIMER")
+    started_match.started_turn_time = datetime.now() - timedelta(seconds=100)
+    started_match.turn_deadline = datetime.now() + timedelta(seconds=30)
+    db_session.commit()
+    match_id, turn_order = started_match.id, started_match.current_player_turn
+
+    await turn_timeout(match_id, turn_order, db_session)
+
+    db_session.expire_all()
+    match = db_session.query(Matches).filter(Matches.id == match_id).one()
+    assert match.current_player_turn == turn_order
+    entry = turn_scheduler.get(match_id)
+    assert entry.turn_order == turn_order
+    assert 29 < entry.deadline - time.monotonic() <= 30
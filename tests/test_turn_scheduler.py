@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+
+from app.match_actors import _current_match
+from app.turn_scheduler import TurnScheduler
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_scheduler():
+    sessions = []
+
+    def session_factory():
+        session = FakeSession()
+        sessions.append(session)
+        return session
+
+    return TurnScheduler(session_factory), sessions
+
+
+@pytest.mark.asyncio
+async def test_turns_expire_in_order_with_a_new_session():
+    scheduler, sessions = make_scheduler()
+    expired = []
+
+    async def on_expire(match_id, turn_order, db):
+        expired.append((match_id, turn_order, db))
+
+    scheduler.schedule(1, 1, 0.05, on_expire)
+    scheduler.schedule(2, 3, 0.01, on_expire)
+    await asyncio.sleep(0.1)
+
+    assert [(match_id, turn_order) for match_id, turn_order, _ in expired] == [(2, 3), (1, 1)]
+    assert [db for _, _, db in expired] == sessions
+    assert all(session.closed for session in sessions)
+    assert scheduler.stats() == {"scheduled": 0, "heap_size": 0, "expired": 2, "retried": 0}
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_reschedule_and_cancel():
+    scheduler, _ = make_scheduler()
+    expired = []
+
+    async def on_expire(match_id, turn_order, db):
+        expired.append((match_id, turn_order))
+
+    scheduler.schedule(1, 1, 0.02, on_expire)
+    # El turno termino antes: se reemplaza el vencimiento
+    scheduler.schedule(1, 2, 0.05, on_expire)
+    scheduler.schedule(2, 1, 0.02, on_expire)
+    assert scheduler.cancel(2)
+    assert not scheduler.cancel(3)
+
+    await asyncio.sleep(0.03)
+    assert expired == []
+    assert scheduler.get(1).turn_order == 2
+
+    await asyncio.sleep(0.05)
+    assert expired == [(1, 2)]
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_many_matches_use_one_task():
+    scheduler, _ = make_scheduler()
+    expired = set()
+
+    async def on_expire(match_id, turn_order, db):
+        expired.add(match_id)
+
+    tasks_before = len(asyncio.all_tasks())
+    for match_id in range(2000):
+        scheduler.schedule(match_id, 1, 0.05 + (match_id % 10) / 1000, on_expire)
+    assert len(asyncio.all_tasks()) == tasks_before + 1
+
+    await asyncio.sleep(0.2)
+    assert expired == set(range(2000))
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_errors_do_not_stop_the_scheduler():
+    scheduler, sessions = make_scheduler()
+    expired = []
+
+    async def on_expire(match_id, turn_order, db):
+        if match_id == 1:
+            raise ValueError("Error")
+        expired.append(match_id)
+
+    scheduler.schedule(1, 1, 0.01, on_expire)
+    scheduler.schedule(2, 1, 0.02, on_expire)
+    await asyncio.sleep(0.05)
+
+    assert expired == [2]
+    assert all(session.closed for session in sessions)
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_failed_expiration_is_retried():
+    sessions = []
+    scheduler = TurnScheduler(lambda: sessions.append(FakeSession()) or sessions[-1],
+                              retry_delay=0.01, max_retry_delay=0.02)
+    attempts = []
+
+    async def on_expire(match_id, turn_order, db):
+        attempts.append(match_id)
+        if len(attempts) < 3:
+            raise RuntimeError("Pool lleno")
+
+    scheduler.schedule(1, 1, 0.01, on_expire)
+    await asyncio.sleep(0.1)
+
+    assert attempts == [1, 1, 1]
+    assert scheduler.get(1) is None
+    assert scheduler.stats()["retried"] == 2
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_failed_expiration_keeps_newer_deadline():
+    scheduler, _ = make_scheduler()
+    scheduler.retry_delay = 0.01
+    called = []
+
+    async def on_expire(match_id, turn_order, db):
+        called.append(turn_order)
+        if turn_order == 1:
+            # El turno avanzo mientras vencia
+            scheduler.schedule(match_id, 2, 10, on_expire)
+            raise RuntimeError("Error")
+
+    scheduler.schedule(1, 1, 0.01, on_expire)
+    await asyncio.sleep(0.05)
+
+    assert called == [1]
+    assert scheduler.get(1).turn_order == 2
+    scheduler.clear()
+
+
+@pytest.mark.asyncio
+async def test_expirations_do_not_inherit_the_caller_context():
+    scheduler, _ = make_scheduler()
+    seen = []
+
+    async def on_expire(match_id, turn_order, db):
+        seen.append(_current_match.get())
+
+    async def inside_actor():
+        # El primer turno se programa desde la accion de un actor
+        _current_match.set(1)
+        scheduler.schedule(1, 1, 0.01, on_expire)
+
+    await asyncio.get_running_loop().create_task(inside_actor())
+    await asyncio.sleep(0.05)
+
+    assert seen == [None]
+    scheduler.clear()
@@ -32,7 +32,7 @@ async def test_undo_partials_movements_no_temporary_movements():
 
         assert result == []
         board_service.get_last_temporary_movements.assert_not_called()
-        tile_service.update_tile_position.assert_not_called()
+        tile_service.swap_tiles.assert_not_called()
         movement_card_service.get_movement_card_by_id.assert_not_called()
         movement_card_service.add_movement_card_to_player.assert_not_called()
         mock_manager.broadcast_to_game.assert_not_called()
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import event
+
+from app.cruds.match import MatchService
+from app.cruds.player import PlayerService
+from app.database import after_transaction, commit, in_unit_of_work, unit_of_work
+from app.models.models import Matches, Players
+
+
+def count_commits(db_session):
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(session))
+    return commits
+
+
+def test_services_commit_outside_unit_of_work(db_session):
+    commits = count_commits(db_session)
+
+    match = MatchService(db_session).create_match("Match", 4, True, None)
+    PlayerService(db_session).create_player("Player", match.id, True, "token")
+
+    assert len(commits) == 2
+
+
+def test_unit_of_work_commits_once(db_session):
+    commits = count_commits(db_session)
+
+    with unit_of_work(db_session):
+        match = MatchService(db_session).create_match("Match", 4, True, None)
+        PlayerService(db_session).create_player("Player", match.id, True, "token")
+        assert in_unit_of_work(db_session)
+
+    assert len(commits) == 1
+    assert not in_unit_of_work(db_session)
+    assert db_session.query(Players).filter(Players.match_id == match.id).count() == 1
+
+
+def test_unit_of_work_rollback(db_session):
+    with pytest.raises(ValueError):
+        with unit_of_work(db_session):
+            MatchService(db_session).create_match("Match", 4, True, None)
+            raise ValueError("Error")
+
+    assert not in_unit_of_work(db_session)
+    assert db_session.query(Matches).count() == 0
+
+
+def test_nested_unit_of_work(db_session):
+    commits = count_commits(db_session)
+
+    with unit_of_work(db_session):
+        with unit_of_work(db_session):
+            MatchService(db_session).create_match("Match", 4, True, None)
+        assert len(commits) == 0
+        commit(db_session)
+        assert len(commits) == 0
+
+    assert len(commits) == 1
+
+
+def test_after_transaction_waits_for_unit_of_work(db_session):
+    commits = count_commits(db_session)
+    calls = []
+
+    after_transaction(db_session, lambda: calls.append(len(commits)))
+    assert calls == [0]
+
+    with unit_of_work(db_session):
+        after_transaction(db_session, lambda: calls.append(len(commits)))
+        assert calls == [0]
+
+    assert calls == [0, 1]
+
+    with pytest.raises(ValueError):
+        with unit_of_work(db_session):
+            after_transaction(db_session, lambda: calls.append("rollback"))
+            raise ValueError("Error")
+
+    assert calls == [0, 1, "rollback"]
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.exceptions import WorkerPoolFull
+from app.workers import DBWorkerPool, EventLoopMonitor
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_runs_outside_event_loop():
+    pool = DBWorkerPool(max_workers=2, queue_limit=0)
+
+    thread_name = await pool.run(lambda: threading.current_thread().name)
+
+    assert thread_name.startswith("db-worker")
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_propagates_exceptions():
+    pool = DBWorkerPool(max_workers=1, queue_limit=0)
+
+    def fail():
+        raise ValueError("Error")
+
+    with pytest.raises(ValueError):
+        await pool.run(fail)
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_queue_limit():
+    pool = DBWorkerPool(max_workers=1, queue_limit=1)
+    release = threading.Event()
+
+    running = [asyncio.create_task(pool.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+
+    with pytest.raises(WorkerPoolFull):
+        await pool.run(release.wait)
+    assert pool.stats()["rejected"] == 1
+
+    release.set()
+    await asyncio.gather(*running)
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_monitor_measures_stalls():
+    monitor = EventLoopMonitor(interval=0.01, threshold=0.05)
+    pool = DBWorkerPool(max_workers=1, queue_limit=0)
+    monitor.start()
+
+    await pool.run(time.sleep, 0.2)
+    await asyncio.sleep(0.05)
+    assert monitor.stalls == 0
+
+    time.sleep(0.2)
+    await asyncio.sleep(0.05)
+    monitor.stop()
+
+    assert monitor.stalls == 1
+    assert monitor.stats()["max_stall_ms"] >= 150
+    pool.shutdown()